@@ -0,0 +1,161 @@
+"""
+Combined compliance + risk review lambda (single Bedrock call).
+
+Accepts the ingestion output format (same as the compliance and risk_analysis lambdas):
+{
+  "contract_id": "...",
+  "s3": {"bucket": "...", "key": "..."},
+  "s3_uri": "s3://.../...",
+  "extracted_text": "..."   (or "extracted_text_ref" for large documents)
+}
+
+Runs the tenant's heuristic rule packs, then sends ONE prompt that asks for both
+the compliance schema and the risk schema, so the contract text is paid for
+once instead of twice. Returns `compliance_findings` and `risk_analysis_findings`
+in the shape the decision lambda expects.
+
+Tenants opt in with "review_mode": "combined" in tenant_config.json; ingestion
+copies the mode into its result and the state machine routes on it.
+"""
+
+import json
+import logging
+import os
+import sys
+import uuid
+from typing import Any, Dict, Optional
+
+# Ensure repo root is on sys.path so shared helpers import when run from this folder
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from agents.compliance.main import _extract_overall_compliance, _normalize_overall_compliance, analyze_text_rules
+from agents.risk_analysis.main import _extract_overall_numbers
+from agents.shared.bedrock_client import BEDROCK_REGION, get_invoker, set_invocation_deadline
+from agents.shared.claim_check import load_extracted_text
+from agents.shared.context_packer import PROMPT_TOKEN_BUDGET, pack_context
+from agents.shared.stream_json import parse_fields
+from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config, warm_tenant_config
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# warm the tenant config cache at cold start
+warm_tenant_config()
+
+BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "us.amazon.nova-lite-v1:0")
+COMBINED_PROMPT_TOKEN_BUDGET = int(os.environ.get("COMBINED_PROMPT_TOKEN_BUDGET", str(PROMPT_TOKEN_BUDGET)))
+
+
+def _make_prompt(
+    contract_id: Optional[str],
+    s3_uri: str,
+    extracted_text: str,
+    findings: Dict[str, Any],
+    region: Optional[str],
+    industry: Optional[str],
+) -> str:
+    """One prompt that returns {"compliance": {...}, "risk": {...}} over a single copy of the contract text."""
+    packed = pack_context(extracted_text, token_budget=COMBINED_PROMPT_TOKEN_BUDGET)
+    if packed["truncated"]:
+        logger.info(
+            "_make_prompt: packed %s/%s clauses, ~%s tokens",
+            packed["clauses_included"], packed["clauses_total"], packed["estimated_tokens"],
+        )
+    return (
+        "You are a legal compliance and risk assistant. Review the contract text below ONCE and return a single JSON "
+        "object with two keys, \"compliance\" and \"risk\". Only output valid JSON (no extra commentary).\n\n"
+        f"Consider Region: {region or 'unknown'}\n"
+        f"Consider Industry: {industry or 'unknown'}\n"
+        f"Rule packs applied for this tenant: {', '.join(findings.get('rule_packs') or []) or 'none'}\n"
+        f"Heuristic findings: {json.dumps(findings)}\n\n"
+        "\"compliance\": compliance checks for the region and industry (GDPR for EU, CCPA for US, HIPAA for healthcare, "
+        "SOX, SOC2/ISO for security, etc.), with keys in this order:\n"
+        "{\n"
+        "  \"overall_compliance\": { \"compliance_status\": \"PARTIAL|PASS|FAIL\", \"overall_compliance_score\": <0-10> },\n"
+        "  \"summary\": \"concise human-readable summary of compliance issues\",\n"
+        "  \"severity\": \"low|medium|high\",\n"
+        "  \"recommendations\": [\"string\", ...],\n"
+        "  \"details\": { \"explainability\": [ { \"clause\": \"string\", \"framework\": \"GDPR|SOX|...\", "
+        "\"compliance_status\": \"Passed|Failed|NeedsReview\", \"violated_requirement\": \"string\", "
+        "\"reasoning\": \"string\", \"score\": <0-10> } ] }\n"
+        "}\n\n"
+        "\"risk\": contract risk analysis with keys in this order:\n"
+        "{\n"
+        "  \"overall_risk_score\": <number 0-10 derived from the clause risk scores>,\n"
+        "  \"overall_confidence\": <number 0-1 derived from the clause confidence scores>,\n"
+        "  \"risk_level\": \"Low|Medium|High\",\n"
+        "  \"risk_breakdown\": { \"liability\": <0-10>, \"indemnification\": <0-10>, \"data_protection\": <0-10>, \"termination\": <0-10> },\n"
+        "  \"top_risks\": [\"string\", ...],\n"
+        "  \"clauses\": [ { \"clause_name\": \"string\", \"risk_score\": <1-10>, \"reasoning\": \"2-3 sentences\", "
+        "\"clause_text\": \"exact clause language\", \"confidence_score\": <0.0-1.0> } ]\n"
+        "}\n\n"
+        + ("Some lower-signal clauses were omitted to fit the prompt budget; [...] marks omitted text.\n\n" if packed["truncated"] else "")
+        + "EXTRACTED_TEXT:\n" + packed["text"]
+    )
+
+
+def _split_findings(model_text: str) -> Dict[str, Dict[str, Any]]:
+    """Map the combined answer onto the compliance_findings / risk_analysis_findings shapes."""
+    parsed = parse_fields(model_text, ["compliance", "risk"])
+    compliance = parsed.get("compliance") if isinstance(parsed.get("compliance"), dict) else {}
+    risk = parsed.get("risk") if isinstance(parsed.get("risk"), dict) else {}
+
+    # fall back to the per-agent regex extractors when the JSON is malformed or truncated
+    compliance_findings = _normalize_overall_compliance(compliance.get("overall_compliance")) or _extract_overall_compliance(model_text)
+
+    risk_numbers = _extract_overall_numbers(model_text)
+    for key in ("overall_risk_score", "overall_confidence"):
+        try:
+            risk_numbers[key] = float(risk[key])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    return {
+        "compliance_findings": compliance_findings,
+        "risk_analysis_findings": {
+            "overall_risk_score": risk_numbers.get("overall_risk_score"),
+            "overall_confidence": risk_numbers.get("overall_confidence"),
+        },
+    }
+
+
+def handler(event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
+    """Entry point for the combined review lambda. Returns both findings shapes from one Bedrock call."""
+    set_invocation_deadline(context)
+    contract_id = event.get("contract_id") or str(uuid.uuid4())
+    s3_info = event.get("s3") or {}
+    s3_uri = event.get("s3_uri") or f"s3://{s3_info.get('bucket', '')}/{s3_info.get('key', '')}"
+    extracted_text = load_extracted_text(event)
+
+    tenant_id = extract_tenant_id_from_s3_key(s3_info.get("key"))
+    tenant_cfg = load_tenant_config(tenant_id)
+    region = tenant_cfg.get("region") if isinstance(tenant_cfg, dict) else None
+    industry = tenant_cfg.get("industry") if isinstance(tenant_cfg, dict) else None
+    logger.info("handler: contract_id=%s tenant_id=%s region=%s industry=%s", contract_id, tenant_id, region, industry)
+
+    findings = analyze_text_rules(extracted_text, tenant_cfg)
+    prompt = _make_prompt(contract_id, s3_uri, extracted_text, findings, region, industry)
+
+    logger.info("handler: invoking model %s in region %s", BEDROCK_MODEL_ID, BEDROCK_REGION)
+    try:
+        model_output = get_invoker().invoke_text(prompt, BEDROCK_MODEL_ID, tenant_id=tenant_id)
+    except Exception as e:
+        logger.exception("handler: bedrock invocation failed: %s", e)
+        model_output = json.dumps({
+            "summary": "Bedrock invocation failed",
+            "error": str(e),
+            "model_id_used": BEDROCK_MODEL_ID,
+        })
+
+    result = {
+        "contract_id": contract_id,
+        "s3": s3_info,
+        "s3_uri": s3_uri,
+        "review_mode": "combined",
+        "model_response": model_output,
+    }
+    result.update(_split_findings(model_output))
+    logger.info(
+        "handler: combined review complete compliance=%s risk=%s",
+        result["compliance_findings"], result["risk_analysis_findings"],
+    )
+    return result
@@ -8,8 +8,10 @@ Accepts the ingestion output format:
   "s3_uri": "s3://.../...",
   "extracted_text": "..."
 }
+Large documents arrive as "extracted_text_ref" (S3 claim check) instead of inline text.
 
-Performs simple heuristic checks for GDPR / SOX related concerns and then
+Performs heuristic checks from the tenant's rule packs (GDPR / SOX / HIPAA / ...,
+selected by region and industry, see agents/shared/rule_packs.py) and then
 sends a prompt to Amazon Bedrock (amazon.nova-lite) in us-east-1 to
 produce a human-readable compliance summary.
 
@@ -20,37 +22,43 @@ import os
 import json
 import logging
 import re
-import boto3
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
 import sys
 
 # Add shared/ to path for tenant helpers
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "shared")))
-from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config
+from agents.shared.bedrock_client import BEDROCK_REGION, BEDROCK_STREAM_EARLY_STOP, BEDROCK_STREAMING_ENABLED, get_invoker, set_invocation_deadline
+from agents.shared.claim_check import load_extracted_text
+from agents.shared.clause_library import get_clause_library_store, library_enabled
+from agents.shared.compact_schema import (
+    COMPACT_OUTPUT_ENABLED,
+    COMPLIANCE_COMPACT_FORMAT,
+    COMPLIANCE_OVERALL_FIELDS,
+    expand_compliance,
+    expand_compliance_text,
+    expand_overall_compliance,
+    numbered_clauses,
+    render_batches,
+)
+from agents.shared.context_packer import PROMPT_TOKEN_BUDGET, pack_context
+from agents.shared.incremental import INCREMENTAL_ANALYSIS_ENABLED, get_lineage_store, logical_contract_id
+from agents.shared.stream_json import parse_fields
+from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config, warm_tenant_config
+from agents.shared.rule_packs import get_profile_scanner, load_rule_packs
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Bedrock client is created explicitly in us-east-1 as requested
-BEDROCK_REGION = "us-east-1"
+# Bedrock calls go through the shared invoker (agents/shared/bedrock_client.py)
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "us.amazon.nova-lite-v1:0")
+COMPLIANCE_PROMPT_TOKEN_BUDGET = int(os.environ.get("COMPLIANCE_PROMPT_TOKEN_BUDGET", str(PROMPT_TOKEN_BUDGET)))
 
-bedrock = boto3.client("bedrock-runtime", region_name=BEDROCK_REGION)
-
-# A few simple regex-based heuristics for PII/financial indicators
-PII_PATTERNS = {
-    "ssn": re.compile(r"\b\d{3}-\d{2}-\d{4}\b"),
-    "email": re.compile(r"[a-zA-Z0-9.+_-]+@[a-zA-Z0-9._-]+\.[a-zA-Z]+"),
-    "phone": re.compile(r"\b\+?\d[\d\-() ]{7,}\b"),
-    "account_number": re.compile(r"\baccount\s*(number|no)[:#\s]*\d{4,}\b", re.I),
-}
-
-FINANCIAL_KEYWORDS = [
-    "invoice", "payment", "amount", "salary", "compensation", "financial statement",
-    "balance sheet", "tax", "audit", "revenue", "expense",
-]
-
-GDPR_KEYWORDS = ["personal data", "data subject", "consent", "processing", "controller", "processor", "data protection"]
+# Heuristic detectors (PII patterns, SOX/GDPR/HIPAA/... keywords) come from versioned rule packs
+# selected per tenant region/industry; load the pack file once per container.
+load_rule_packs()
+# warm the tenant config cache at cold start
+warm_tenant_config()
 
 
 def _extract_overall_compliance(model_text: str) -> Dict[str, Any]:
@@ -68,7 +76,10 @@ def _extract_overall_compliance(model_text: str) -> Dict[str, Any]:
     except Exception:
         return {}
 
-    overall = parsed.get("overall_compliance")
+    return _normalize_overall_compliance(parsed.get("overall_compliance"))
+
+
+def _normalize_overall_compliance(overall: Any) -> Dict[str, Any]:
     if not isinstance(overall, dict):
         return {}
 
@@ -92,34 +103,44 @@ def _log_and_print(msg: str, *args: Any) -> None:
     logger.info(msg)
 
 
-def analyze_text_rules(extracted_text: str) -> Dict[str, Any]:
-    """Run simple heuristic checks for GDPR/SOX relevant indicators.
-    Returns a dict summarizing findings.
+def analyze_text_rules(
+    extracted_text: str,
+    tenant_cfg: Optional[Dict[str, Any]] = None,
+    include_offsets: bool = False,
+) -> Dict[str, Any]:
+    """Run the tenant's rule packs over the text in one scan.
+
+    Packs are chosen from the tenant's region/industry (or its pinned "rule_packs" list) and
+    extended with its "keyword_packs". Returns PII/pattern counts, the matched keywords per
+    category and the packs that ran, plus character offsets of every hit when include_offsets is set.
     """
     _log_and_print("analyze_text_rules: starting analysis")
 
-    findings = {"pii": {}, "financial_indicators": [], "gdpr_indicators": []}
-
-    # PII detection
-    for name, pattern in PII_PATTERNS.items():
-        matches = pattern.findall(extracted_text or "")
-        findings["pii"][name] = len(matches)
-        _log_and_print(f"analyze_text_rules: found {len(matches)} matches for {name}")
+    cfg = tenant_cfg if isinstance(tenant_cfg, dict) else {}
+    scanner, packs = get_profile_scanner(
+        region=cfg.get("region"),
+        industry=cfg.get("industry"),
+        pinned=cfg.get("rule_packs"),
+        keyword_packs=cfg.get("keyword_packs"),
+    )
+    scan = scanner.scan(extracted_text or "")
 
-    # Financial keyword checks
-    lowered = (extracted_text or "").lower()
-    for kw in FINANCIAL_KEYWORDS:
-        if kw in lowered:
-            findings["financial_indicators"].append(kw)
-            _log_and_print(f"analyze_text_rules: financial keyword matched: {kw}")
+    findings: Dict[str, Any] = {
+        "rule_packs": [f"{p['id']}@{p['version']}" for p in packs],
+        "pii": {name: len(hits) for name, hits in scan["patterns"].items()},
+    }
+    for category, hits in scan["keywords"].items():
+        findings[category] = sorted(hits, key=lambda kw: hits[kw][0][0])
 
-    # GDPR keyword checks
-    for kw in GDPR_KEYWORDS:
-        if kw in lowered:
-            findings["gdpr_indicators"].append(kw)
-            _log_and_print(f"analyze_text_rules: GDPR keyword matched: {kw}")
+    if include_offsets:
+        findings["offsets"] = scan
 
-    _log_and_print("analyze_text_rules: analysis complete")
+    _log_and_print(
+        "analyze_text_rules: analysis complete packs=%s pii=%s keyword_hits=%s",
+        findings["rule_packs"],
+        findings["pii"],
+        {cat: len(hits) for cat, hits in scan["keywords"].items()},
+    )
     return findings
 
 
@@ -133,29 +154,29 @@ def _build_bedrock_prompt(
 ) -> str:
     _log_and_print("_build_bedrock_prompt: building prompt for bedrock model")
 
-    # Truncate extracted_text to a reasonable size for model input if necessary
-    max_chars = 5000
-    text_sample = (extracted_text or "")
-    truncated = False
-    if len(text_sample) > max_chars:
-        text_sample = text_sample[:max_chars]
-        truncated = True
-        _log_and_print("_build_bedrock_prompt: truncated extracted_text for model input")
+    # Pack the highest-value clauses into the prompt token budget instead of cutting at a fixed size
+    packed = pack_context(extracted_text, token_budget=COMPLIANCE_PROMPT_TOKEN_BUDGET)
+    text_sample = packed["text"]
+    truncated = packed["truncated"]
+    if truncated:
+        _log_and_print(
+            "_build_bedrock_prompt: packed %s/%s clauses, ~%s tokens",
+            packed["clauses_included"], packed["clauses_total"], packed["estimated_tokens"],
+        )
 
     prompt = (
         f"You are a compliance assistant.\n"
         f"As compliance checks differ based on region and industry, " "Do the checks based on the extracted region and industry \n"
         "like following:" "Data Privacy: GPDR for EU, CCPA for US, HIPAA for healthcare etc.\n" 
         "Security: SOC2, ISO, etc. " f"Consider Region: {region or 'unknown'}\n" f"Consider Industry: {industry or 'unknown'}\n"
-        f"Contract ID: {contract_id}\n"
-        f"S3 URI: {s3_uri}\n"
         f"Perform GDPR and SOX related compliance checks on the following extracted contract text.\n"
         f"Provide a concise human-readable summary of compliance issues, a severity rating (low/medium/high), and recommended remediation steps.\n"
-        f"Also include the heuristic findings (PII counts, financial indicators, GDPR keyword hits).\n\n"
+        f"Also include the heuristic findings (PII counts and keyword hits from the tenant's rule packs).\n"
+        f"Rule packs applied for this tenant: {', '.join(findings.get('rule_packs') or []) or 'none'}\n\n"
         f"Heuristic findings: {json.dumps(findings)}\n\n"
-        f"Contract text (truncated={truncated}):\n{text_sample}\n\n"
+        f"Contract text (truncated={truncated}; when truncated, the highest-signal clauses are kept in document order and [...] marks omitted text):\n{text_sample}\n\n"
         f"overall_compliance_score: <number 0-10 derived from identified clause scores (0-10)>,\n"
-        f"Return JSON object with keys: summary, severity, recommendations, details, overall_compliance. Keep the JSON parsable.\n"
+        f"Return JSON object with keys: overall_compliance, summary, severity, recommendations, details (emit overall_compliance first). Keep the JSON parsable.\n"
         f"overall_compliance format:\n"
         f"{{\n"
         f"  \"compliance_status\": \"PARTIAL|PASS|FAIL\",\n"
@@ -176,15 +197,42 @@ def _build_bedrock_prompt(
     return prompt
 
 
-def call_bedrock_summary(prompt: str, model_id: str = None) -> str:
+
+def _build_compact_prompt(
+    contract_id: str,
+    s3_uri: str,
+    numbered: Dict[str, Any],
+    findings: Dict[str, Any],
+    region: str,
+    industry: str,
+    partial: bool = False,
+) -> str:
+    """Compact-output variant of _build_bedrock_prompt: clauses are pre-numbered and answered by id.
+
+    partial: the block holds only the clauses without a stored assessment (clause-level review, see incremental.py).
+    """
+    _log_and_print("_build_compact_prompt: building compact prompt for bedrock model")
+    return (
+        "You are a compliance assistant. Check the clauses below against the frameworks that apply to the region and "
+        "industry (GDPR for EU, CCPA for US, HIPAA for healthcare, SOX, SOC2/ISO for security, etc.).\n"
+        f"Consider Region: {region or 'unknown'}\n"
+        f"Consider Industry: {industry or 'unknown'}\n"
+        f"Rule packs applied for this tenant: {', '.join(findings.get('rule_packs') or []) or 'none'}\n"
+        f"Heuristic findings: {json.dumps(findings)}\n\n"
+        + COMPLIANCE_COMPACT_FORMAT
+        + ("Some lower-signal clauses were omitted to fit the prompt budget (gaps in the numbering).\n" if numbered["truncated"] else "")
+        + ("Only clauses that need a fresh assessment are listed; assess just these.\n" if partial else "")
+        + "\nCLAUSES:\n" + numbered["block"]
+    )
+
+def call_bedrock_summary(prompt: str, model_id: str = None, tenant_id: Optional[str] = None) -> str:
     """Call Bedrock model to produce a compliance summary. Returns the raw model text output.
-    Uses the Bedrock Runtime API (invoke_model) with region fixed to us-east-1.
+    Uses the Bedrock Runtime API (invoke_model) through the shared invoker in agents/shared/bedrock_client.py.
 
     If no model_id is provided (via argument or BEDROCK_MODEL_ID env var), return a helpful error message
     instead of attempting to call Bedrock with an invalid default.
     """
     # Determine model id: prefer explicit argument, then env var
-    global output_text
     actual_model_id = model_id or BEDROCK_MODEL_ID or None
     _log_and_print(f"call_bedrock_summary: requested model_id={model_id} env_model={os.environ.get('BEDROCK_MODEL_ID')}")
 
@@ -198,62 +246,11 @@ def call_bedrock_summary(prompt: str, model_id: str = None) -> str:
 
     _log_and_print(f"call_bedrock_summary: invoking model {actual_model_id} in region {BEDROCK_REGION}")
 
-    # Build a chat-style payload that includes the required `messages` key.
-    body_dict = {
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {"text": prompt}
-                ]
-            }
-        ]
-    }
-
-    body = json.dumps(body_dict).encode("utf-8")
-    _log_and_print(f"call_bedrock_summary: request body size={len(body)} bytes")
-
     try:
-        response = bedrock.invoke_model(
-            modelId=actual_model_id,
-            contentType="application/json",
-            accept="application/json",
-            body=body,
-        )
-
-        # The response body is usually a streaming Body - read it
-        model_bytes = response.get("body")
-        if hasattr(model_bytes, "read"):
-            raw = model_bytes.read()
-        else:
-            raw = model_bytes
-
-        model_text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else str(raw)
-
-        # Some Bedrock responses return a JSON object with `outputs` -> content -> text
-        try:
-            parsed = json.loads(model_text)
-            # Try to extract common fields if present
-            output_text = ""
-            output_blocks = (
-                parsed.get("output", {})
-                .get("message", {})
-                .get("content", [])
-            )
-            if isinstance(output_blocks, list):
-                output_text = "".join(
-                    block.get("text", "")
-                    for block in output_blocks
-                    if isinstance(block, dict)
-                ).strip()
-
-        except Exception:
-            # not JSON or unexpected shape — keep raw model_text
-            pass
-
+        # shared invoker: rate limits, adaptive concurrency, jittered retries and the response cache
+        output_text = get_invoker().invoke_text(prompt, actual_model_id, tenant_id=tenant_id)
         print("model tex %s",output_text)
         return output_text
-
     except Exception as e:
         # Improve the error message for invalid model identifiers
         err_msg = str(e)
@@ -267,15 +264,122 @@ def call_bedrock_summary(prompt: str, model_id: str = None) -> str:
         })
 
 
+
+def stream_bedrock_summary(
+    prompt: str, model_id: str = None, tenant_id: Optional[str] = None, compact: bool = False,
+) -> Dict[str, Any]:
+    """Streaming variant of call_bedrock_summary.
+
+    overall_compliance (its short key "oc" for a compact prompt) is parsed from the stream as soon as it is
+    complete; with BEDROCK_STREAM_EARLY_STOP generation stops there. Returns {"text", "overall_compliance",
+    "complete"}; complete is False when generation was stopped early or the call failed.
+    """
+    actual_model_id = model_id or BEDROCK_MODEL_ID or None
+    if not actual_model_id:
+        return {"text": call_bedrock_summary(prompt, model_id, tenant_id), "overall_compliance": {}, "complete": False}
+
+    started = time.monotonic()
+
+    fields = list(COMPLIANCE_OVERALL_FIELDS) if compact else ["overall_compliance"]
+
+    def _expand(value: Any) -> Any:
+        if not compact:
+            return value
+        return expand_overall_compliance(value) if isinstance(value, dict) else None
+
+    def _on_field(name: str, value: Any) -> None:
+        name = COMPLIANCE_OVERALL_FIELDS.get(name, name) if compact else name
+        _log_and_print(f"stream_bedrock_summary: {name} ready after {time.monotonic() - started:.2f}s: {_expand(value)}")
+
+    _log_and_print(f"stream_bedrock_summary: streaming model {actual_model_id} in region {BEDROCK_REGION}")
+    try:
+        streamed = get_invoker().invoke_stream(
+            prompt,
+            actual_model_id,
+            tenant_id=tenant_id,
+            fields=fields,
+            on_field=_on_field,
+            stop_when_complete=BEDROCK_STREAM_EARLY_STOP,
+        )
+    except Exception as e:
+        _log_and_print(f"stream_bedrock_summary: bedrock streaming failed: {e}")
+        return {
+            "text": json.dumps({"summary": "Bedrock invocation failed", "error": str(e), "model_id_used": actual_model_id}),
+            "overall_compliance": {},
+            "complete": False,
+        }
+    return {
+        "text": streamed["text"],
+        "overall_compliance": _normalize_overall_compliance(_expand(streamed["fields"].get(fields[0]))),
+        "complete": streamed["complete"],
+    }
+
+def _incremental_summary(
+    contract_id: str,
+    s3_uri: str,
+    extracted_text: str,
+    findings: Dict[str, Any],
+    region: str,
+    industry: str,
+    tenant_id: Optional[str],
+    logical_id: Optional[str],
+    s3_key: Optional[str],
+    use_library: bool = False,
+) -> Dict[str, Any]:
+    """Clause-level review: only clauses without a stored assessment go to the model.
+
+    Stored assessments come from earlier versions of the same contract (agents/shared/incremental.py) and, with
+    use_library, from near-duplicates in the tenant's clause library (agents/shared/clause_library.py).
+    Returns {"text", "incremental"}; text has the full compliance schema merged from reused and new clause results,
+    or the model's error payload (and incremental None) when the pending clauses got no usable answer.
+    """
+    kind = f"compliance:{BEDROCK_MODEL_ID}"
+    run = get_lineage_store().begin(kind, tenant_id, logical_id, extracted_text)
+    library = get_clause_library_store().load(kind, tenant_id) if use_library else None
+    if library is not None:
+        # near-duplicates of already-assessed tenant clauses skip the model
+        run.reuse(library.match(run.pending))
+    compact: Dict[str, Any] = {}
+    # every pending clause must be assessed before the merged verdict is valid, so send them all in
+    # budget-sized batches rather than only the ones that fit one prompt
+    batches = render_batches(run.pending, COMPLIANCE_PROMPT_TOKEN_BUDGET)
+    pending_by_index = {c["index"]: c for c in run.pending}
+    for numbered in batches:
+        prompt = _build_compact_prompt(
+            contract_id, s3_uri, numbered, findings, region, industry,
+            partial=bool(run.reused or run.library_hits or len(batches) > 1),
+        )
+        raw = call_bedrock_summary(prompt, tenant_id=tenant_id)
+        answer = parse_fields(raw)
+        if "oc" not in answer and "ex" not in answer:
+            # failed or malformed answer: surface it as is, without a merged verdict; nothing is committed,
+            # so the clauses stay pending for the next run
+            _log_and_print(f"_incremental_summary: no usable model answer for contract {contract_id}")
+            return {"text": raw, "incremental": None}
+        run.record_answer(numbered["clauses"], answer.get("ex"))
+        if library is not None:
+            for clause in numbered["clauses"]:
+                library.add(pending_by_index[clause["index"]], run.assessments[clause["index"]])
+        # summary and severity from the first batch, remediation steps from all of them
+        compact = {**answer, **compact, "rc": (compact.get("rc") or []) + (answer.get("rc") or [])}
+    merged = run.merge_compliance(compact)
+    if library is not None:
+        library.save()
+    stats = run.commit(contract_id, s3_key)
+    _log_and_print(f"_incremental_summary: {stats}")
+    return {"text": json.dumps(expand_compliance(merged, run.clauses)), "incremental": stats}
+
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Lambda handler for compliance step. Accepts the ingestion output and returns a compliance summary.
     """
     _log_and_print("handler: compliance handler invoked")
+    set_invocation_deadline(context)
 
     contract_id = event.get("contract_id")
     s3_info = event.get("s3") or {}
     s3_uri = event.get("s3_uri") or f"s3://{s3_info.get('bucket', '')}/{s3_info.get('key', '')}"
-    extracted_text = event.get("extracted_text") or ""
+    extracted_text = load_extracted_text(event)
 
     tenant_id = extract_tenant_id_from_s3_key(s3_info.get("key"))
     tenant_cfg = load_tenant_config(tenant_id)
@@ -286,14 +390,41 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     _log_and_print(f"handler: tenant_id={tenant_id}, region={region}, industry={industry}")
 
     # Run heuristic analysis
-    findings = analyze_text_rules(extracted_text)
+    findings = analyze_text_rules(extracted_text, tenant_cfg)
 
     # Build prompt and call Bedrock for a human-friendly summary
-    prompt = _build_bedrock_prompt(contract_id, s3_uri, extracted_text, findings, region, industry)
-    model_output = call_bedrock_summary(prompt)
-
-    overall_compliance = {}
-    overall_compliance = _extract_overall_compliance(model_output)
+    logical_id = (
+        logical_contract_id(s3_info.get("key"), event.get("logical_contract_id")) if INCREMENTAL_ANALYSIS_ENABLED else None
+    )
+    use_library = library_enabled(tenant_cfg)
+    numbered = None
+    incremental = None
+    if logical_id or use_library:
+        # only clauses not assessed before (earlier versions, tenant clause library) go to the model
+        incremental = _incremental_summary(
+            contract_id, s3_uri, extracted_text, findings, region, industry, tenant_id, logical_id, s3_info.get("key"),
+            use_library,
+        )
+    elif COMPACT_OUTPUT_ENABLED:
+        # short keys + clause ids; expanded locally to the full schema below
+        numbered = numbered_clauses(extracted_text, token_budget=COMPLIANCE_PROMPT_TOKEN_BUDGET)
+        prompt = _build_compact_prompt(contract_id, s3_uri, numbered, findings, region, industry)
+    else:
+        prompt = _build_bedrock_prompt(contract_id, s3_uri, extracted_text, findings, region, industry)
+    model_output_complete = True
+    streamed_overall: Dict[str, Any] = {}
+    if incremental:
+        model_output = incremental["text"]
+    elif BEDROCK_STREAMING_ENABLED:
+        streamed = stream_bedrock_summary(prompt, tenant_id=tenant_id, compact=numbered is not None)
+        model_output = streamed["text"]
+        model_output_complete = streamed["complete"]
+        streamed_overall = streamed["overall_compliance"]
+    else:
+        model_output = call_bedrock_summary(prompt, tenant_id=tenant_id)
+    if numbered:
+        model_output = expand_compliance_text(model_output, numbered["clauses"])
+    overall_compliance = streamed_overall or _extract_overall_compliance(model_output)
 
     result = {
         "contract_id": contract_id,
@@ -304,6 +435,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         "model_response": model_output,
         "compliance_findings": overall_compliance,
     }
+    if not model_output_complete:
+        # generation was stopped once overall_compliance arrived (BEDROCK_STREAM_EARLY_STOP), or the call failed
+        result["model_response_complete"] = False
+    if incremental and incremental["incremental"]:
+        result["incremental"] = incremental["incremental"]
 
     _log_and_print("handler: compliance processing complete")
     return result
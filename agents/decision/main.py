@@ -1,21 +1,47 @@
 """
 Decision lambda for agentic flow.
 Decides next action based on compliance and risk analysis outputs.
+
+The decision comes from the tenant's compiled decision rules
+(agents/shared/decision_rules.py); tenants without "decision_rules" get the
+built-in chain: Legal Review on high risk, Escalate on non-compliance, Human
+Review on low confidence, else Auto-Approve.
+
+`batch_handler` re-decides stored results (e.g. a whole portfolio after a
+policy change) without running the pipeline again. With RESULTS_STORE_ENABLED
+every decision is also appended to the columnar results store
+(agents/shared/results_store.py) that what_if.py simulates over; with
+COMPLETED_RESULTS_ENABLED it is recorded as the completed result for the
+document's content hash, so the invoke lambda can skip re-runs.
 """
 
 import json
 import logging
-from typing import Any, Dict, Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional
 import os
 import sys
+import time
 
 # Add shared/ to path for tenant helpers
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "shared")))
-from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config
+from agents.shared.decision_rules import get_compiled_rules
+from agents.shared.extraction_cache import content_hash_for_s3_object
+from agents.shared.results_store import (
+    COMPLETED_RESULTS_ENABLED,
+    RESULTS_STORE_ENABLED,
+    get_completed_results,
+    get_results_store,
+    result_row,
+)
+from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config, warm_tenant_config
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# warm the tenant config cache at cold start
+warm_tenant_config()
+
 
 def _log(msg: str) -> None:
     print(msg)
@@ -93,6 +119,24 @@ def _resolve_thresholds(event: Dict[str, Any]) -> Dict[str, float]:
     }
 
 
+def _decision_inputs(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Rule inputs from a decision event, or from a stored result (decision output or final pipeline output)."""
+    compliance_findings = record.get("compliance_findings") or {}
+    risk_findings = record.get("risk_analysis_findings") or record.get("risk_findings") or {}
+
+    def _pick(findings: Dict[str, Any], key: str) -> Optional[float]:
+        value = _to_float(findings.get(key))
+        return value if value is not None else _to_float(record.get(key))
+
+    compliance_status_raw = _extract_compliance_status(record)
+    return {
+        "overall_risk_score": _pick(risk_findings, "overall_risk_score"),
+        "overall_confidence": _pick(risk_findings, "overall_confidence"),
+        "overall_compliance_score": _pick(compliance_findings, "overall_compliance_score"),
+        "compliance_status": _normalize_compliance_status(compliance_status_raw) or compliance_status_raw,
+    }
+
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     _log("handler: decision lambda invoked")
 
@@ -104,40 +148,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     confidence_threshold = thresholds["confidence_threshold"]
     _log(f"handler: thresholds risk_score_threshold={risk_score_threshold}, confidence_threshold={confidence_threshold}")
 
-    compliance_status_raw = _extract_compliance_status(event)
-    compliance_status = _normalize_compliance_status(compliance_status_raw)
-
-    overall_risk_score = _to_float(risk_findings.get("overall_risk_score"))
-    overall_confidence = _to_float(risk_findings.get("overall_confidence"))
-
-    decision = "Auto-Approve"
-    reason = "Default approval"
-
-    if overall_risk_score is not None and overall_risk_score >= risk_score_threshold:
-        decision = "Legal Review"
-        reason = f"overall_risk_score={overall_risk_score} >= {risk_score_threshold}"
-    elif compliance_status == "Non-Compliant":
-        decision = "Escalate"
-        reason = "compliance_status=Non-Compliant"
-    elif overall_confidence is not None and overall_confidence < confidence_threshold:
-        decision = "Human Review"
-        reason = f"overall_confidence={overall_confidence} < {confidence_threshold}"
+    inputs = _decision_inputs({
+        "compliance_status": event.get("compliance_status"),
+        "compliance_findings": compliance_findings,
+        "risk_analysis_findings": risk_findings,
+    })
+    rules = get_compiled_rules(load_tenant_config(thresholds.get("tenant_id")))
+    decision, reason, matched_rule = rules.decide(inputs)
 
     result = {
         "contract_id": event.get("contract_id"),
         "s3": event.get("s3"),
         "s3_uri": event.get("s3_uri"),
-        "compliance_status": compliance_status or compliance_status_raw,
-        "overall_compliance_score": _to_float(compliance_findings.get("overall_compliance_score")),
-        "overall_risk_score": overall_risk_score,
-        "overall_confidence": overall_confidence,
+        "compliance_status": inputs["compliance_status"],
+        "overall_compliance_score": inputs["overall_compliance_score"],
+        "overall_risk_score": inputs["overall_risk_score"],
+        "overall_confidence": inputs["overall_confidence"],
         "decision": decision,
         "reason": reason,
+        "matched_rule": matched_rule,
         "thresholds": {
             "risk_score_threshold": risk_score_threshold,
             "confidence_threshold": confidence_threshold,
         },
         "tenant_id": thresholds.get("tenant_id"),
+        "review_mode": event.get("review_mode"),
+        "model_tier": event.get("model_tier"),
+        "decided_at": time.time(),
         "inputs": {
             "compliance_findings": compliance_findings,
             "risk_analysis_findings": risk_findings,
@@ -145,5 +182,93 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
 
     _log(f"handler: decision={decision} reason={reason}")
+    if RESULTS_STORE_ENABLED:
+        try:
+            get_results_store().append(result_row(result))
+        except Exception as e:
+            # history is best-effort; never fail the decision over it
+            logger.warning("handler: results store append failed: %s", e)
+    if COMPLETED_RESULTS_ENABLED:
+        if inputs["compliance_status"] is None or inputs["overall_risk_score"] is None:
+            # an analysis step returned no verdict (e.g. a failed model call): let a re-upload run the pipeline again
+            _log("handler: incomplete analysis inputs, not recording a completed result")
+        else:
+            _record_completed(result)
     return result
 
+
+def _record_completed(result: Dict[str, Any]) -> None:
+    s3_info = result.get("s3") or {}
+    if not s3_info.get("bucket") or not s3_info.get("key"):
+        return
+    try:
+        import boto3
+        content_hash = content_hash_for_s3_object(boto3.client("s3"), s3_info["bucket"], s3_info["key"])
+        get_completed_results().put(result.get("tenant_id"), content_hash, result)
+    except Exception as e:
+        logger.warning("_record_completed: failed for %s: %s", result.get("s3_uri"), e)
+
+
+def _load_results(event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if isinstance(event.get("results"), list):
+        return event["results"]
+    ref = event.get("results_s3") or {}
+    if not ref.get("bucket") or not ref.get("key"):
+        return []
+    import boto3
+    body = boto3.client("s3").get_object(Bucket=ref["bucket"], Key=ref["key"])["Body"].read().decode("utf-8")
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+
+def decide_batch(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Re-decide stored results with each tenant's current rules; rules compile once per tenant."""
+    rules_by_tenant: Dict[Optional[str], Any] = {}
+    decisions = []
+    for record in records:
+        tenant_id = record.get("tenant_id") or extract_tenant_id_from_s3_key((record.get("s3") or {}).get("key"))
+        rules = rules_by_tenant.get(tenant_id)
+        if rules is None:
+            rules = rules_by_tenant[tenant_id] = get_compiled_rules(load_tenant_config(tenant_id))
+        decision, reason, matched_rule = rules.decide(_decision_inputs(record))
+        previous = record.get("decision")
+        if isinstance(previous, dict):
+            previous = previous.get("decision")
+        decisions.append({
+            "contract_id": record.get("contract_id"),
+            "tenant_id": tenant_id,
+            "decision": decision,
+            "reason": reason,
+            "matched_rule": matched_rule,
+            "previous_decision": previous,
+            "changed": previous is not None and previous != decision,
+        })
+    return decisions
+
+
+def batch_handler(event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
+    """Re-decide many stored results at once.
+
+    Input: {"results": [...]} or {"results_s3": {"bucket", "key"}} (JSONL), each record a decision output, a
+    final pipeline output or a decision event; optional "output_s3": {"bucket", "key"} receives the decisions
+    as JSONL instead of returning them inline.
+    """
+    records = _load_results(event)
+    decisions = decide_batch(records)
+    summary = {
+        "total": len(decisions),
+        "by_decision": dict(Counter(d["decision"] for d in decisions)),
+        "changed": sum(1 for d in decisions if d["changed"]),
+    }
+    _log(f"batch_handler: {summary}")
+
+    out = event.get("output_s3") or {}
+    if out.get("bucket") and out.get("key"):
+        import boto3
+        boto3.client("s3").put_object(
+            Bucket=out["bucket"],
+            Key=out["key"],
+            Body="\n".join(json.dumps(d) for d in decisions).encode("utf-8"),
+            ContentType="application/x-ndjson",
+        )
+        return {"summary": summary, "output_s3": out}
+    return {"summary": summary, "decisions": decisions}
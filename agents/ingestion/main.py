@@ -1,18 +1,117 @@
 # File: agents/ingestion/main.py
 import boto3
+import io
+import json
+import re
 import time
 import logging
 import os
+import sys
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Ensure repo root is on sys.path so shared helpers import when run from this folder
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from agents.shared.claim_check import attach_extracted_text
+from agents.shared.extraction_cache import build_extraction_cache, content_hash_for_s3_object
+from agents.shared.image_preprocess import HAS_PIL, TEXTRACT_SYNC_MAX_BYTES, preprocess_image_pages
+from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config, warm_tenant_config
+from agents.shared.textract_jobs import (
+    STATUS_SUCCEEDED,
+    LocalJobStore,
+    S3JobStore,
+    TextractJobManager,
+    parse_completion_messages,
+)
+
+try:
+    from PyPDF2 import PdfReader, PdfWriter
+    HAS_PDF = True
+except Exception:
+    PdfReader = None
+    PdfWriter = None
+    HAS_PDF = False
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# warm the tenant config cache at cold start
+warm_tenant_config()
+
 # Use AWS_REGION environment variable if present, otherwise default to us-east-1
 AWS_REGION = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or "us-east-1"
 
 s3 = boto3.client("s3", region_name=AWS_REGION)
 textract = boto3.client("textract", region_name=AWS_REGION)
+sfn = boto3.client("stepfunctions", region_name=AWS_REGION)
+
+# "poll" keeps the original wait-in-Lambda behaviour; "notify" starts the Textract job with an
+# SNS completion channel and returns a job handle that `completion_handler` resumes later.
+# Notify mode only applies to invocations carrying a Step Functions task token (.waitForTaskToken):
+# without one nothing would wait for the completion, so those invocations poll.
+TEXTRACT_COMPLETION_MODE = os.environ.get("TEXTRACT_COMPLETION_MODE", "poll")
+# Bucket for job records in notify mode; a local JSON file is used when unset
+TEXTRACT_JOB_BUCKET = os.environ.get("TEXTRACT_JOB_BUCKET")
+TEXTRACT_JOB_STORE_PATH = os.environ.get("TEXTRACT_JOB_STORE_PATH", "/tmp/textract_jobs.json")
+
+# Born-digital PDFs: read the embedded text layer and only OCR pages that have none
+PDF_TEXT_LAYER_ENABLED = os.environ.get("PDF_TEXT_LAYER_ENABLED", "true").lower() == "true"
+# Pages with fewer non-whitespace characters than this are treated as scanned
+PDF_TEXT_LAYER_MIN_CHARS = int(os.environ.get("PDF_TEXT_LAYER_MIN_CHARS", "40"))
+# Above this many scanned pages the whole document goes to async Textract instead
+PDF_MAX_SYNC_OCR_PAGES = int(os.environ.get("PDF_MAX_SYNC_OCR_PAGES", "10"))
+# Large PDFs are split into page-range shards that go through async Textract concurrently
+PDF_SHARD_MIN_PAGES = int(os.environ.get("PDF_SHARD_MIN_PAGES", "100"))
+PDF_SHARD_PAGES = int(os.environ.get("PDF_SHARD_PAGES", "50"))
+# Shards go to PDF_SHARD_BUCKET when set, else under PDF_SHARD_PREFIX in the upload bucket; the invoke
+# lambda ignores that prefix (INVOKE_IGNORED_PREFIXES) so shard uploads never start a pipeline
+PDF_SHARD_BUCKET = os.environ.get("PDF_SHARD_BUCKET")
+PDF_SHARD_PREFIX = os.environ.get("PDF_SHARD_PREFIX", "tmp/shards/")
+# Downscale/grayscale/recompress images (and split multi-page TIFFs) before sync Textract
+IMAGE_PREPROCESS_ENABLED = os.environ.get("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+# Bounded pool shared by shard jobs and per-page sync OCR calls
+TEXTRACT_MAX_WORKERS = int(os.environ.get("TEXTRACT_MAX_WORKERS", "8"))
+
+_job_manager: Optional[TextractJobManager] = None
+_extraction_cache = None
+
+
+def _get_job_manager() -> TextractJobManager:
+    global _job_manager
+    if _job_manager is None:
+        if TEXTRACT_JOB_BUCKET:
+            store = S3JobStore(s3, TEXTRACT_JOB_BUCKET)
+        else:
+            store = LocalJobStore(TEXTRACT_JOB_STORE_PATH)
+        _job_manager = TextractJobManager(textract, store)
+    return _job_manager
+
+
+def _get_extraction_cache():
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = build_extraction_cache(s3) or False
+    return _extraction_cache or None
+
+
+def _lookup_cached_extraction(bucket: str, key: str):
+    """Return (content_hash, cached_entry). Both are None when caching is off or the lookup fails."""
+    cache = _get_extraction_cache()
+    if cache is None:
+        return None, None
+    try:
+        content_hash = content_hash_for_s3_object(s3, bucket, key)
+    except Exception as e:
+        logger.warning("Could not compute content hash for s3://%s/%s: %s", bucket, key, e)
+        return None, None
+    return content_hash, cache.get(content_hash)
+
+
+def _store_cached_extraction(content_hash: Optional[str], pages: List[Dict[str, Any]], s3_uri: str) -> None:
+    cache = _get_extraction_cache()
+    if cache is not None and content_hash:
+        cache.put(content_hash, _pages_to_text(pages), pages, source=s3_uri)
 
 
 def _get_s3_object_bytes(bucket: str, key: str) -> bytes:
@@ -20,13 +119,44 @@ def _get_s3_object_bytes(bucket: str, key: str) -> bytes:
     return resp["Body"].read()
 
 
-def _extract_text_from_bytes_image(image_bytes: bytes) -> str:
+def _add_lines_by_page(blocks: List[Dict[str, Any]], pages: Dict[int, List[str]]) -> None:
+    for b in blocks:
+        if b.get("BlockType") == "LINE":
+            pages.setdefault(int(b.get("Page") or 1), []).append(b.get("Text", ""))
+
+
+def _pages_to_list(pages: Dict[int, List[str]]) -> List[Dict[str, Any]]:
+    return [{"page": n, "lines": pages[n]} for n in sorted(pages)]
+
+
+def _pages_to_text(pages: List[Dict[str, Any]]) -> str:
+    return "\n".join(line for p in pages for line in p["lines"])
+
+
+def _extract_pages_from_bytes_image(image_bytes: bytes) -> List[Dict[str, Any]]:
     resp = textract.detect_document_text(Document={"Bytes": image_bytes})
-    lines = [b.get("Text", "") for b in resp.get("Blocks", []) if b.get("BlockType") == "LINE"]
-    return "\n".join(lines)
+    pages: Dict[int, List[str]] = {}
+    _add_lines_by_page(resp.get("Blocks", []), pages)
+    return _pages_to_list(pages)
+
+
+def _collect_textract_pages(job_id: str, first_page: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Read all result pages of a finished text-detection job and group the LINE blocks by document page."""
+    resp = first_page or textract.get_document_text_detection(JobId=job_id)
+    pages: Dict[int, List[str]] = {}
+    _add_lines_by_page(resp.get("Blocks", []), pages)
+
+    next_token = resp.get("NextToken")
+    # fetch remaining pages if any
+    while next_token:
+        resp = textract.get_document_text_detection(JobId=job_id, NextToken=next_token)
+        _add_lines_by_page(resp.get("Blocks", []), pages)
+        next_token = resp.get("NextToken")
 
+    return _pages_to_list(pages)
 
-def _extract_text_from_s3_pdf(bucket: str, key: str, max_wait_seconds: int = 300, poll_interval: float = 2.0) -> str:
+
+def _extract_pages_from_s3_pdf(bucket: str, key: str, max_wait_seconds: int = 300, poll_interval: float = 2.0) -> List[Dict[str, Any]]:
     # Start asynchronous job (Textract requires S3 for PDF)
     start = textract.start_document_text_detection(DocumentLocation={"S3Object": {"Bucket": bucket, "Name": key}})
     job_id = start.get("JobId")
@@ -34,25 +164,12 @@ def _extract_text_from_s3_pdf(bucket: str, key: str, max_wait_seconds: int = 300
         raise RuntimeError(f"Failed to start Textract job for s3://{bucket}/{key}")
 
     deadline = time.time() + max_wait_seconds
-    text_lines = []
 
     while time.time() < deadline:
         status_resp = textract.get_document_text_detection(JobId=job_id)
         status = status_resp.get("JobStatus")
         if status == "SUCCEEDED":
-            # collect first page
-            blocks = status_resp.get("Blocks", [])
-            text_lines.extend([b.get("Text", "") for b in blocks if b.get("BlockType") == "LINE"])
-
-            next_token = status_resp.get("NextToken")
-            # fetch remaining pages if any
-            while next_token:
-                page = textract.get_document_text_detection(JobId=job_id, NextToken=next_token)
-                blocks = page.get("Blocks", [])
-                text_lines.extend([b.get("Text", "") for b in blocks if b.get("BlockType") == "LINE"])
-                next_token = page.get("NextToken")
-
-            return "\n".join(text_lines)
+            return _collect_textract_pages(job_id, first_page=status_resp)
         elif status == "FAILED":
             raise RuntimeError(f"Textract job failed for s3://{bucket}/{key}")
 
@@ -61,6 +178,172 @@ def _extract_text_from_s3_pdf(bucket: str, key: str, max_wait_seconds: int = 300
     raise TimeoutError(f"Timed out waiting for Textract job {job_id} for s3://{bucket}/{key}")
 
 
+def _is_scanned_page(page_text: str) -> bool:
+    return len(re.sub(r"\s+", "", page_text or "")) < PDF_TEXT_LAYER_MIN_CHARS
+
+
+def _single_page_pdf_bytes(reader, index: int) -> bytes:
+    writer = PdfWriter()
+    writer.add_page(reader.pages[index])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def _extract_pages_hybrid(pdf_bytes: bytes) -> Optional[List[Dict[str, Any]]]:
+    """Extract a PDF from its embedded text layer, sending only scanned pages to Textract (sync, one page each).
+
+    Returns pages in document order, or None when the PDF cannot be read locally or has too
+    many scanned pages; the caller then falls back to whole-document async Textract.
+    """
+    try:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        texts = []
+        for p in reader.pages:
+            try:
+                texts.append(p.extract_text() or "")
+            except Exception:
+                texts.append("")
+    except Exception as e:
+        logger.warning("Could not read PDF text layer, falling back to Textract: %s", e)
+        return None
+
+    scanned = {i for i, t in enumerate(texts) if _is_scanned_page(t)}
+    if len(scanned) > PDF_MAX_SYNC_OCR_PAGES:
+        logger.info("%d of %d pages have no usable text layer; using async Textract", len(scanned), len(texts))
+        return None
+
+    # OCR the scanned pages concurrently; results are merged back by page index below
+    ocr_lines: Dict[int, List[str]] = {}
+    if scanned:
+        def _ocr(i: int) -> List[str]:
+            ocr_pages = _extract_pages_from_bytes_image(_single_page_pdf_bytes(reader, i))
+            return [line for p in ocr_pages for line in p["lines"]]
+
+        ordered = sorted(scanned)
+        with ThreadPoolExecutor(max_workers=min(TEXTRACT_MAX_WORKERS, len(ordered))) as pool:
+            ocr_lines = dict(zip(ordered, pool.map(_ocr, ordered)))
+
+    pages = []
+    for i, text in enumerate(texts):
+        if i in scanned:
+            pages.append({"page": i + 1, "lines": ocr_lines[i], "source": "textract"})
+        else:
+            lines = [line.strip() for line in text.splitlines() if line.strip()]
+            pages.append({"page": i + 1, "lines": lines, "source": "text_layer"})
+
+    logger.info("Hybrid PDF extraction: %d page(s) from text layer, %d via Textract", len(texts) - len(scanned), len(scanned))
+    return pages
+
+
+def _shard_ranges(page_count: int, shard_pages: int) -> List[Tuple[int, int]]:
+    """Split [0, page_count) into consecutive (start, end) page ranges of at most shard_pages."""
+    size = max(1, shard_pages)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def _extract_pages_sharded(bucket: str, key: str, pdf_bytes: bytes) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """Extract a large PDF as concurrent async Textract jobs over page-range shards.
+
+    Each shard is written to S3 (PDF_SHARD_BUCKET, or PDF_SHARD_PREFIX in the upload bucket), extracted
+    with the poll path on a bounded thread pool, re-numbered with its page offset and deleted once the
+    pages are reassembled. Returns (pages, shard_stats), or None when the PDF is too small to shard or
+    cannot be split locally.
+    """
+    if not HAS_PDF:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        page_count = len(reader.pages)
+    except Exception as e:
+        logger.warning("Could not read PDF for sharding: %s", e)
+        return None
+    if page_count < PDF_SHARD_MIN_PAGES:
+        return None
+
+    ranges = _shard_ranges(page_count, PDF_SHARD_PAGES)
+    shard_bucket = PDF_SHARD_BUCKET or bucket
+    run_prefix = f"{PDF_SHARD_PREFIX.rstrip('/')}/{uuid.uuid4().hex}"
+    shard_keys = []
+
+    def _run_shard(args) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        (start, end), shard_key = args
+        t0 = time.time()
+        shard_pages = _extract_pages_from_s3_pdf(shard_bucket, shard_key)
+        for p in shard_pages:
+            p["page"] += start
+        stats = {"pages": f"{start + 1}-{end}", "seconds": round(time.time() - t0, 3)}
+        logger.info("Shard %s of s3://%s/%s extracted in %.2fs", stats["pages"], bucket, key, stats["seconds"])
+        return shard_pages, stats
+
+    try:
+        for start, end in ranges:
+            writer = PdfWriter()
+            for i in range(start, end):
+                writer.add_page(reader.pages[i])
+            buf = io.BytesIO()
+            writer.write(buf)
+            shard_key = f"{run_prefix}/{start + 1:05d}-{end:05d}.pdf"
+            s3.put_object(Bucket=shard_bucket, Key=shard_key, Body=buf.getvalue(), ContentType="application/pdf")
+            shard_keys.append(shard_key)
+        with ThreadPoolExecutor(max_workers=min(TEXTRACT_MAX_WORKERS, len(ranges))) as pool:
+            shard_results = list(pool.map(_run_shard, zip(ranges, shard_keys)))
+    finally:
+        # also removes the shards already written when a later write or extraction fails
+        for shard_key in shard_keys:
+            try:
+                s3.delete_object(Bucket=shard_bucket, Key=shard_key)
+            except Exception:
+                logger.warning("Could not delete shard s3://%s/%s", shard_bucket, shard_key)
+
+    # pool.map keeps submission order, so shards are already in page order
+    pages = [p for shard_pages, _ in shard_results for p in shard_pages]
+    shard_stats = [stats for _, stats in shard_results]
+    return pages, shard_stats
+
+
+def _extract_pages_from_image(bucket: str, key: str, image_bytes: bytes) -> List[Dict[str, Any]]:
+    """OCR an image object: pre-process it, submit its pages to sync Textract concurrently,
+    and route inputs still above the sync size limit to async Textract on the original S3 object."""
+    frames = None
+    if HAS_PIL and IMAGE_PREPROCESS_ENABLED:
+        try:
+            frames = preprocess_image_pages(image_bytes)
+        except Exception as e:
+            logger.warning("Image pre-processing failed for s3://%s/%s, using raw bytes: %s", bucket, key, e)
+    if frames is None:
+        frames = [image_bytes]
+
+    if any(len(f) > TEXTRACT_SYNC_MAX_BYTES for f in frames):
+        # the async API reads the object from S3 and accepts large JPEG/PNG/TIFF inputs
+        logger.info("Image s3://%s/%s exceeds the sync limit; using async Textract", bucket, key)
+        return _extract_pages_from_s3_pdf(bucket, key)
+
+    if len(frames) == 1:
+        return _extract_pages_from_bytes_image(frames[0])
+
+    with ThreadPoolExecutor(max_workers=min(TEXTRACT_MAX_WORKERS, len(frames))) as pool:
+        frame_pages = list(pool.map(_extract_pages_from_bytes_image, frames))
+    return [
+        {"page": i + 1, "lines": [line for p in fp for line in p["lines"]]}
+        for i, fp in enumerate(frame_pages)
+    ]
+
+
+def _submit_pdf_textract_job(
+    bucket: str, key: str, contract_id: str, task_token: Optional[str], content_hash: Optional[str] = None
+) -> Dict[str, Any]:
+    """Hand the PDF to the job manager (notify mode) and return a job handle for the caller."""
+    job = _get_job_manager().submit(
+        bucket,
+        key,
+        context={"contract_id": contract_id, "content_hash": content_hash},
+        task_token=task_token,
+    )
+    logger.info("Submitted Textract job handle=%s status=%s", job["handle"], job["status"])
+    return {"handle": job["handle"], "job_id": job.get("job_id"), "status": job["status"]}
+
+
 def _extract_text_from_txt_bytes(txt_bytes: bytes) -> str:
     try:
         return txt_bytes.decode("utf-8")
@@ -68,13 +351,26 @@ def _extract_text_from_txt_bytes(txt_bytes: bytes) -> str:
         return txt_bytes.decode("latin-1", errors="replace")
 
 
+def _build_result(contract_id: str, bucket: str, key: str, extracted_text: str) -> Dict[str, Any]:
+    result = {
+        "contract_id": contract_id,
+        "s3": {"bucket": bucket, "key": key},
+        "s3_uri": f"s3://{bucket}/{key}",
+        # "combined" routes the state machine to the single-call compliance+risk review
+        "review_mode": load_tenant_config(extract_tenant_id_from_s3_key(key)).get("review_mode") or "separate",
+    }
+    # Large documents go to S3 and travel as extracted_text_ref (claim check)
+    return attach_extracted_text(result, extracted_text, default_bucket=bucket, s3_client=s3)
+
+
 def handler(event, context):
     """
     Lambda handler for ingestion.
     Expected event:
       {
         "contract_id": "abc-123" (optional — will be generated if missing),
-        "s3": { "bucket": "my-bucket", "key": "contracts/abc.pdf" }
+        "s3": { "bucket": "my-bucket", "key": "contracts/abc.pdf" },
+        "task_token": "..." (optional — Step Functions .waitForTaskToken token)
       }
     Returns:
       {
@@ -83,6 +379,11 @@ def handler(event, context):
         "s3_uri": "s3://.../...",
         "extracted_text": "..."
       }
+    Documents above CLAIM_CHECK_THRESHOLD_BYTES return "extracted_text_ref" (a gzip S3 object
+    reference, see agents/shared/claim_check.py) instead of inline "extracted_text".
+    In notify mode (TEXTRACT_COMPLETION_MODE=notify and a task_token is passed) PDFs return
+    "status": "PENDING" and a "textract_job" handle instead of extracted_text; the
+    result is sent to the task token by `completion_handler` once Textract reports completion.
     """
     raw_contract_id = event.get("contract_id")
     # generate a UUID if contract_id is missing or empty
@@ -100,16 +401,62 @@ def handler(event, context):
     _, ext = os.path.splitext(key.lower())
     ext = ext.lstrip(".")
     s3_uri = f"s3://{bucket}/{key}"
+    task_token = event.get("task_token")
 
     try:
-        if ext in ("png", "jpg", "jpeg", "tiff", "bmp"):
+        content_hash, cached = None, None
+        if ext not in ("txt",):
+            # Content-addressed lookup before any Textract call
+            content_hash, cached = _lookup_cached_extraction(bucket, key)
+
+        notify_mode = TEXTRACT_COMPLETION_MODE == "notify" and bool(task_token)
+        if TEXTRACT_COMPLETION_MODE == "notify" and not task_token:
+            logger.warning("TEXTRACT_COMPLETION_MODE=notify but no task_token in the event; polling Textract instead")
+        hybrid_pages, pdf_bytes, extraction_info = None, None, None
+        # the local PDF copy feeds the text-layer fast path and (poll mode only) sharding
+        if not cached and ext == "pdf" and HAS_PDF and (PDF_TEXT_LAYER_ENABLED or not notify_mode):
+            pdf_bytes = _get_s3_object_bytes(bucket, key)
+            if PDF_TEXT_LAYER_ENABLED:
+                hybrid_pages = _extract_pages_hybrid(pdf_bytes)
+
+        if cached:
+            logger.info("Extraction cache hit for %s (%s)", s3_uri, content_hash)
+            extracted_text = cached["extracted_text"]
+
+        elif hybrid_pages is not None:
+            logger.info("Extracted PDF from embedded text layer")
+            _store_cached_extraction(content_hash, hybrid_pages, s3_uri)
+            extracted_text = _pages_to_text(hybrid_pages)
+
+        elif ext in ("png", "jpg", "jpeg", "tiff", "bmp"):
             logger.info("Extracting text from image via Textract (sync)")
             image_bytes = _get_s3_object_bytes(bucket, key)
-            extracted_text = _extract_text_from_bytes_image(image_bytes)
+            pages = _extract_pages_from_image(bucket, key, image_bytes)
+            _store_cached_extraction(content_hash, pages, s3_uri)
+            extracted_text = _pages_to_text(pages)
+
+        elif ext == "pdf" and notify_mode:
+            logger.info("Submitting PDF to Textract (async, completion notification)")
+            textract_job = _submit_pdf_textract_job(bucket, key, contract_id, task_token, content_hash)
+            return {
+                "contract_id": contract_id,
+                "s3": {"bucket": bucket, "key": key},
+                "s3_uri": s3_uri,
+                "status": "PENDING",
+                "textract_job": textract_job,
+            }
 
         elif ext == "pdf":
-            logger.info("Extracting text from PDF via Textract (async)")
-            extracted_text = _extract_text_from_s3_pdf(bucket, key)
+            sharded = _extract_pages_sharded(bucket, key, pdf_bytes) if pdf_bytes else None
+            if sharded is not None:
+                pages, shard_stats = sharded
+                logger.info("Extracted PDF via %d concurrent Textract shards", len(shard_stats))
+                extraction_info = {"mode": "sharded", "shards": shard_stats}
+            else:
+                logger.info("Extracting text from PDF via Textract (async)")
+                pages = _extract_pages_from_s3_pdf(bucket, key)
+            _store_cached_extraction(content_hash, pages, s3_uri)
+            extracted_text = _pages_to_text(pages)
 
         elif ext in ("txt",):
             logger.info("Reading text file from S3")
@@ -120,17 +467,66 @@ def handler(event, context):
             # fallback: attempt to read raw bytes and try textract detect (works for many image-like formats)
             logger.info("Unknown extension, attempting to read and run Textract detect_document_text")
             raw_bytes = _get_s3_object_bytes(bucket, key)
-            extracted_text = _extract_text_from_bytes_image(raw_bytes)
+            pages = _extract_pages_from_bytes_image(raw_bytes)
+            extracted_text = _pages_to_text(pages)
             if not extracted_text:
                 raise ValueError(f"Unsupported or empty extraction for s3://{bucket}/{key}")
+            _store_cached_extraction(content_hash, pages, s3_uri)
 
-        return {
-            "contract_id": contract_id,
-            "s3": {"bucket": bucket, "key": key},
-            "s3_uri": s3_uri,
-            "extracted_text": extracted_text,
-        }
+        result = _build_result(contract_id, bucket, key, extracted_text)
+        if extraction_info:
+            result["extraction"] = extraction_info
+        if task_token:
+            # a .waitForTaskToken caller waits on the token, not on this return value
+            sfn.send_task_success(taskToken=task_token, output=json.dumps(result))
+        return result
 
     except Exception:
         logger.exception("Failed to extract text")
         raise
+
+
+def completion_handler(event, context):
+    """
+    Lambda handler for Textract completion notifications (SNS, or SQS subscribed to the topic).
+    For each finished job it collects the text, builds the same payload `handler` returns and,
+    if the job carried a Step Functions task token, completes that task. Queued jobs are
+    started as capacity frees up.
+    """
+    manager = _get_job_manager()
+    results = []
+
+    for msg in parse_completion_messages(event):
+        job_id = msg.get("JobId")
+        status = msg.get("Status")
+        job = manager.complete(msg.get("JobTag"), job_id, status)
+        if job is None:
+            continue
+
+        bucket, key = job["bucket"], job["key"]
+        job_context = job.get("context") or {}
+        contract_id = job_context.get("contract_id") or str(uuid.uuid4())
+        task_token = job.get("task_token")
+
+        try:
+            if status != STATUS_SUCCEEDED:
+                raise RuntimeError(f"Textract job {job_id} finished with status {status} for s3://{bucket}/{key}")
+
+            pages = _collect_textract_pages(job_id)
+            _store_cached_extraction(job_context.get("content_hash"), pages, f"s3://{bucket}/{key}")
+            result = _build_result(contract_id, bucket, key, _pages_to_text(pages))
+            if task_token:
+                sfn.send_task_success(taskToken=task_token, output=json.dumps(result))
+            results.append({"handle": job["handle"], "status": "SUCCEEDED", "result": result})
+
+        except Exception as e:
+            logger.exception("Failed to complete Textract job %s", job_id)
+            if task_token:
+                sfn.send_task_failure(taskToken=task_token, error="TextractJobFailed", cause=str(e)[:256])
+            results.append({"handle": job["handle"], "status": "FAILED", "error": str(e)})
+
+    started = manager.drain()
+    if started:
+        logger.info("Started %d queued Textract job(s)", len(started))
+
+    return {"results": results, "started": [j["handle"] for j in started]}
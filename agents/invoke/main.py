@@ -9,18 +9,36 @@ Expected S3 event records (standard S3 Put event schema). The handler constructs
     "s3_uri": "s3://.../..."
 }
 
+Records are started concurrently (at most INVOKE_MAX_CONCURRENCY at a time).
+Execution names are derived from bucket, key and ETag, so a duplicate S3
+notification for the same object version maps to the same execution and Step
+Functions deduplicates it (ExecutionAlreadyExists is reported as "duplicate").
+Only a RUNNING or SUCCEEDED execution counts as a duplicate: when the existing
+one FAILED, TIMED_OUT or was ABORTED, a new attempt is started under the same
+name with an "-a<n>" suffix.
+With COMPLETED_RESULTS_ENABLED, a document whose content hash already has a
+completed result for the tenant is skipped (see agents/shared/results_store.py).
+Objects the pipeline itself writes to the upload bucket (INVOKE_IGNORED_PREFIXES,
+e.g. PDF shards and claim-check objects) are ignored, since S3 notifications cannot exclude a prefix.
+
 This implementation is intentionally minimal and includes print/logger statements
 in each helper for observability.
 """
 import os
+import sys
 import json
+import hashlib
 import logging
-import uuid
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import unquote_plus
-from datetime import datetime, timezone
 
 import boto3
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from agents.shared.extraction_cache import content_hash_for_s3_object
+from agents.shared.results_store import COMPLETED_RESULTS_ENABLED, get_completed_results
+from agents.shared.tenant_context import extract_tenant_id_from_s3_key
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -29,7 +47,53 @@ REGION = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or
 # State machine ARN must be supplied via environment variable at runtime
 STATE_MACHINE_ARN = os.environ.get("STATE_MACHINE_ARN") or "arn:aws:states:us-east-1:968239734180:stateMachine:agentic-compliance-automation-dev-state-machine"
 
+INVOKE_MAX_CONCURRENCY = int(os.environ.get("INVOKE_MAX_CONCURRENCY", "8"))
+# retries of a failed document before giving up (each attempt is a separate execution name)
+INVOKE_MAX_ATTEMPTS = int(os.environ.get("INVOKE_MAX_ATTEMPTS", "20"))
+# an existing execution in one of these states already covers the document
+DEDUP_STATUSES = ("RUNNING", "SUCCEEDED")
+# pipeline-internal objects in the upload bucket (defaults follow the ingestion lambda's settings)
+INVOKE_IGNORED_PREFIXES = tuple(
+    p.strip().lstrip("/")
+    for p in os.environ.get(
+        "INVOKE_IGNORED_PREFIXES",
+        os.environ.get("PDF_SHARD_PREFIX", "tmp/shards/") + "," + os.environ.get("CLAIM_CHECK_PREFIX", "claim-check/"),
+    ).split(",")
+    if p.strip()
+)
+
 sfn = boto3.client("stepfunctions", region_name=REGION)
+s3_client = boto3.client("s3", region_name=REGION)
+
+
+def execution_name(bucket: str, key: str, etag: str, prefix: str = "s3", attempt: int = 0) -> str:
+    """Deterministic execution name for one object version (Step Functions names: <= 80 chars of [A-Za-z0-9-_]).
+
+    attempt > 0 names a retry after a failed execution.
+    """
+    digest = hashlib.sha256(f"{bucket}/{key}#{etag}".encode("utf-8")).hexdigest()[:64]
+    return f"{prefix}-{digest}" + (f"-a{attempt}" if attempt else "")
+
+
+def start_deduplicated(client, state_machine_arn: str, input_obj: dict, max_attempts: int = INVOKE_MAX_ATTEMPTS) -> dict:
+    """Start the execution for one object version unless a RUNNING/SUCCEEDED one already exists.
+
+    Returns {"status": "started"|"duplicate", "executionArn"}; a FAILED, TIMED_OUT or ABORTED execution under the
+    name moves on to the next attempt suffix. Raises RuntimeError once max_attempts names are used up.
+    """
+    s3 = input_obj["s3"]
+    for attempt in range(max_attempts):
+        name = execution_name(s3["bucket"], s3["key"], s3.get("etag", ""), attempt=attempt)
+        try:
+            resp = client.start_execution(stateMachineArn=state_machine_arn, name=name, input=json.dumps(input_obj))
+            return {"status": "started", "executionArn": resp.get("executionArn")}
+        except client.exceptions.ExecutionAlreadyExists:
+            exec_arn = f"{state_machine_arn.replace(':stateMachine:', ':execution:')}:{name}"
+            status = client.describe_execution(executionArn=exec_arn)["status"]
+            if status in DEDUP_STATUSES:
+                return {"status": "duplicate", "executionArn": exec_arn}
+            logger.info(f"start_deduplicated: execution {name} ended {status}, starting attempt {attempt + 1}")
+    raise RuntimeError(f"{input_obj['s3_uri']}: {max_attempts} executions already failed")
 
 
 def _build_event_from_s3_record(record: dict) -> dict:
@@ -49,12 +113,26 @@ def _build_event_from_s3_record(record: dict) -> dict:
         "s3": {"bucket": bucket, "key": key},
         "s3_uri": f"s3://{bucket}/{key}"
     }
+    etag = (s3.get("object", {}).get("eTag") or "").strip('"')
+    if etag:
+        input_event["s3"]["etag"] = etag
 
     logger.info(f"_build_event_from_s3_record: built event for s3://{bucket}/{key}")
     print(f"_build_event_from_s3_record: built event for s3://{bucket}/{key}")
     return input_event
 
 
+def _completed_result(input_obj: dict):
+    """Completed result for the same document content and tenant, if one was recorded."""
+    s3 = input_obj["s3"]
+    try:
+        content_hash = content_hash_for_s3_object(s3_client, s3["bucket"], s3["key"])
+        return get_completed_results().get(extract_tenant_id_from_s3_key(s3["key"]), content_hash)
+    except Exception as e:
+        logger.warning(f"_completed_result: lookup failed for {input_obj['s3_uri']}: {e}")
+        return None
+
+
 def _start_state_machine(input_obj: dict) -> dict:
     msg = "_start_state_machine: starting state machine execution"
     print(msg)
@@ -66,19 +144,15 @@ def _start_state_machine(input_obj: dict) -> dict:
         print(f"_start_state_machine: {err}")
         return {"error": err}
 
-    # Create a unique execution name
-    exec_name = f"invoke-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{str(uuid.uuid4())[:8]}"
-
     try:
-        resp = sfn.start_execution(
-            stateMachineArn=STATE_MACHINE_ARN,
-            name=exec_name,
-            input=json.dumps(input_obj)
-        )
-        exec_arn = resp.get("executionArn")
-        logger.info(f"_start_state_machine: started executionArn={exec_arn}")
-        print(f"_start_state_machine: started executionArn={exec_arn}")
-        return {"status": "started", "executionArn": exec_arn}
+        started = start_deduplicated(sfn, STATE_MACHINE_ARN, input_obj)
+        if started["status"] == "duplicate":
+            msg = f"_start_state_machine: duplicate notification, execution {started['executionArn']} already exists"
+        else:
+            msg = f"_start_state_machine: started executionArn={started['executionArn']}"
+        logger.info(msg)
+        print(msg)
+        return started
 
     except Exception as e:
         logger.exception("_start_state_machine: failed to start execution")
@@ -86,6 +160,23 @@ def _start_state_machine(input_obj: dict) -> dict:
         return {"status": "error", "error": str(e)}
 
 
+def _process_record(rec: dict) -> dict:
+    try:
+        input_obj = _build_event_from_s3_record(rec)
+        if (input_obj["s3"]["key"] or "").startswith(INVOKE_IGNORED_PREFIXES):
+            print(f"_process_record: {input_obj['s3_uri']} is a pipeline-internal object, skipping")
+            return {"input": input_obj, "start_response": {"status": "ignored"}}
+        if COMPLETED_RESULTS_ENABLED:
+            completed = _completed_result(input_obj)
+            if completed:
+                print(f"_process_record: {input_obj['s3_uri']} already decided ({completed.get('decision')}), skipping")
+                return {"input": input_obj, "start_response": {"status": "skipped", "completed_result": completed}}
+        return {"input": input_obj, "start_response": _start_state_machine(input_obj)}
+    except Exception as e:
+        logger.exception("_process_record: unexpected error processing record")
+        return {"status": "error", "error": str(e)}
+
+
 def handler(event, context):
     """Lambda handler triggered by S3 Put events. Starts Step Functions executions and returns results."""
     print("handler: invoked")
@@ -93,16 +184,8 @@ def handler(event, context):
     logger.debug(json.dumps(event))
 
     records = event.get("Records") or []
-    results = []
-
-    for rec in records:
-        try:
-            input_obj = _build_event_from_s3_record(rec)
-            start_resp = _start_state_machine(input_obj)
-            results.append({"input": input_obj, "start_response": start_resp})
-        except Exception as e:
-            logger.exception("handler: unexpected error processing record")
-            results.append({"status": "error", "error": str(e)})
+    with ThreadPoolExecutor(max_workers=max(1, min(INVOKE_MAX_CONCURRENCY, len(records) or 1))) as pool:
+        results = list(pool.map(_process_record, records))
 
     print("handler: completed")
     logger.info("handler: completed")
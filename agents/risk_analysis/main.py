@@ -3,26 +3,54 @@ import uuid
 import logging
 import os
 import re
+import sys
+import time
 from typing import Dict, Any, Optional
 
-import boto3
-from botocore.exceptions import BotoCoreError, ClientError
+# Ensure repo root is on sys.path so shared helpers import when run from this folder
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from agents.shared.bedrock_client import BEDROCK_REGION, BEDROCK_STREAM_EARLY_STOP, BEDROCK_STREAMING_ENABLED, get_invoker, set_invocation_deadline
+from agents.shared.claim_check import load_extracted_text
+from agents.shared.clause_library import get_clause_library_store, library_enabled
+from agents.shared.compact_schema import (
+    COMPACT_OUTPUT_ENABLED,
+    RISK_COMPACT_FORMAT,
+    RISK_OVERALL_FIELDS,
+    expand_risk,
+    expand_risk_text,
+    numbered_clauses,
+    render_batches,
+)
+from agents.shared.context_packer import PROMPT_TOKEN_BUDGET, pack_context
+from agents.shared.incremental import INCREMENTAL_ANALYSIS_ENABLED, get_lineage_store, logical_contract_id
+from agents.shared.model_cascade import TIER_HEURISTIC, TIER_SINGLE, cascade_enabled, run_cascade
+from agents.shared.stream_json import parse_fields
+from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config, warm_tenant_config
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# warm the tenant config cache at cold start
+warm_tenant_config()
+
 # Use AWS_REGION env var if present; otherwise default to us-east-1
 REGION = os.environ.get("AWS_REGION") or "us-east-1"
 # Bedrock settings (match `agents/compliance/main.py`)
-BEDROCK_REGION = "us-east-1"
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "us.amazon.nova-lite-v1:0")
-
-# Global bedrock client (explicit region per project requirement)
-bedrock = boto3.client("bedrock-runtime", region_name=BEDROCK_REGION)
+RISK_PROMPT_TOKEN_BUDGET = int(os.environ.get("RISK_PROMPT_TOKEN_BUDGET", str(PROMPT_TOKEN_BUDGET)))
 
 
 def _make_prompt(extracted_text: str, contract_id: Optional[str]) -> str:
-    """Build a clear prompt asking the model to return exact JSON matching the required schema."""
+    """Build a clear prompt asking the model to return exact JSON matching the required schema.
+
+    Long contracts are packed to RISK_PROMPT_TOKEN_BUDGET, keeping the highest-signal clauses.
+    """
+    packed = pack_context(extracted_text, token_budget=RISK_PROMPT_TOKEN_BUDGET)
+    if packed["truncated"]:
+        logger.info(
+            "_make_prompt: packed %s/%s clauses, ~%s tokens",
+            packed["clauses_included"], packed["clauses_total"], packed["estimated_tokens"],
+        )
     return (
         f"You are a legal assistant that analyzes contract text and returns a JSON object with the following schema:\n"
         "{\n"
@@ -45,18 +73,32 @@ def _make_prompt(extracted_text: str, contract_id: Optional[str]) -> str:
         "overall_confidence: <number 0-1 derived from identified clause confidence scores (0-10)>,\n"
         "Only output valid JSON (no extra commentary). Make numeric scores integers 0-10 for risk_breakdown and overall_risk_score can be decimal. "
         "Confidence must be between 0 and 1. Top risks should be a short list (strings). For each identified clause, include a risk_score, 2-3 sentence reasoning, and the exact clause_text used.\n\n"
-        f"Contract ID: {contract_id}\n"
         "Now analyze the following extracted text from the contract and produce JSON that follows the schema exactly. If some categories are not present, score them conservatively (low risk=0, high risk=10) and explain nothing, only return the JSON.\n\n"
-        "EXTRACTED_TEXT:\n" + extracted_text
+        + ("Some lower-signal clauses were omitted to fit the prompt budget; [...] marks omitted text.\n\n" if packed["truncated"] else "")
+        + "EXTRACTED_TEXT:\n" + packed["text"]
     )
 
 
-def _invoke_bedrock(prompt: str, model_id: str = None) -> str:
-    """Invoke Bedrock (bedrock-runtime) using the same pattern as the compliance lambda.
+
+def _make_compact_prompt(numbered: Dict[str, Any], contract_id: Optional[str], partial: bool = False) -> str:
+    """Compact-output variant of _make_prompt: clauses are pre-numbered and answered by id (see compact_schema).
+
+    partial: the block holds only the clauses without a stored assessment (clause-level review, see incremental.py).
+    """
+    return (
+        "You are a legal assistant that analyzes contract clauses for risk (liability, indemnification, data protection, termination).\n"
+        + RISK_COMPACT_FORMAT
+        + "rs is derived from the clause risk scores, oc from the clause confidences. Score missing categories conservatively.\n\n"
+        + ("Some lower-signal clauses were omitted to fit the prompt budget (gaps in the numbering).\n" if numbered["truncated"] else "")
+        + ("Only clauses that need a fresh assessment are listed; score just these.\n" if partial else "")
+        + "CLAUSES:\n" + numbered["block"]
+    )
+
+def _invoke_bedrock(prompt: str, model_id: str = None, tenant_id: Optional[str] = None) -> str:
+    """Invoke Bedrock through the shared invoker (agents/shared/bedrock_client.py), like the compliance lambda.
 
     Returns a dict containing raw output (string) on success or an error object on failure.
     """
-    global output_text, parsed
     actual_model_id = model_id or BEDROCK_MODEL_ID or None
     logger.info("_invoke_bedrock: requested model_id=%s env_model=%s", model_id, os.environ.get("BEDROCK_MODEL_ID"))
 
@@ -69,61 +111,11 @@ def _invoke_bedrock(prompt: str, model_id: str = None) -> str:
 
     logger.info("_invoke_bedrock: invoking model %s in region %s", actual_model_id, BEDROCK_REGION)
 
-    # Build a chat-style payload that includes the required `messages` key matching compliance lambda
-    body_dict = {
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {"text": prompt}
-                ]
-            }
-        ]
-    }
-
-    body = json.dumps(body_dict).encode("utf-8")
-    logger.info("_invoke_bedrock: request body size=%d bytes", len(body))
-
     try:
-        response = bedrock.invoke_model(
-            modelId=actual_model_id,
-            contentType="application/json",
-            accept="application/json",
-            body=body,
-        )
-
-        # The response body is usually a streaming Body - read it
-        model_bytes = response.get("body")
-        if hasattr(model_bytes, "read"):
-            raw = model_bytes.read()
-        else:
-            raw = model_bytes
-
-        model_text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else str(raw)
-
-        # Some Bedrock responses return a JSON object with `outputs` -> content -> text
-        try:
-            parsed = json.loads(model_text)
-            # Try to extract common fields if present
-            output_text = ""
-            output_blocks = (
-                parsed.get("output", {})
-                .get("message", {})
-                .get("content", [])
-            )
-            if isinstance(output_blocks, list):
-                output_text = "".join(
-                    block.get("text", "")
-                    for block in output_blocks
-                    if isinstance(block, dict)
-                ).strip()
-        except Exception:
-            # not JSON or unexpected shape — keep raw model_text
-            pass
-
+        # shared invoker: rate limits, adaptive concurrency, jittered retries and the response cache
+        output_text = get_invoker().invoke_text(prompt, actual_model_id, tenant_id=tenant_id)
         logger.info("_invoke_bedrock: model invocation successful")
         return output_text
-
     except Exception as e:
         err_msg = str(e)
         suggestion = "Ensure BEDROCK_MODEL_ID is a valid Bedrock model identifier or ARN and that your IAM principal has Bedrock access."
@@ -136,6 +128,106 @@ def _invoke_bedrock(prompt: str, model_id: str = None) -> str:
         })
 
 
+
+def _stream_bedrock(
+    prompt: str, model_id: str = None, tenant_id: Optional[str] = None, compact: bool = False,
+) -> Dict[str, Any]:
+    """Streaming variant of _invoke_bedrock.
+
+    overall_risk_score / overall_confidence ("rs" / "oc" for a compact prompt) are parsed from the stream as soon
+    as each is complete; with BEDROCK_STREAM_EARLY_STOP generation stops once both have arrived. Returns
+    {"text", "overall", "complete"} with full-schema names in "overall"; complete is False when generation was
+    stopped early or the call failed.
+    """
+    actual_model_id = model_id or BEDROCK_MODEL_ID or None
+    if not actual_model_id:
+        return {"text": _invoke_bedrock(prompt, model_id, tenant_id), "overall": {}, "complete": False}
+
+    started = time.monotonic()
+
+    names = RISK_OVERALL_FIELDS if compact else {f: f for f in ("overall_risk_score", "overall_confidence")}
+
+    def _on_field(name: str, value: Any) -> None:
+        logger.info("_stream_bedrock: %s=%s ready after %.2fs", names.get(name, name), value, time.monotonic() - started)
+
+    logger.info("_stream_bedrock: streaming model %s in region %s", actual_model_id, BEDROCK_REGION)
+    try:
+        streamed = get_invoker().invoke_stream(
+            prompt,
+            actual_model_id,
+            tenant_id=tenant_id,
+            fields=list(names),
+            on_field=_on_field,
+            stop_when_complete=BEDROCK_STREAM_EARLY_STOP,
+        )
+    except Exception as e:
+        logger.exception("_stream_bedrock: bedrock streaming failed: %s", e)
+        return {
+            "text": json.dumps({"summary": "Bedrock invocation failed", "error": str(e), "model_id_used": actual_model_id}),
+            "overall": {},
+            "complete": False,
+        }
+
+    overall: Dict[str, Any] = {}
+    for name, value in streamed["fields"].items():
+        try:
+            overall[names.get(name, name)] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return {"text": streamed["text"], "overall": overall, "complete": streamed["complete"]}
+
+
+def _incremental_answer(
+    extracted_text: str,
+    contract_id: Optional[str],
+    tenant_id: Optional[str],
+    logical_id: Optional[str],
+    s3_key: Optional[str],
+    use_library: bool = False,
+) -> Dict[str, Any]:
+    """Clause-level review: only clauses without a stored assessment go to the model.
+
+    Stored assessments come from earlier versions of the same contract (agents/shared/incremental.py) and, with
+    use_library, from near-duplicates in the tenant's clause library (agents/shared/clause_library.py). The merged
+    answer has the full risk schema; when the pending clauses got no usable answer, the model's error payload is
+    returned with no overall scores and the lineage is left untouched.
+    """
+    kind = f"risk:{BEDROCK_MODEL_ID}"
+    run = get_lineage_store().begin(kind, tenant_id, logical_id, extracted_text)
+    library = get_clause_library_store().load(kind, tenant_id) if use_library else None
+    if library is not None:
+        # near-duplicates of already-assessed tenant clauses skip the model
+        run.reuse(library.match(run.pending))
+    compact: Dict[str, Any] = {}
+    # every pending clause must be scored before the merged scores are valid, so send them all in
+    # budget-sized batches rather than only the ones that fit one prompt
+    batches = render_batches(run.pending, RISK_PROMPT_TOKEN_BUDGET)
+    pending_by_index = {c["index"]: c for c in run.pending}
+    for numbered in batches:
+        prompt = _make_compact_prompt(numbered, contract_id, partial=bool(run.reused or run.library_hits or len(batches) > 1))
+        raw = _invoke_bedrock(prompt, tenant_id=tenant_id)
+        answer = parse_fields(raw) if isinstance(raw, str) else {}
+        if "rs" not in answer and "cl" not in answer:
+            # failed or malformed answer: surface it as is, without merged scores; nothing is committed,
+            # so the clauses stay pending for the next run
+            logger.warning("_incremental_answer: no usable model answer for contract %s", contract_id)
+            text = raw if isinstance(raw, str) else raw.get("raw", "")
+            return {"text": text, "overall": {}, "complete": False, "incremental": None}
+        run.record_answer(numbered["clauses"], answer.get("cl"))
+        if library is not None:
+            for clause in numbered["clauses"]:
+                library.add(pending_by_index[clause["index"]], run.assessments[clause["index"]])
+        # top risks from all batches; the other fields are recomputed from the clause scores
+        compact = {**answer, **compact, "tr": (compact.get("tr") or []) + (answer.get("tr") or [])}
+    merged = run.merge_risk(compact)
+    if library is not None:
+        library.save()
+    stats = run.commit(contract_id, s3_key)
+    logger.info("_incremental_answer: %s", stats)
+    text = json.dumps(expand_risk(merged, run.clauses))
+    return {"text": text, "overall": _extract_overall_numbers(text), "complete": True, "incremental": stats}
+
+
 def _compute_heuristic_from_text(text: str) -> Dict[str, Any]:
     """Fallback heuristic analysis if Bedrock fails: very simple keyword-based scoring."""
     lower = text.lower()
@@ -188,13 +280,14 @@ def handler(event: Dict[str, Any], context=None) -> Dict[str, Any]:
       "contract_id": "...",
       "s3": {"bucket": "...", "key": "..."},
       "s3_uri": "s3://...",
-      "extracted_text": "..."
+      "extracted_text": "..."   (or "extracted_text_ref" for large documents)
     }
 
     Returns structured analysis JSON. Uses Bedrock when available and falls back to heuristics on errors.
     """
+    set_invocation_deadline(context)
     contract_id = event.get("contract_id") or str(uuid.uuid4())
-    extracted_text = event.get("extracted_text")
+    extracted_text = load_extracted_text(event)
 
     if not extracted_text:
         logger.warning("No extracted_text provided in event for contract %s", contract_id)
@@ -204,15 +297,54 @@ def handler(event: Dict[str, Any], context=None) -> Dict[str, Any]:
             "message": "No extracted_text present in event",
         }
 
-    prompt = _make_prompt(extracted_text, contract_id)
+    numbered = None
+    if COMPACT_OUTPUT_ENABLED:
+        # short keys + clause ids; expanded locally to the full schema below
+        numbered = numbered_clauses(extracted_text, token_budget=RISK_PROMPT_TOKEN_BUDGET)
+        prompt = _make_compact_prompt(numbered, contract_id)
+    else:
+        prompt = _make_prompt(extracted_text, contract_id)
 
     # Call Bedrock
-    bedrock_result = _invoke_bedrock(prompt)
-
-    overall_risk = _extract_overall_numbers(bedrock_result)
+    s3_key = (event.get("s3") or {}).get("key")
+    tenant_id = extract_tenant_id_from_s3_key(s3_key)
+    logical_id = logical_contract_id(s3_key, event.get("logical_contract_id")) if INCREMENTAL_ANALYSIS_ENABLED else None
+
+    def _ask(model_id: Optional[str] = None) -> Dict[str, Any]:
+        if BEDROCK_STREAMING_ENABLED:
+            streamed = _stream_bedrock(prompt, model_id=model_id, tenant_id=tenant_id, compact=numbered is not None)
+            text = expand_risk_text(streamed["text"], numbered["clauses"]) if numbered else streamed["text"]
+            return {
+                "text": text,
+                "overall": {**_extract_overall_numbers(text), **streamed["overall"]},
+                "complete": streamed["complete"],
+            }
+        text = _invoke_bedrock(prompt, model_id=model_id, tenant_id=tenant_id)
+        if numbered:
+            text = expand_risk_text(text, numbered["clauses"])
+        return {"text": text, "overall": _extract_overall_numbers(text), "complete": True}
+
+    tenant_cfg = load_tenant_config(tenant_id)
+    use_library = library_enabled(tenant_cfg)
+    cascade = None
+    if logical_id or use_library:
+        # only clauses not assessed before (earlier versions, tenant clause library) go to the model
+        answer = _incremental_answer(extracted_text, contract_id, tenant_id, logical_id, s3_key, use_library)
+    elif cascade_enabled(tenant_cfg):
+        # heuristics -> small model -> large model when confidence is below the tenant threshold
+        threshold = tenant_cfg.get("confidence_threshold")
+        cascade = run_cascade(extracted_text, _ask, float(threshold) if threshold is not None else 0.7)
+        answer = cascade
+        if cascade["model_tier"] == TIER_HEURISTIC:
+            answer = {**cascade, "text": json.dumps({"model_tier": TIER_HEURISTIC, **cascade["overall"]})}
+    else:
+        answer = _ask()
+    bedrock_result = answer["text"]
+    overall_risk = answer["overall"]
+    model_output_complete = answer.get("complete", True)
 
     # Return a rich response including raw model output for debugging
-    return {
+    result = {
         "contract_id": contract_id,
         "s3": event.get("s3"),
         "s3_uri": event.get("s3_uri"),
@@ -222,6 +354,18 @@ def handler(event: Dict[str, Any], context=None) -> Dict[str, Any]:
             "overall_confidence": overall_risk.get("overall_confidence"),
         }
     }
+    if not model_output_complete:
+        # generation was stopped once the overall scores arrived (BEDROCK_STREAM_EARLY_STOP), or the call failed
+        result["model_response_complete"] = False
+    if answer.get("incremental"):
+        result["incremental"] = answer["incremental"]
+    if cascade is not None:
+        result["model_tier"] = cascade["model_tier"]
+        result["model_id"] = cascade["model_id"]
+        result["cascade"] = cascade["cascade"]
+    else:
+        result["model_tier"] = TIER_SINGLE
+    return result
 
 def _extract_overall_numbers(text: str) -> Dict[str, Any]:
     print("Entering _extract_overall_numbers")
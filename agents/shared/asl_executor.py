@@ -0,0 +1,493 @@
+"""
+In-process executor for the contract review state machine.
+
+Runs infra/step_functions/contract_review.asl.json without Step Functions:
+Task states call the agent handlers directly, Parallel branches run on a
+thread pool, and Choice, Pass, Wait, Succeed and Fail behave as in the
+service, including InputPath / Parameters / ResultSelector / ResultPath /
+OutputPath processing and Retry / Catch. Used for bulk backfills on one large
+box and for end-to-end runs without AWS:
+
+    python -m agents.shared.asl_executor --bucket my-bucket --key acme/contracts/msa.pdf
+
+The ASL template placeholders (`${ingestion_lambda_arn}`, ...) resolve to
+handlers through RESOURCES; pass `resources={"ingestion_lambda_arn": fn}` (or
+`--resource ingestion_lambda_arn=module:function`) to swap in other
+callables, e.g. fakes in tests.
+
+Differences from the service: TimeoutSeconds / HeartbeatSeconds are not
+enforced, there is no execution history, intrinsic functions and the `$$`
+context object are not supported, and there is no state size limit. Retry
+intervals are multiplied by `retry_delay_scale` (ASL_RETRY_DELAY_SCALE), so
+local runs can retry without the service's back-off.
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+ASL_DEFINITION_PATH = os.environ.get("ASL_DEFINITION_PATH") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "infra", "step_functions", "contract_review.asl.json")
+)
+ASL_RETRY_DELAY_SCALE = float(os.environ.get("ASL_RETRY_DELAY_SCALE", "1.0"))
+
+LAMBDA_INVOKE = "arn:aws:states:::lambda:invoke"
+
+# ASL template variable -> "module:function" of the agent handler
+RESOURCES = {
+    "ingestion_lambda_arn": "agents.ingestion.main:handler",
+    "compliance_lambda_arn": "agents.compliance.main:handler",
+    "risk_analysis_lambda_arn": "agents.risk_analysis.main:handler",
+    "combined_review_lambda_arn": "agents.combined_review.main:handler",
+    "decision_lambda_arn": "agents.decision.main:handler",
+}
+
+Handler = Callable[[Dict[str, Any], Any], Any]
+
+_PLACEHOLDER = re.compile(r"\$\{([A-Za-z0-9_]+)\}")
+_PATH_STEP = re.compile(r"\.([^.\[\]]+)|\[(\d+)\]")
+
+
+class StatesError(Exception):
+    """A state failed with an ASL error name (e.g. "States.TaskFailed") and cause."""
+
+    def __init__(self, error: str, cause: str = ""):
+        super().__init__(f"{error}: {cause}" if cause else error)
+        self.error = error
+        self.cause = cause
+
+
+class ExecutionFailed(StatesError):
+    """The execution ended in a Fail state or with an uncaught error."""
+
+
+# ---------------------------------------------------------------------------
+# JSONPath (the "$.a.b[0].c" subset ASL reference paths use)
+# ---------------------------------------------------------------------------
+
+def _steps(path: str) -> List[Union[str, int]]:
+    if path == "$":
+        return []
+    if not path.startswith("$"):
+        raise StatesError("States.Runtime", f"unsupported path {path!r}")
+    steps, pos = [], 1
+    for match in _PATH_STEP.finditer(path, 1):
+        if match.start() != pos:
+            break
+        steps.append(match.group(1) if match.group(1) is not None else int(match.group(2)))
+        pos = match.end()
+    if pos != len(path):
+        raise StatesError("States.Runtime", f"unsupported path {path!r}")
+    return steps
+
+
+def get_path(data: Any, path: str) -> Any:
+    """Value at a reference path; a missing field raises States.Runtime like the service."""
+    value = data
+    for step in _steps(path):
+        try:
+            value = value[step]
+        except (KeyError, IndexError, TypeError):
+            raise StatesError("States.Runtime", f"path {path!r} not found in input") from None
+    return value
+
+
+def path_present(data: Any, path: str) -> bool:
+    try:
+        get_path(data, path)
+        return True
+    except StatesError:
+        return False
+
+
+def set_path(data: Any, path: Optional[str], value: Any) -> Any:
+    """Apply a ResultPath: "$" replaces the input, null discards the result, "$.a.b" sets (creating objects)."""
+    if path is None:
+        return data
+    steps = _steps(path)
+    if not steps:
+        return value
+    root = data if isinstance(data, dict) else {}
+    target = root
+    for step in steps[:-1]:
+        if not isinstance(target.get(step), dict):
+            target[step] = {}
+        target = target[step]
+    target[steps[-1]] = value
+    return root
+
+
+def resolve_parameters(template: Any, data: Any) -> Any:
+    """Payload template: keys ending in ".$" are paths into the input, everything else is literal."""
+    if isinstance(template, dict):
+        out = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                if not isinstance(value, str) or not value.startswith("$"):
+                    raise StatesError("States.Runtime", f"unsupported value for {key}: {value!r}")
+                if value.startswith("$$"):
+                    raise StatesError("States.Runtime", f"context object paths are not supported: {value!r}")
+                out[key[:-2]] = get_path(data, value)
+            else:
+                out[key] = resolve_parameters(value, data)
+        return out
+    if isinstance(template, list):
+        return [resolve_parameters(item, data) for item in template]
+    return template
+
+
+def _copy(value: Any) -> Any:
+    # state data crosses the service as JSON; round-tripping keeps handlers from sharing mutable state
+    return json.loads(json.dumps(value, default=str))
+
+
+# ---------------------------------------------------------------------------
+# Choice rules
+# ---------------------------------------------------------------------------
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+_COMPARATORS: Dict[str, Tuple[Callable[[Any], bool], Callable[[Any, Any], bool]]] = {
+    "StringEquals": (lambda v: isinstance(v, str), lambda a, b: a == b),
+    "StringLessThan": (lambda v: isinstance(v, str), lambda a, b: a < b),
+    "StringGreaterThan": (lambda v: isinstance(v, str), lambda a, b: a > b),
+    "StringLessThanEquals": (lambda v: isinstance(v, str), lambda a, b: a <= b),
+    "StringGreaterThanEquals": (lambda v: isinstance(v, str), lambda a, b: a >= b),
+    "NumericEquals": (_is_number, lambda a, b: a == b),
+    "NumericLessThan": (_is_number, lambda a, b: a < b),
+    "NumericGreaterThan": (_is_number, lambda a, b: a > b),
+    "NumericLessThanEquals": (_is_number, lambda a, b: a <= b),
+    "NumericGreaterThanEquals": (_is_number, lambda a, b: a >= b),
+    "BooleanEquals": (lambda v: isinstance(v, bool), lambda a, b: a == b),
+    "TimestampEquals": (lambda v: isinstance(v, str), lambda a, b: a == b),
+    "TimestampLessThan": (lambda v: isinstance(v, str), lambda a, b: a < b),
+    "TimestampGreaterThan": (lambda v: isinstance(v, str), lambda a, b: a > b),
+    "TimestampLessThanEquals": (lambda v: isinstance(v, str), lambda a, b: a <= b),
+    "TimestampGreaterThanEquals": (lambda v: isinstance(v, str), lambda a, b: a >= b),
+}
+
+
+def _string_matches(value: str, pattern: str) -> bool:
+    regex, i = "", 0
+    while i < len(pattern):
+        if pattern[i] == "\\" and i + 1 < len(pattern):
+            regex, i = regex + re.escape(pattern[i + 1]), i + 2
+            continue
+        regex, i = regex + (".*" if pattern[i] == "*" else re.escape(pattern[i])), i + 1
+    return re.fullmatch(regex, value, re.DOTALL) is not None
+
+
+def evaluate_choice(rule: Dict[str, Any], data: Any) -> bool:
+    if "And" in rule:
+        return all(evaluate_choice(r, data) for r in rule["And"])
+    if "Or" in rule:
+        return any(evaluate_choice(r, data) for r in rule["Or"])
+    if "Not" in rule:
+        return not evaluate_choice(rule["Not"], data)
+    variable = rule.get("Variable")
+    if "IsPresent" in rule:
+        return path_present(data, variable) == bool(rule["IsPresent"])
+    value = get_path(data, variable)
+    if "IsNull" in rule:
+        return (value is None) == bool(rule["IsNull"])
+    if "IsString" in rule:
+        return isinstance(value, str) == bool(rule["IsString"])
+    if "IsNumeric" in rule:
+        return _is_number(value) == bool(rule["IsNumeric"])
+    if "IsBoolean" in rule:
+        return isinstance(value, bool) == bool(rule["IsBoolean"])
+    if "StringMatches" in rule:
+        return isinstance(value, str) and _string_matches(value, rule["StringMatches"])
+    for name, (accepts, compare) in _COMPARATORS.items():
+        if name in rule:
+            other = rule[name]
+        elif f"{name}Path" in rule:
+            other = get_path(data, rule[f"{name}Path"])
+        else:
+            continue
+        # a value of the wrong type does not match (the service does not fail here either)
+        return accepts(value) and accepts(other) and compare(value, other)
+    raise StatesError("States.Runtime", f"unsupported choice rule {sorted(rule)}")
+
+
+# terminal errors: only an exact ErrorEquals entry matches them, States.ALL does not
+_TERMINAL_ERRORS = {"States.Runtime", "States.DataLimitExceeded"}
+
+
+def _error_matches(names: Iterable[str], error: str) -> bool:
+    for name in names:
+        if name == error:
+            return True
+        if error in _TERMINAL_ERRORS:
+            continue
+        if name == "States.ALL" or (name == "States.TaskFailed" and error != "States.Timeout"):
+            return True
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Executor
+# ---------------------------------------------------------------------------
+
+def _load_handler(spec: Union[str, Handler]) -> Handler:
+    if callable(spec):
+        return spec
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "handler")
+
+
+class LocalExecutor:
+    """Runs an ASL definition in-process; `run(input)` returns the execution output or raises ExecutionFailed."""
+
+    def __init__(
+        self,
+        definition: Optional[Dict[str, Any]] = None,
+        definition_path: str = ASL_DEFINITION_PATH,
+        resources: Optional[Dict[str, Union[str, Handler]]] = None,
+        retry_delay_scale: float = ASL_RETRY_DELAY_SCALE,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if definition is None:
+            with open(definition_path, "r", encoding="utf-8") as f:
+                # the template placeholders are JSON strings, so the file parses before rendering
+                definition = json.load(f)
+        self.definition = definition
+        self.resources = {**RESOURCES, **(resources or {})}
+        self.retry_delay_scale = retry_delay_scale
+        self.sleep = sleep
+        self._handlers: Dict[str, Handler] = {}
+
+    # --- resources -----------------------------------------------------------
+
+    def _handler_for(self, function_name: str) -> Handler:
+        match = _PLACEHOLDER.fullmatch(function_name or "")
+        name = match.group(1) if match else function_name
+        if name not in self._handlers:
+            if name not in self.resources:
+                raise StatesError("States.TaskFailed", f"no local handler for {function_name!r}")
+            self._handlers[name] = _load_handler(self.resources[name])
+        return self._handlers[name]
+
+    def _invoke(self, state: Dict[str, Any], effective_input: Any) -> Any:
+        resource = state.get("Resource", "")
+        if resource == LAMBDA_INVOKE:
+            params = effective_input if isinstance(effective_input, dict) else {}
+            handler = self._handler_for(params.get("FunctionName"))
+            payload = _copy(params.get("Payload"))
+        else:
+            handler = self._handler_for(resource)
+            payload = _copy(effective_input)
+        try:
+            output = handler(payload, None)
+        except StatesError:
+            raise
+        except Exception as e:
+            logger.warning("LocalExecutor: handler for %s raised %s: %s", state.get("_name"), type(e).__name__, e)
+            raise StatesError(type(e).__name__, str(e)) from e
+        output = _copy(output)
+        # the optimized lambda:invoke integration wraps the function result
+        return {"Payload": output, "StatusCode": 200} if resource == LAMBDA_INVOKE else output
+
+    # --- state machine -------------------------------------------------------
+
+    def run(self, execution_input: Any) -> Any:
+        return self._run_machine(self.definition, _copy(execution_input))
+
+    def _run_machine(self, machine: Dict[str, Any], data: Any) -> Any:
+        states = machine["States"]
+        name = machine["StartAt"]
+        while True:
+            state = {**states[name], "_name": name}
+            try:
+                data, next_name = self._run_state_with_retry(state, data)
+            except StatesError as e:
+                if isinstance(e, ExecutionFailed):
+                    raise
+                handler = next((c for c in state.get("Catch", []) if _error_matches(c["ErrorEquals"], e.error)), None)
+                if handler is None:
+                    raise ExecutionFailed(e.error, e.cause) from e
+                logger.info("LocalExecutor: %s caught %s -> %s", name, e.error, handler["Next"])
+                data = set_path(data, handler.get("ResultPath", "$"), {"Error": e.error, "Cause": e.cause})
+                next_name = handler["Next"]
+            if next_name is None:
+                return data
+            name = next_name
+
+    def _run_state_with_retry(self, state: Dict[str, Any], data: Any) -> Tuple[Any, Optional[str]]:
+        attempts: Dict[int, int] = {}
+        while True:
+            try:
+                return self._run_state(state, data)
+            except ExecutionFailed:
+                raise
+            except StatesError as e:
+                index, retrier = next(
+                    ((i, r) for i, r in enumerate(state.get("Retry", [])) if _error_matches(r["ErrorEquals"], e.error)),
+                    (None, None),
+                )
+                if retrier is None or attempts.get(index, 0) >= retrier.get("MaxAttempts", 3):
+                    raise
+                attempts[index] = attempts.get(index, 0) + 1
+                delay = retrier.get("IntervalSeconds", 1) * retrier.get("BackoffRate", 2.0) ** (attempts[index] - 1)
+                if retrier.get("MaxDelaySeconds"):
+                    delay = min(delay, retrier["MaxDelaySeconds"])
+                logger.info("LocalExecutor: retrying %s after %s (attempt %d)", state["_name"], e.error, attempts[index])
+                self.sleep(delay * self.retry_delay_scale)
+
+    def _run_state(self, state: Dict[str, Any], data: Any) -> Tuple[Any, Optional[str]]:
+        kind = state["Type"]
+        next_name = None if state.get("End") else state.get("Next")
+        if kind == "Fail":
+            raise ExecutionFailed(state.get("Error", "States.Fail"), state.get("Cause", ""))
+
+        input_path = state.get("InputPath", "$")
+        effective = get_path(data, input_path) if input_path is not None else {}
+        if kind == "Choice":
+            for rule in state.get("Choices", []):
+                if evaluate_choice(rule, effective):
+                    next_name = rule["Next"]
+                    break
+            else:
+                if "Default" not in state:
+                    raise ExecutionFailed("States.NoChoiceMatched", f"no choice matched in {state['_name']}")
+                next_name = state["Default"]
+            return self._output(state, effective), next_name
+        if kind == "Succeed":
+            return self._output(state, effective), None
+        if "Parameters" in state:
+            effective = resolve_parameters(state["Parameters"], effective)
+
+        if kind == "Pass":
+            # copied: Parameters may reference the very input the result is written into
+            result = _copy(state["Result"] if "Result" in state else effective)
+        elif kind == "Wait":
+            seconds = state.get("Seconds")
+            if seconds is None and state.get("SecondsPath"):
+                seconds = get_path(effective, state["SecondsPath"])
+            self.sleep(float(seconds or 0) * self.retry_delay_scale)
+            result = effective
+        elif kind == "Task":
+            result = self._invoke(state, effective)
+        elif kind == "Parallel":
+            result = self._parallel(state, effective)
+        else:
+            raise ExecutionFailed("States.Runtime", f"state type {kind} is not supported locally")
+
+        if "ResultSelector" in state:
+            result = resolve_parameters(state["ResultSelector"], result)
+        data = set_path(data, state.get("ResultPath", "$"), result)
+        return self._output(state, data), next_name
+
+    @staticmethod
+    def _output(state: Dict[str, Any], data: Any) -> Any:
+        if "OutputPath" not in state:
+            return data
+        return get_path(data, state["OutputPath"]) if state["OutputPath"] is not None else {}
+
+    def _parallel(self, state: Dict[str, Any], data: Any) -> List[Any]:
+        branches = state["Branches"]
+        # a pool per Parallel state: nested or concurrent executions never wait on each other's workers
+        with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix=f"asl-{state['_name']}") as pool:
+            futures = [pool.submit(self._run_machine, branch, _copy(data)) for branch in branches]
+            results, failure = [], None
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except StatesError as e:
+                    failure = failure or e
+        if failure is not None:
+            # a failed branch fails the Parallel state with the branch's error, which Retry/Catch then see
+            raise StatesError(failure.error, failure.cause)
+        return results
+
+    # --- bulk ------------------------------------------------------------------
+
+    def run_many(self, inputs: Iterable[Any], max_workers: int = 8) -> Iterator[Tuple[Any, Optional[Any], Optional[StatesError]]]:
+        """Run executions concurrently on threads; yields (input, output, error) as they finish."""
+        from concurrent.futures import as_completed
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asl-exec") as pool:
+            futures = {pool.submit(self.run, item): item for item in inputs}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except StatesError as e:
+                    yield futures[future], None, e
+
+
+_process_executor: Optional[LocalExecutor] = None
+
+
+def _process_init(definition_path: str, resources: Dict[str, str], retry_delay_scale: float) -> None:
+    global _process_executor
+    _process_executor = LocalExecutor(
+        definition_path=definition_path, resources=resources, retry_delay_scale=retry_delay_scale
+    )
+
+
+def _process_run(item: Any) -> Tuple[Optional[Any], Optional[Tuple[str, str]]]:
+    try:
+        return _process_executor.run(item), None
+    except StatesError as e:
+        return None, (e.error, e.cause)
+
+
+def run_many_processes(
+    inputs: Iterable[Any],
+    processes: Optional[int] = None,
+    definition_path: str = ASL_DEFINITION_PATH,
+    resources: Optional[Dict[str, str]] = None,
+    retry_delay_scale: float = ASL_RETRY_DELAY_SCALE,
+) -> Iterator[Tuple[Any, Optional[Any], Optional[StatesError]]]:
+    """Like LocalExecutor.run_many, on worker processes (one executor each) to use every core.
+
+    Resources must be "module:function" strings so the workers can import them.
+    """
+    items = list(inputs)
+    with ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count(),
+        initializer=_process_init,
+        initargs=(definition_path, resources or {}, retry_delay_scale),
+    ) as pool:
+        for item, (output, error) in zip(items, pool.map(_process_run, items)):
+            yield item, output, ExecutionFailed(*error) if error else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the contract review state machine in-process")
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--key", required=True)
+    parser.add_argument("--contract-id", default="")
+    parser.add_argument("--definition", default=ASL_DEFINITION_PATH, help="ASL definition file")
+    parser.add_argument("--resource", action="append", default=[], metavar="NAME=MODULE:FUNCTION",
+                        help="override the handler for an ASL placeholder")
+    args = parser.parse_args()
+
+    resources = dict(item.split("=", 1) for item in args.resource)
+    executor = LocalExecutor(definition_path=args.definition, resources=resources)
+    execution_input = {
+        "contract_id": args.contract_id,
+        "s3": {"bucket": args.bucket, "key": args.key},
+        "s3_uri": f"s3://{args.bucket}/{args.key}",
+    }
+    started = time.monotonic()
+    try:
+        output = executor.run(execution_input)
+    except ExecutionFailed as e:
+        print(json.dumps({"status": "FAILED", "error": e.error, "cause": e.cause}, indent=2))
+        raise SystemExit(1)
+    print(json.dumps({"status": "SUCCEEDED", "seconds": round(time.monotonic() - started, 2), "output": output}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Bedrock batch inference for non-urgent bulk reviews.
+
+Instead of one on-demand invoke_model call per agent and document, the
+compliance and risk prompts for a whole document set are rendered into one
+JSONL file and processed as a Bedrock model invocation job (batch pricing,
+no per-minute request quota). The job's output is parsed back into the
+`compliance_findings` / `risk_analysis_findings` shapes the decision stage
+consumes, so the results can go straight into the decision lambda (or its
+batch_handler).
+
+    python -m agents.shared.batch_inference prepare --documents docs.jsonl --dir batch/
+    python -m agents.shared.batch_inference submit --dir batch/ --s3 s3://bucket/batch/run1/ --role-arn ARN --wait
+    python -m agents.shared.batch_inference run-local --dir batch/       # stand-in for submit
+    python -m agents.shared.batch_inference collect --dir batch/ --decide
+
+Documents are ingestion outputs (one JSON object per line with
+"extracted_text" or "extracted_text_ref"); lines with only "s3" are run
+through the ingestion handler first. Prompts are built exactly like the
+lambdas' on-demand path (compact output when COMPACT_OUTPUT_ENABLED), minus
+streaming, the model cascade and incremental re-analysis.
+
+Files in --dir: records.jsonl (job input: {"recordId", "modelInput"}),
+manifest.jsonl (per document: event fields and clause numbering for
+expansion), records.jsonl.out (job output: {"recordId", "modelOutput"} or
+{"recordId", "error"}), findings.jsonl and, with --decide, decisions.jsonl.
+
+Bedrock requires a minimum number of records per job (100 by default) and
+the service role needs read access to the input and write access to the
+output prefix.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agents.shared.bedrock_client import BEDROCK_REGION, build_messages_body, get_invoker, parse_output_text
+from agents.shared.claim_check import load_extracted_text
+from agents.shared.compact_schema import COMPACT_OUTPUT_ENABLED, expand_compliance_text, expand_risk_text, numbered_clauses
+from agents.shared.tenant_context import extract_tenant_id_from_s3_key, load_tenant_config
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BATCH_MODEL_ID = os.environ.get("BATCH_MODEL_ID") or os.environ.get("BEDROCK_MODEL_ID", "us.amazon.nova-lite-v1:0")
+BATCH_ROLE_ARN = os.environ.get("BATCH_ROLE_ARN")
+BATCH_MIN_RECORDS = int(os.environ.get("BATCH_MIN_RECORDS", "100"))
+BATCH_POLL_SECONDS = float(os.environ.get("BATCH_POLL_SECONDS", "60"))
+
+RECORDS_FILE = "records.jsonl"
+MANIFEST_FILE = "manifest.jsonl"
+FINDINGS_FILE = "findings.jsonl"
+DECISIONS_FILE = "decisions.jsonl"
+# batch review results are produced by one model pass per agent, without a cascade
+MODEL_TIER_BATCH = "batch"
+
+KIND_COMPLIANCE = "compliance"
+KIND_RISK = "risk"
+JOB_DONE_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+
+
+def _read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _write_jsonl(path: str, rows: Iterable[Dict[str, Any]]) -> int:
+    count = 0
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+            count += 1
+    os.replace(f"{path}.tmp", path)
+    return count
+
+
+def _record_id(index: int, kind: str) -> str:
+    return f"{index:08d}-{kind}"
+
+
+# ---------------------------------------------------------------------------
+# prepare
+# ---------------------------------------------------------------------------
+
+def _ingested(document: Dict[str, Any]) -> Dict[str, Any]:
+    if document.get("extracted_text") or document.get("extracted_text_ref"):
+        return document
+    from agents.ingestion.main import handler as ingestion_handler
+    return ingestion_handler({"contract_id": document.get("contract_id", ""), "s3": document["s3"],
+                              "s3_uri": document.get("s3_uri") or f"s3://{document['s3']['bucket']}/{document['s3']['key']}"}, None)
+
+
+def render_prompts(event: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Compliance and risk prompts for one ingested document, plus what is needed to expand the answers."""
+    from agents.compliance.main import (
+        COMPLIANCE_PROMPT_TOKEN_BUDGET,
+        _build_bedrock_prompt,
+        _build_compact_prompt,
+        analyze_text_rules,
+    )
+    from agents.risk_analysis.main import RISK_PROMPT_TOKEN_BUDGET, _make_compact_prompt, _make_prompt
+
+    contract_id = event.get("contract_id")
+    s3_info = event.get("s3") or {}
+    s3_uri = event.get("s3_uri") or f"s3://{s3_info.get('bucket', '')}/{s3_info.get('key', '')}"
+    text = load_extracted_text(event)
+    tenant_cfg = load_tenant_config(extract_tenant_id_from_s3_key(s3_info.get("key")))
+    region, industry = tenant_cfg.get("region"), tenant_cfg.get("industry")
+    findings = analyze_text_rules(text, tenant_cfg)
+
+    expansion: Dict[str, Any] = {}
+    if COMPACT_OUTPUT_ENABLED:
+        compliance_numbered = numbered_clauses(text, token_budget=COMPLIANCE_PROMPT_TOKEN_BUDGET)
+        risk_numbered = numbered_clauses(text, token_budget=RISK_PROMPT_TOKEN_BUDGET)
+        prompts = {
+            KIND_COMPLIANCE: _build_compact_prompt(contract_id, s3_uri, compliance_numbered, findings, region, industry),
+            KIND_RISK: _make_compact_prompt(risk_numbered, contract_id),
+        }
+        expansion = {KIND_COMPLIANCE: compliance_numbered["clauses"], KIND_RISK: risk_numbered["clauses"]}
+    else:
+        prompts = {
+            KIND_COMPLIANCE: _build_bedrock_prompt(contract_id, s3_uri, text, findings, region, industry),
+            KIND_RISK: _make_prompt(text, contract_id),
+        }
+    return prompts, expansion
+
+
+def prepare(documents: Iterable[Dict[str, Any]], directory: str) -> int:
+    """Write the job input (records.jsonl) and manifest for a document set; returns the number of documents."""
+    os.makedirs(directory, exist_ok=True)
+    records: List[Dict[str, Any]] = []
+    manifest: List[Dict[str, Any]] = []
+    for index, document in enumerate(documents):
+        try:
+            event = _ingested(document)
+            prompts, expansion = render_prompts(event)
+        except Exception as e:
+            logger.warning("prepare: skipping document %d (%s): %s", index, document.get("s3_uri"), e)
+            manifest.append({"index": index, "s3": document.get("s3"), "s3_uri": document.get("s3_uri"), "error": str(e)})
+            continue
+        for kind, prompt in prompts.items():
+            records.append({"recordId": _record_id(index, kind), "modelInput": json.loads(build_messages_body(prompt))})
+        manifest.append({
+            "index": index,
+            "contract_id": event.get("contract_id"),
+            "s3": event.get("s3"),
+            "s3_uri": event.get("s3_uri"),
+            "expansion": expansion,
+        })
+    _write_jsonl(os.path.join(directory, RECORDS_FILE), records)
+    _write_jsonl(os.path.join(directory, MANIFEST_FILE), manifest)
+    if len(records) < BATCH_MIN_RECORDS:
+        logger.warning("prepare: %d records is below the batch job minimum (%d); use run-local", len(records), BATCH_MIN_RECORDS)
+    logger.info("prepare: %d documents, %d records in %s", len(manifest), len(records), directory)
+    return len(manifest)
+
+
+# ---------------------------------------------------------------------------
+# submit (Bedrock model invocation job) / run-local (stand-in)
+# ---------------------------------------------------------------------------
+
+def _split_s3_uri(uri: str) -> Tuple[str, str]:
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def submit(
+    directory: str,
+    s3_uri: str,
+    role_arn: str,
+    model_id: str = BATCH_MODEL_ID,
+    job_name: Optional[str] = None,
+    bedrock_client=None,
+    s3_client=None,
+) -> str:
+    """Upload records.jsonl under s3_uri and create the model invocation job; returns the job ARN."""
+    import boto3
+    s3_client = s3_client or boto3.client("s3")
+    bedrock_client = bedrock_client or boto3.client("bedrock", region_name=BEDROCK_REGION)
+    prefix = s3_uri.rstrip("/") + "/"
+    bucket, key_prefix = _split_s3_uri(prefix)
+    s3_client.upload_file(os.path.join(directory, RECORDS_FILE), bucket, f"{key_prefix}input/{RECORDS_FILE}")
+    job_name = job_name or f"contract-review-{time.strftime('%Y%m%d-%H%M%S')}"
+    response = bedrock_client.create_model_invocation_job(
+        jobName=job_name,
+        roleArn=role_arn,
+        modelId=model_id,
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": f"{prefix}input/{RECORDS_FILE}", "s3InputFormat": "JSONL"}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"{prefix}output/"}},
+    )
+    job_arn = response["jobArn"]
+    with open(os.path.join(directory, "job.json"), "w", encoding="utf-8") as f:
+        json.dump({"job_arn": job_arn, "job_name": job_name, "s3_uri": prefix, "model_id": model_id}, f)
+    logger.info("submit: created %s (%s)", job_name, job_arn)
+    return job_arn
+
+
+def wait_and_download(directory: str, bedrock_client=None, s3_client=None, poll_seconds: float = BATCH_POLL_SECONDS) -> str:
+    """Poll the submitted job until it finishes and download its output next to the input; returns the job status."""
+    import boto3
+    s3_client = s3_client or boto3.client("s3")
+    bedrock_client = bedrock_client or boto3.client("bedrock", region_name=BEDROCK_REGION)
+    with open(os.path.join(directory, "job.json"), "r", encoding="utf-8") as f:
+        job = json.load(f)
+    while True:
+        status = bedrock_client.get_model_invocation_job(jobIdentifier=job["job_arn"])["status"]
+        if status in JOB_DONE_STATUSES:
+            break
+        logger.info("wait_and_download: %s is %s", job["job_name"], status)
+        time.sleep(poll_seconds)
+    if status not in ("Completed", "PartiallyCompleted"):
+        logger.warning("wait_and_download: %s ended %s", job["job_name"], status)
+        return status
+    # output lands under <output prefix><job id>/<input file name>.out
+    bucket, key_prefix = _split_s3_uri(f"{job['s3_uri']}output/{job['job_arn'].rsplit('/', 1)[-1]}/")
+    s3_client.download_file(bucket, f"{key_prefix}{RECORDS_FILE}.out", os.path.join(directory, f"{RECORDS_FILE}.out"))
+    return status
+
+
+def run_local(directory: str, answer: Optional[Callable[[Dict[str, Any]], str]] = None, model_id: str = BATCH_MODEL_ID,
+              concurrency: int = 8) -> int:
+    """Stand-in for the batch job: answer every record on demand and write records.jsonl.out in the job's format.
+
+    answer(model_input) -> text defaults to the shared Bedrock invoker; pass a callable to run fully offline.
+    """
+    invoker = None if answer is not None else get_invoker()
+
+    def _one(record: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            if answer is not None:
+                text = answer(record["modelInput"])
+            else:
+                text = invoker.invoke_body(model_id, json.dumps(record["modelInput"]).encode("utf-8"))
+        except Exception as e:
+            return {"recordId": record["recordId"], "error": {"errorCode": type(e).__name__, "errorMessage": str(e)}}
+        return {"recordId": record["recordId"], "modelOutput": {"output": {"message": {"content": [{"text": text}]}}}}
+
+    records = list(_read_jsonl(os.path.join(directory, RECORDS_FILE)))
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        count = _write_jsonl(os.path.join(directory, f"{RECORDS_FILE}.out"), pool.map(_one, records))
+    logger.info("run_local: answered %d records", count)
+    return count
+
+
+# ---------------------------------------------------------------------------
+# collect
+# ---------------------------------------------------------------------------
+
+def _findings(kind: str, text: Optional[str], clauses: Optional[List[Dict[str, Any]]]) -> Tuple[Dict[str, Any], Optional[str]]:
+    from agents.compliance.main import _extract_overall_compliance
+    from agents.risk_analysis.main import _extract_overall_numbers
+
+    if text is None:
+        return {}, None
+    if kind == KIND_COMPLIANCE:
+        if clauses:
+            text = expand_compliance_text(text, clauses)
+        return _extract_overall_compliance(text), text
+    if clauses:
+        text = expand_risk_text(text, clauses)
+    overall = _extract_overall_numbers(text)
+    return {
+        "overall_risk_score": overall.get("overall_risk_score"),
+        "overall_confidence": overall.get("overall_confidence"),
+    }, text
+
+
+def collect(directory: str) -> List[Dict[str, Any]]:
+    """Decision-stage events (compliance_findings + risk_analysis_findings) for every prepared document."""
+    answers: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for row in _read_jsonl(os.path.join(directory, f"{RECORDS_FILE}.out")):
+        if row.get("modelOutput") is not None:
+            answers[row["recordId"]] = (parse_output_text(json.dumps(row["modelOutput"])), None)
+        else:
+            error = row.get("error")
+            answers[row["recordId"]] = (None, json.dumps(error) if isinstance(error, dict) else str(error))
+
+    events = []
+    for doc in _read_jsonl(os.path.join(directory, MANIFEST_FILE)):
+        event = {
+            "contract_id": doc.get("contract_id"),
+            "s3": doc.get("s3"),
+            "s3_uri": doc.get("s3_uri"),
+            "review_mode": "separate",
+            "model_tier": MODEL_TIER_BATCH,
+        }
+        errors = {"prepare": doc["error"]} if doc.get("error") else {}
+        for kind, findings_key, response_key in (
+            (KIND_COMPLIANCE, "compliance_findings", "compliance_model_response"),
+            (KIND_RISK, "risk_analysis_findings", "risk_model_response"),
+        ):
+            text, error = answers.get(_record_id(doc["index"], kind), (None, None if doc.get("error") else "missing"))
+            event[findings_key], event[response_key] = _findings(kind, text, (doc.get("expansion") or {}).get(kind))
+            if error:
+                errors[kind] = error
+        if errors:
+            event["batch_errors"] = errors
+        events.append(event)
+    _write_jsonl(os.path.join(directory, FINDINGS_FILE), events)
+    logger.info("collect: %d documents, %d with errors", len(events), sum(1 for e in events if e.get("batch_errors")))
+    return events
+
+
+def decide(directory: str, events: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Run the decision handler over collected events; writes decisions.jsonl and returns the decision counts."""
+    from agents.decision.main import handler as decision_handler
+    decisions = [decision_handler(event, None) for event in events if not event.get("batch_errors")]
+    _write_jsonl(os.path.join(directory, DECISIONS_FILE), decisions)
+    counts: Dict[str, int] = {}
+    for item in decisions:
+        counts[item["decision"]] = counts.get(item["decision"], 0) + 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch (Bedrock model invocation job) contract reviews")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("prepare", help="render prompts for a document set")
+    p.add_argument("--documents", required=True, help="JSONL of ingestion outputs (or {\"s3\": ...} to ingest)")
+    p.add_argument("--dir", required=True)
+    p = sub.add_parser("submit", help="upload the records and create the model invocation job")
+    p.add_argument("--dir", required=True)
+    p.add_argument("--s3", required=True, help="s3://bucket/prefix/ for job input and output")
+    p.add_argument("--role-arn", default=BATCH_ROLE_ARN, help="service role for the job (or BATCH_ROLE_ARN)")
+    p.add_argument("--model-id", default=BATCH_MODEL_ID)
+    p.add_argument("--job-name")
+    p.add_argument("--wait", action="store_true", help="wait for the job and download its output")
+    p = sub.add_parser("wait", help="wait for the submitted job and download its output")
+    p.add_argument("--dir", required=True)
+    p = sub.add_parser("run-local", help="answer the records on demand instead of a batch job")
+    p.add_argument("--dir", required=True)
+    p.add_argument("--model-id", default=BATCH_MODEL_ID)
+    p.add_argument("--concurrency", type=int, default=8)
+    p = sub.add_parser("collect", help="parse the job output into findings (and decisions)")
+    p.add_argument("--dir", required=True)
+    p.add_argument("--decide", action="store_true", help="also run the decision stage")
+    args = parser.parse_args()
+
+    if args.command == "prepare":
+        print("prepared", prepare(_read_jsonl(args.documents), args.dir), "documents")
+    elif args.command == "submit":
+        if not args.role_arn:
+            parser.error("submit needs --role-arn or BATCH_ROLE_ARN")
+        print("submitted", submit(args.dir, args.s3, args.role_arn, args.model_id, args.job_name))
+        if args.wait:
+            print("job", wait_and_download(args.dir))
+    elif args.command == "wait":
+        print("job", wait_and_download(args.dir))
+    elif args.command == "run-local":
+        print("answered", run_local(args.dir, model_id=args.model_id, concurrency=args.concurrency), "records")
+    else:
+        events = collect(args.dir)
+        print("collected", len(events), "documents")
+        if args.decide:
+            print("decisions", json.dumps(decide(args.dir, events)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Persistent Bedrock response cache with in-flight request coalescing.
+
+Responses are keyed on sha256(model id + request body), so retries, Step
+Functions re-runs and duplicate uploads that produce a byte-identical prompt
+are answered without calling `invoke_model` again. Prompts therefore carry no
+per-run identifiers (contract id, S3 URI): the contract id is a fresh UUID per
+execution and would make every key unique.
+
+Backends share the get/put/delete/list interface of the extraction cache:
+- LocalCacheBackend (agents/shared/extraction_cache.py): JSON files on local disk,
+  the default and the local stand-in for the table backend
+- DynamoCacheBackend: a DynamoDB table keyed on "cache_key", with an
+  "expires_at" attribute for the table's native TTL
+
+Entries older than the TTL are misses; the local backend is also kept under
+a size limit by evicting least recently used entries. Concurrent identical
+requests inside one container collapse into a single call (single-flight).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agents.shared.extraction_cache import LocalCacheBackend
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BEDROCK_CACHE_ENABLED = os.environ.get("BEDROCK_CACHE_ENABLED", "true").lower() == "true"
+BEDROCK_CACHE_TABLE = os.environ.get("BEDROCK_CACHE_TABLE")
+BEDROCK_CACHE_DIR = os.environ.get("BEDROCK_CACHE_DIR", "/tmp/bedrock_cache")
+BEDROCK_CACHE_TTL_SECONDS = int(os.environ.get("BEDROCK_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+BEDROCK_CACHE_MAX_BYTES = int(os.environ.get("BEDROCK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def cache_key(model_id: str, body: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(model_id.encode("utf-8"))
+    h.update(b"\0")
+    h.update(body)
+    return h.hexdigest()
+
+
+class DynamoCacheBackend:
+    """Cache entries in a DynamoDB table (partition key "cache_key", TTL attribute "expires_at")."""
+
+    def __init__(self, table, ttl_seconds: int = BEDROCK_CACHE_TTL_SECONDS):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={"cache_key": key}).get("Item")
+        return json.loads(item["entry"]) if item else None
+
+    def put(self, key: str, entry: Dict[str, Any]) -> int:
+        data = json.dumps(entry)
+        self.table.put_item(Item={
+            "cache_key": key,
+            "entry": data,
+            "expires_at": int(time.time() + self.ttl_seconds),
+        })
+        return len(data)
+
+    def delete(self, key: str) -> None:
+        self.table.delete_item(Key={"cache_key": key})
+
+    def list(self) -> List[Tuple[str, int, float]]:
+        # the table relies on native TTL for expiry; size-based eviction is not applied
+        return []
+
+
+class BedrockResponseCache:
+    """TTL + LRU response cache with single-flight coalescing of identical in-flight calls."""
+
+    def __init__(
+        self,
+        backend,
+        ttl_seconds: int = BEDROCK_CACHE_TTL_SECONDS,
+        max_bytes: int = BEDROCK_CACHE_MAX_BYTES,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def _get(self, key: str) -> Optional[str]:
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.warning("BedrockResponseCache: get failed: %s", e)
+            return None
+        if not entry:
+            return None
+        if self.ttl_seconds and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            try:
+                self.backend.delete(key)
+            except Exception as e:
+                # an expired entry is a miss either way; the fresh answer overwrites it
+                logger.warning("BedrockResponseCache: delete failed: %s", e)
+            return None
+        return entry.get("output_text")
+
+    def _put(self, key: str, model_id: str, output_text: str) -> None:
+        try:
+            self.backend.put(key, {"model_id": model_id, "output_text": output_text, "created_at": time.time()})
+            self._evict()
+        except Exception as e:
+            # caching is best-effort; the caller already has its answer
+            logger.warning("BedrockResponseCache: put failed: %s", e)
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        entries = self.backend.list()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total <= self.max_bytes:
+                break
+            self.backend.delete(key)
+            total -= size
+
+    def get_or_invoke(
+        self,
+        model_id: str,
+        body: bytes,
+        invoke: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = bool,
+        text_of: Optional[Callable[[Any], str]] = None,
+    ) -> Any:
+        """Return the cached output for (model_id, body) or call `invoke` once for all concurrent callers.
+
+        Only outputs for which `cacheable(output)` is true are stored (e.g. skip empty answers). `invoke` may
+        return a richer result than the text (e.g. with a completion flag); `text_of` extracts the text to
+        store. Callers that join an in-flight call get that result as is; cache hits return the stored text.
+        """
+        key = cache_key(model_id, body)
+        cached = self._get(key)
+        if cached is not None:
+            logger.info("BedrockResponseCache: hit %s", key[:12])
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            logger.info("BedrockResponseCache: joining in-flight call %s", key[:12])
+            return future.result()
+
+        try:
+            output = invoke()
+            if cacheable(output):
+                self._put(key, model_id, text_of(output) if text_of else output)
+            future.set_result(output)
+            return output
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def build_response_cache(dynamodb_resource=None) -> Optional[BedrockResponseCache]:
+    """Build the cache from environment settings; None when caching is disabled."""
+    if not BEDROCK_CACHE_ENABLED:
+        return None
+    if BEDROCK_CACHE_TABLE:
+        if dynamodb_resource is None:
+            import boto3
+            dynamodb_resource = boto3.resource("dynamodb")
+        return BedrockResponseCache(DynamoCacheBackend(dynamodb_resource.Table(BEDROCK_CACHE_TABLE)), max_bytes=0)
+    return BedrockResponseCache(LocalCacheBackend(BEDROCK_CACHE_DIR))
+
+
+_response_cache = None
+
+
+def get_response_cache() -> Optional[BedrockResponseCache]:
+    """Per-container cache singleton, so single-flight coalescing spans all callers in the container."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = build_response_cache() or False
+    return _response_cache or None
+
+
+def cached_invoke(
+    model_id: str,
+    body: bytes,
+    invoke: Callable[[], Any],
+    cacheable: Callable[[Any], bool] = bool,
+    text_of: Optional[Callable[[Any], str]] = None,
+) -> Any:
+    """Run `invoke` through the container's response cache, or directly when caching is disabled."""
+    cache = get_response_cache()
+    if cache is None:
+        return invoke()
+    return cache.get_or_invoke(model_id, body, invoke, cacheable, text_of)
@@ -0,0 +1,393 @@
+"""
+Shared Bedrock invocation layer for the agents.
+
+One bedrock-runtime client per container, with a connection pool sized for
+concurrent callers and botocore's own retries turned off, so retries are
+handled here instead:
+- token buckets per model id and per tenant cap the request rate
+- an AIMD limiter per model caps in-flight requests: +1 slot after a window
+  of successes, halved on a throttling error
+- retryable errors (throttling, 5xx, timeouts) back off with full jitter
+
+Under throttling, the concurrency drops and retries spread out instead of
+every caller retrying at once. Each call, retries included, is bounded by
+BEDROCK_CALL_BUDGET_SECONDS and by the Lambda invocation's remaining time
+(`set_invocation_deadline(context)` at handler entry), so it gives up with an
+error instead of being killed by the Lambda / Step Functions task timeout.
+Successful answers go through the response cache
+(agents/shared/bedrock_cache.py), so cache hits skip the limiter.
+
+`invoke_stream` uses invoke_model_with_response_stream and parses the JSON
+answer incrementally (agents/shared/stream_json.py), so decision fields can
+be published, and generation optionally stopped, before the answer is done.
+
+Limits apply per container. Set BEDROCK_MODEL_RPS / BEDROCK_TENANT_RPS to
+your account quota divided by the expected number of warm containers.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+
+from agents.shared.bedrock_cache import cached_invoke
+from agents.shared.stream_json import StreamingFieldParser
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BEDROCK_REGION = os.environ.get("BEDROCK_REGION", "us-east-1")
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", "32"))
+BEDROCK_READ_TIMEOUT = int(os.environ.get("BEDROCK_READ_TIMEOUT", "120"))
+BEDROCK_MODEL_RPS = float(os.environ.get("BEDROCK_MODEL_RPS", "5"))
+BEDROCK_MODEL_BURST = float(os.environ.get("BEDROCK_MODEL_BURST", "10"))
+BEDROCK_TENANT_RPS = float(os.environ.get("BEDROCK_TENANT_RPS", "2"))
+BEDROCK_TENANT_BURST = float(os.environ.get("BEDROCK_TENANT_BURST", "4"))
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get("BEDROCK_MAX_CONCURRENCY", "16"))
+BEDROCK_INITIAL_CONCURRENCY = int(os.environ.get("BEDROCK_INITIAL_CONCURRENCY", "4"))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_ATTEMPTS", "5"))
+BEDROCK_BACKOFF_BASE = float(os.environ.get("BEDROCK_BACKOFF_BASE", "0.5"))
+BEDROCK_BACKOFF_CAP = float(os.environ.get("BEDROCK_BACKOFF_CAP", "20"))
+BEDROCK_ACQUIRE_TIMEOUT = float(os.environ.get("BEDROCK_ACQUIRE_TIMEOUT", "60"))
+# total time for one call including retries; keep below the 300s Lambda / task timeout
+BEDROCK_CALL_BUDGET_SECONDS = float(os.environ.get("BEDROCK_CALL_BUDGET_SECONDS", "240"))
+# time left for the handler after the last Bedrock call of an invocation
+BEDROCK_DEADLINE_MARGIN_SECONDS = float(os.environ.get("BEDROCK_DEADLINE_MARGIN_SECONDS", "10"))
+# time kept free for the request itself when waiting for a slot or backing off; a typical answer, not the
+# socket read timeout, so short Lambda timeouts still leave room to wait and retry
+BEDROCK_EXPECTED_LATENCY_SECONDS = float(os.environ.get("BEDROCK_EXPECTED_LATENCY_SECONDS", "30"))
+BEDROCK_STREAMING_ENABLED = os.environ.get("BEDROCK_STREAMING_ENABLED", "false").lower() == "true"
+BEDROCK_STREAM_EARLY_STOP = os.environ.get("BEDROCK_STREAM_EARLY_STOP", "false").lower() == "true"
+
+THROTTLING_ERRORS = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ProvisionedThroughputExceededException",
+}
+TRANSIENT_ERRORS = {
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+    "ModelTimeoutException",
+    "ModelStreamErrorException",
+}
+
+
+class BedrockThrottled(Exception):
+    """Raised when a rate limit or concurrency slot cannot be acquired in time."""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = BEDROCK_ACQUIRE_TIMEOUT) -> None:
+        if self.rate <= 0:
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                raise BedrockThrottled("token bucket wait exceeds timeout")
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """Adaptive in-flight limit: additive increase on success, multiplicative decrease on throttling."""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, backoff: float = 0.5):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float = BEDROCK_ACQUIRE_TIMEOUT) -> None:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout=timeout):
+                raise BedrockThrottled("no concurrency slot available")
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            else:
+                # one extra slot per `limit` successes
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+# monotonic deadline of the current Lambda invocation (None outside Lambda)
+_invocation_deadline: Optional[float] = None
+
+
+def set_invocation_deadline(context: Any) -> None:
+    """Bound Bedrock calls by the remaining time of a Lambda invocation; a context without it clears the bound."""
+    global _invocation_deadline
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if remaining is None:
+        _invocation_deadline = None
+        return
+    _invocation_deadline = time.monotonic() + remaining() / 1000.0 - BEDROCK_DEADLINE_MARGIN_SECONDS
+
+
+def _error_code(exc: Exception) -> Optional[str]:
+    code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+    # errors raised from inside a response stream use camelCase codes (e.g. "throttlingException")
+    return code[:1].upper() + code[1:] if code else code
+
+
+def build_messages_body(prompt: str) -> bytes:
+    """Chat-style request body with the required `messages` key."""
+    return json.dumps({"messages": [{"role": "user", "content": [{"text": prompt}]}]}).encode("utf-8")
+
+
+def parse_output_text(raw: Any) -> str:
+    """Return the text of an invoke_model response body, or the raw body when it has an unexpected shape."""
+    if hasattr(raw, "read"):
+        raw = raw.read()
+    model_text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else str(raw)
+    try:
+        parsed = json.loads(model_text)
+        blocks = parsed.get("output", {}).get("message", {}).get("content", [])
+    except Exception:
+        return model_text
+    if not isinstance(blocks, list):
+        return model_text
+    return "".join(block.get("text", "") for block in blocks if isinstance(block, dict)).strip()
+
+
+def stream_delta_text(event: Dict[str, Any]) -> str:
+    """Text delta of one response-stream event (Nova, Anthropic and Titan chunk shapes)."""
+    chunk = (event or {}).get("chunk") or {}
+    data = chunk.get("bytes")
+    if not data:
+        return ""
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return ""
+    delta = (payload.get("contentBlockDelta") or {}).get("delta") or payload.get("delta") or {}
+    if isinstance(delta, dict) and delta.get("text"):
+        return delta["text"]
+    return payload.get("outputText") or ""
+
+
+class BedrockInvoker:
+    """Rate-limited, adaptively concurrent, retrying wrapper around bedrock-runtime invoke_model."""
+
+    def __init__(self, client=None):
+        self.client = client or boto3.client(
+            "bedrock-runtime",
+            region_name=BEDROCK_REGION,
+            config=Config(
+                max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                read_timeout=BEDROCK_READ_TIMEOUT,
+                connect_timeout=5,
+                tcp_keepalive=True,
+                retries={"max_attempts": 1, "mode": "standard"},
+            ),
+        )
+        self._lock = threading.Lock()
+        self._model_buckets: Dict[str, TokenBucket] = {}
+        self._tenant_buckets: Dict[str, TokenBucket] = {}
+        self._limiters: Dict[str, AIMDLimiter] = {}
+
+    def _model_bucket(self, model_id: str) -> TokenBucket:
+        with self._lock:
+            if model_id not in self._model_buckets:
+                self._model_buckets[model_id] = TokenBucket(BEDROCK_MODEL_RPS, BEDROCK_MODEL_BURST)
+            return self._model_buckets[model_id]
+
+    def _tenant_bucket(self, tenant_id: str) -> TokenBucket:
+        with self._lock:
+            if tenant_id not in self._tenant_buckets:
+                self._tenant_buckets[tenant_id] = TokenBucket(BEDROCK_TENANT_RPS, BEDROCK_TENANT_BURST)
+            return self._tenant_buckets[tenant_id]
+
+    def limiter(self, model_id: str) -> AIMDLimiter:
+        with self._lock:
+            if model_id not in self._limiters:
+                self._limiters[model_id] = AIMDLimiter(BEDROCK_INITIAL_CONCURRENCY, BEDROCK_MAX_CONCURRENCY)
+            return self._limiters[model_id]
+
+    def _call_once(self, model_id: str, tenant_id: Optional[str], call: Callable[[], Any], acquire_by: float) -> Any:
+        """One attempt; rate limit and concurrency waits together end by `acquire_by` (monotonic)."""
+        if tenant_id:
+            self._tenant_bucket(tenant_id).acquire(timeout=max(0.0, acquire_by - time.monotonic()))
+        self._model_bucket(model_id).acquire(timeout=max(0.0, acquire_by - time.monotonic()))
+        limiter = self.limiter(model_id)
+        limiter.acquire(timeout=max(0.0, acquire_by - time.monotonic()))
+        throttled = False
+        try:
+            return call()
+        except ClientError as e:
+            throttled = _error_code(e) in THROTTLING_ERRORS
+            raise
+        finally:
+            limiter.release(throttled=throttled)
+
+    def _with_retries(self, model_id: str, tenant_id: Optional[str], call: Callable[[], Any]) -> Any:
+        """Run `call` with retries on throttling / transient errors; non-retryable errors are raised immediately.
+
+        Attempts are only made while BEDROCK_EXPECTED_LATENCY_SECONDS still fits before the deadline (call budget
+        or Lambda invocation deadline, whichever comes first); past that the last error is raised.
+        """
+        deadline = time.monotonic() + BEDROCK_CALL_BUDGET_SECONDS
+        if _invocation_deadline is not None:
+            deadline = min(deadline, _invocation_deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            # waiting for a slot must leave room for the request itself
+            acquire_by = min(time.monotonic() + BEDROCK_ACQUIRE_TIMEOUT, deadline - BEDROCK_EXPECTED_LATENCY_SECONDS)
+            try:
+                return self._call_once(model_id, tenant_id, call, acquire_by)
+            except (ClientError, BotoConnectionError, ReadTimeoutError, BedrockThrottled) as e:
+                code = _error_code(e)
+                retryable = not isinstance(e, ClientError) or code in THROTTLING_ERRORS or code in TRANSIENT_ERRORS
+                if not retryable or attempt >= BEDROCK_MAX_ATTEMPTS:
+                    raise
+                # full jitter: uniform over [0, min(cap, base * 2^attempt)]
+                delay = random.uniform(0, min(BEDROCK_BACKOFF_CAP, BEDROCK_BACKOFF_BASE * (2 ** attempt)))
+                if time.monotonic() + delay + BEDROCK_EXPECTED_LATENCY_SECONDS > deadline:
+                    logger.warning("BedrockInvoker: %s on %s, no time left for another attempt", code or type(e).__name__, model_id)
+                    raise
+                logger.warning(
+                    "BedrockInvoker: %s on %s (attempt %d/%d), retrying in %.2fs",
+                    code or type(e).__name__, model_id, attempt, BEDROCK_MAX_ATTEMPTS, delay,
+                )
+                time.sleep(delay)
+
+    def invoke_body(self, model_id: str, body: bytes, tenant_id: Optional[str] = None) -> str:
+        """Invoke with rate limiting and retries and return the model's text."""
+        def _call() -> str:
+            response = self.client.invoke_model(
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=body,
+            )
+            return parse_output_text(response.get("body"))
+
+        return self._with_retries(model_id, tenant_id, _call)
+
+    def invoke_text(self, prompt: str, model_id: str, tenant_id: Optional[str] = None) -> str:
+        """Send a single-turn prompt and return the model's text; answers are served from the response cache when possible."""
+        body = build_messages_body(prompt)
+        result = cached_invoke(model_id, body, lambda: self.invoke_body(model_id, body, tenant_id))
+        if isinstance(result, dict):
+            # joined an in-flight invoke_stream call; one stopped early only has a partial answer
+            if result["complete"]:
+                return result["text"]
+            return self.invoke_body(model_id, body, tenant_id)
+        return result
+
+    def invoke_stream(
+        self,
+        prompt: str,
+        model_id: str,
+        tenant_id: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        stop_when_complete: bool = False,
+    ) -> Dict[str, Any]:
+        """Stream a single-turn prompt with invoke_model_with_response_stream.
+
+        Watched top-level JSON `fields` are parsed as the text arrives and passed to `on_field(name, value)`
+        as soon as each one is complete. With `stop_when_complete`, the stream is closed once every watched
+        field has arrived; that partial answer is not cached.
+
+        Returns {"text", "fields", "complete"} where complete is False when generation was stopped early.
+        """
+        body = build_messages_body(prompt)
+        state: Dict[str, Any] = {"parser": None}
+
+        def _call() -> Dict[str, Any]:
+            # a retried attempt starts over with a fresh parser
+            parser = StreamingFieldParser(fields)
+            state["parser"] = parser
+            stopped = False
+            response = self.client.invoke_model_with_response_stream(
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=body,
+            )
+            stream = response.get("body")
+            parts = []
+            for event in stream:
+                text = stream_delta_text(event)
+                if not text:
+                    continue
+                parts.append(text)
+                for name, value in parser.feed(text):
+                    if on_field:
+                        on_field(name, value)
+                if stop_when_complete and parser.watch and parser.complete:
+                    stopped = True
+                    # closing the connection ends generation, so the remaining tokens are not produced
+                    if hasattr(stream, "close"):
+                        stream.close()
+                    break
+            # the completion flag travels with the result, so callers joining this call see it too
+            return {"text": "".join(parts).strip(), "complete": not stopped}
+
+        result = cached_invoke(
+            model_id,
+            body,
+            lambda: self._with_retries(model_id, tenant_id, _call),
+            cacheable=lambda out: bool(out["text"]) and out["complete"],
+            text_of=lambda out: out["text"],
+        )
+        if isinstance(result, str):
+            # a cache hit or a joined invoke_text call: only full answers are returned there
+            result = {"text": result, "complete": True}
+        if state["parser"] is None:
+            # served from the cache or by a coalesced in-flight call: parse the text once
+            state["parser"] = StreamingFieldParser(fields)
+            for name, value in state["parser"].feed(result["text"]):
+                if on_field:
+                    on_field(name, value)
+        return {"text": result["text"], "fields": dict(state["parser"].fields), "complete": result["complete"]}
+
+
+_invoker: Optional[BedrockInvoker] = None
+_invoker_lock = threading.Lock()
+
+
+def get_invoker() -> BedrockInvoker:
+    """Per-container invoker, so limits and the connection pool are shared by every caller."""
+    global _invoker
+    with _invoker_lock:
+        if _invoker is None:
+            _invoker = BedrockInvoker()
+        return _invoker
+
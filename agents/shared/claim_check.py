@@ -0,0 +1,114 @@
+"""
+Claim-check helpers for passing extracted text between pipeline steps.
+
+Step Functions state is limited to 256 KB and the ingestion output is copied
+into both Parallel branches, so large extractions are written to S3 (gzip
+compressed) and only a small reference travels through the workflow:
+
+    "extracted_text_ref": {"bucket": "...", "key": "...", "encoding": "gzip", "size": 123456}
+
+Documents below CLAIM_CHECK_THRESHOLD_BYTES stay inline as "extracted_text".
+Keys are the SHA-256 of the text, so a reference always names the same bytes
+(contract ids can be reused across runs) and the per-container memo in
+`load_extracted_text` can never return stale text.
+References go to CLAIM_CHECK_BUCKET; without it they are written to the upload
+bucket under CLAIM_CHECK_PREFIX, which the invoke lambda ignores
+(INVOKE_IGNORED_PREFIXES), so they never start a pipeline of their own.
+Downstream agents call `load_extracted_text(event)`, which accepts either form.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CLAIM_CHECK_ENABLED = os.environ.get("CLAIM_CHECK_ENABLED", "true").lower() == "true"
+# Keep well under the 256 KB state limit: the payload is duplicated across branches
+CLAIM_CHECK_THRESHOLD_BYTES = int(os.environ.get("CLAIM_CHECK_THRESHOLD_BYTES", str(32 * 1024)))
+CLAIM_CHECK_BUCKET = os.environ.get("CLAIM_CHECK_BUCKET")
+CLAIM_CHECK_PREFIX = os.environ.get("CLAIM_CHECK_PREFIX", "claim-check/")
+
+# Per-container memo so retries and sibling calls do not fetch the same object twice
+_LOADED: Dict[str, str] = {}
+_MAX_LOADED = 16
+
+AWS_REGION = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or "us-east-1"
+
+s3 = boto3.client("s3", region_name=AWS_REGION)
+
+
+def should_claim_check(text: Optional[str], threshold: int = CLAIM_CHECK_THRESHOLD_BYTES) -> bool:
+    if not CLAIM_CHECK_ENABLED or not text:
+        return False
+    return len(text.encode("utf-8")) > threshold
+
+
+def store_extracted_text(
+    text: str,
+    bucket: str,
+    prefix: str = CLAIM_CHECK_PREFIX,
+    s3_client=None,
+) -> Dict[str, Any]:
+    """Write gzip-compressed text to S3 under its content hash and return the reference to pass instead of the text."""
+    client = s3_client or s3
+    raw = text.encode("utf-8")
+    key = f"{prefix.rstrip('/')}/{hashlib.sha256(raw).hexdigest()}.txt.gz"
+    client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=gzip.compress(raw),
+        ContentType="application/gzip",
+    )
+    logger.info("store_extracted_text: wrote %d bytes to s3://%s/%s", len(raw), bucket, key)
+    return {"bucket": bucket, "key": key, "encoding": "gzip", "size": len(raw)}
+
+
+def attach_extracted_text(
+    payload: Dict[str, Any],
+    text: str,
+    default_bucket: Optional[str] = None,
+    s3_client=None,
+) -> Dict[str, Any]:
+    """Put the text on the payload inline, or as `extracted_text_ref` when it is above the threshold."""
+    bucket = CLAIM_CHECK_BUCKET
+    if not bucket and CLAIM_CHECK_PREFIX.strip("/"):
+        # the upload bucket is only safe under the prefix the S3 trigger ignores
+        bucket = default_bucket
+    if bucket and should_claim_check(text):
+        payload["extracted_text_ref"] = store_extracted_text(text, bucket, s3_client=s3_client)
+    else:
+        payload["extracted_text"] = text
+    return payload
+
+
+def load_extracted_text(event: Dict[str, Any], s3_client=None) -> str:
+    """Return the extracted text for an event carrying either `extracted_text` or `extracted_text_ref`."""
+    inline = event.get("extracted_text")
+    if inline:
+        return inline
+
+    ref = event.get("extracted_text_ref")
+    if not isinstance(ref, dict) or not ref.get("bucket") or not ref.get("key"):
+        return ""
+
+    cache_key = f"{ref['bucket']}/{ref['key']}"
+    if cache_key in _LOADED:
+        return _LOADED[cache_key]
+
+    client = s3_client or s3
+    body = client.get_object(Bucket=ref["bucket"], Key=ref["key"])["Body"].read()
+    if ref.get("encoding") == "gzip":
+        body = gzip.decompress(body)
+    text = body.decode("utf-8")
+    logger.info("load_extracted_text: loaded %d bytes from s3://%s", len(body), cache_key)
+
+    if len(_LOADED) >= _MAX_LOADED:
+        _LOADED.pop(next(iter(_LOADED)))
+    _LOADED[cache_key] = text
+    return text
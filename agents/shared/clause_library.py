@@ -0,0 +1,206 @@
+"""
+Per-tenant library of already-assessed clauses with near-duplicate matching.
+
+Most clauses in a tenant's portfolio are close variants of the tenant's
+standard templates. Every clause the model assesses (clause-level path, see
+incremental.py) is added to the tenant's library together with its compact
+assessment. Later clauses of the same type whose estimated Jaccard similarity
+to a library entry is at least CLAUSE_LIBRARY_THRESHOLD reuse that assessment
+and are left out of the prompt, so only novel language goes to the model.
+
+Similarity is MinHash over word shingles of the clauses produced by
+`extract_clauses.group_sentences_into_clauses`; candidates come from an LSH
+band index (CLAUSE_LIBRARY_BANDS bands of CLAUSE_LIBRARY_PERMUTATIONS /
+CLAUSE_LIBRARY_BANDS rows) and are confirmed on the full signature.
+
+The default threshold is strict on purpose: one changed word in a 60-word
+clause ("12 months" -> "24 months") drops the similarity to about 0.85, so
+materially edited clauses still go to the model.
+
+Enabled with CLAUSE_LIBRARY_ENABLED=true or per tenant with "clause_library"
+in tenant_config.json. Libraries live in S3 (CLAUSE_LIBRARY_BUCKET) or a local
+directory, one record per analysis kind and tenant.
+"""
+
+import hashlib
+import logging
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from agents.shared.extraction_cache import LocalCacheBackend, S3CacheBackend
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CLAUSE_LIBRARY_ENABLED = os.environ.get("CLAUSE_LIBRARY_ENABLED", "false").lower() == "true"
+CLAUSE_LIBRARY_BUCKET = os.environ.get("CLAUSE_LIBRARY_BUCKET")
+CLAUSE_LIBRARY_PREFIX = os.environ.get("CLAUSE_LIBRARY_PREFIX", "clause-library/")
+CLAUSE_LIBRARY_DIR = os.environ.get("CLAUSE_LIBRARY_DIR", "/tmp/clause_library")
+CLAUSE_LIBRARY_THRESHOLD = float(os.environ.get("CLAUSE_LIBRARY_THRESHOLD", "0.9"))
+CLAUSE_LIBRARY_SHINGLE_WORDS = int(os.environ.get("CLAUSE_LIBRARY_SHINGLE_WORDS", "5"))
+CLAUSE_LIBRARY_PERMUTATIONS = int(os.environ.get("CLAUSE_LIBRARY_PERMUTATIONS", "64"))
+CLAUSE_LIBRARY_BANDS = int(os.environ.get("CLAUSE_LIBRARY_BANDS", "16"))
+CLAUSE_LIBRARY_MAX_ENTRIES = int(os.environ.get("CLAUSE_LIBRARY_MAX_ENTRIES", "5000"))
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# fixed seed: signatures are persisted and must be comparable across containers
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(CLAUSE_LIBRARY_PERMUTATIONS)
+]
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def library_enabled(tenant_cfg: Optional[Dict[str, Any]]) -> bool:
+    """Tenant "clause_library": true/false overrides the CLAUSE_LIBRARY_ENABLED default."""
+    if isinstance(tenant_cfg, dict) and "clause_library" in tenant_cfg:
+        return bool(tenant_cfg["clause_library"])
+    return CLAUSE_LIBRARY_ENABLED
+
+
+def shingles(text: str, size: int = CLAUSE_LIBRARY_SHINGLE_WORDS) -> set:
+    """Word shingles of the normalized clause text (case and punctuation insensitive)."""
+    words = _WORD.findall((text or "").lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature of the clause's shingle set."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big")
+        for s in shingles(text)
+    ]
+    if not hashes:
+        return [_MAX_HASH] * len(_PERMUTATIONS)
+    return [min((a * h + b) % _MERSENNE for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def _bands(signature: List[int]) -> Iterable[str]:
+    rows = max(1, len(signature) // CLAUSE_LIBRARY_BANDS)
+    for band in range(CLAUSE_LIBRARY_BANDS):
+        chunk = signature[band * rows:(band + 1) * rows]
+        if chunk:
+            yield f"{band}:" + ",".join(map(str, chunk))
+
+
+class ClauseLibrary:
+    """One tenant's assessed clauses for one analysis kind, with an in-memory LSH index."""
+
+    def __init__(self, store: "ClauseLibraryStore", kind: str, tenant_id: str, record: Dict[str, Any]):
+        self.store = store
+        self.kind = kind
+        self.tenant_id = tenant_id
+        self.entries: Dict[str, Dict[str, Any]] = record.get("entries") or {}
+        self._added: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[str, List[str]] = {}
+        for entry_id, entry in self.entries.items():
+            self._index_entry(entry_id, entry)
+
+    def _index_entry(self, entry_id: str, entry: Dict[str, Any]) -> None:
+        for key in _bands(entry["signature"]):
+            self._index.setdefault(key, []).append(entry_id)
+
+    def lookup(self, clause_text: str, clause_type: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Best library entry of the same clause type at or above the threshold, with its "similarity"."""
+        signature = minhash(clause_text)
+        candidates = {entry_id for key in _bands(signature) for entry_id in self._index.get(key, ())}
+        best, best_score = None, CLAUSE_LIBRARY_THRESHOLD
+        for entry_id in candidates:
+            entry = self.entries[entry_id]
+            if entry.get("clause_type") != (clause_type or "other"):
+                continue
+            score = similarity(signature, entry["signature"])
+            if score >= best_score:
+                best, best_score = entry_id, score
+        if best is None:
+            return None
+        return {**self.entries[best], "entry_id": best, "similarity": round(best_score, 3)}
+
+    def match(self, clauses: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Stored assessments for the clauses that match a library entry, keyed by clause index."""
+        matched: Dict[int, Dict[str, Any]] = {}
+        for clause in clauses:
+            entry = self.lookup(clause["clause_text"], clause.get("clause_type"))
+            if entry is not None:
+                entry["hits"] = entry.get("hits", 0) + 1
+                self.entries[entry["entry_id"]]["hits"] = entry["hits"]
+                matched[clause["index"]] = entry["assessment"]
+        return matched
+
+    def add(self, clause: Dict[str, Any], assessment: Dict[str, Any]) -> None:
+        """Add a model-assessed clause to the library (exact repeats are stored once)."""
+        entry_id = hashlib.sha256(clause["clause_text"].encode("utf-8")).hexdigest()
+        if entry_id in self.entries:
+            return
+        entry = {
+            "clause_type": clause.get("clause_type") or "other",
+            "signature": minhash(clause["clause_text"]),
+            "assessment": assessment,
+            "hits": 0,
+            "created_at": time.time(),
+        }
+        self.entries[entry_id] = entry
+        self._added[entry_id] = entry
+        self._index_entry(entry_id, entry)
+
+    def save(self) -> None:
+        if self._added:
+            self.store.save(self)
+            self._added = {}
+
+
+class ClauseLibraryStore:
+    """Persists one library record per (analysis kind, tenant)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(kind: str, tenant_id: str) -> str:
+        return hashlib.sha256(f"clause-library|{kind}|{tenant_id}".encode("utf-8")).hexdigest()
+
+    def load(self, kind: str, tenant_id: Optional[str]) -> ClauseLibrary:
+        tenant_id = tenant_id or "default"
+        record = self.backend.get(self._key(kind, tenant_id)) or {}
+        return ClauseLibrary(self, kind, tenant_id, record)
+
+    def save(self, library: ClauseLibrary) -> None:
+        key = self._key(library.kind, library.tenant_id)
+        # re-read so entries added concurrently by other invocations are kept
+        entries = dict((self.backend.get(key) or {}).get("entries") or {})
+        entries.update(library.entries)
+        if len(entries) > CLAUSE_LIBRARY_MAX_ENTRIES:
+            keep = sorted(entries, key=lambda e: (entries[e].get("hits", 0), entries[e].get("created_at", 0)), reverse=True)
+            entries = {e: entries[e] for e in keep[:CLAUSE_LIBRARY_MAX_ENTRIES]}
+        self.backend.put(key, {"kind": library.kind, "tenant_id": library.tenant_id, "entries": entries})
+        logger.info("ClauseLibraryStore: saved %s/%s entries=%d", library.kind, library.tenant_id, len(entries))
+
+
+_store: Optional[ClauseLibraryStore] = None
+
+
+def get_clause_library_store(s3_client=None) -> ClauseLibraryStore:
+    global _store
+    if _store is None:
+        if CLAUSE_LIBRARY_BUCKET:
+            if s3_client is None:
+                import boto3
+                s3_client = boto3.client("s3")
+            backend = S3CacheBackend(s3_client, CLAUSE_LIBRARY_BUCKET, CLAUSE_LIBRARY_PREFIX)
+        else:
+            backend = LocalCacheBackend(CLAUSE_LIBRARY_DIR)
+        _store = ClauseLibraryStore(backend)
+    return _store
@@ -0,0 +1,170 @@
+"""
+Compact model output schemas for risk analysis and compliance.
+
+Output tokens dominate model latency, and the largest part of the full
+schemas is quoted contract text (risk "clause_text") and long reasoning.
+In compact mode the contract is sent as a pre-numbered clause list
+("[C3] Vendor's total liability ..."), the model answers with short keys
+and clause ids instead of quotes, and the answer is expanded locally into
+the full response shape, so `model_response` and the findings look exactly
+as before to everything downstream.
+
+Enabled with COMPACT_OUTPUT_ENABLED=true.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from agents.shared.context_packer import PROMPT_TOKEN_BUDGET, select_from_clauses, split_clauses
+from agents.shared.stream_json import parse_fields
+
+COMPACT_OUTPUT_ENABLED = os.environ.get("COMPACT_OUTPUT_ENABLED", "false").lower() == "true"
+
+RISK_COMPACT_FORMAT = (
+    "Return ONLY compact JSON with these short keys (no other text):\n"
+    "{\"rs\": <overall risk 0-10>, \"oc\": <overall confidence 0-1>, \"rl\": \"L|M|H\",\n"
+    " \"rb\": {\"li\": <liability 0-10>, \"in\": <indemnification 0-10>, \"dp\": <data protection 0-10>, \"te\": <termination 0-10>},\n"
+    " \"tr\": [\"short top risk\", ...],\n"
+    " \"cl\": [{\"id\": <N from [CN]>, \"n\": \"clause name\", \"s\": <risk 1-10>, \"r\": \"one short sentence\", \"c\": <confidence 0-1>}]}\n"
+    "Refer to clauses only by id; never quote clause text.\n"
+)
+
+COMPLIANCE_COMPACT_FORMAT = (
+    "Return ONLY compact JSON with these short keys (no other text):\n"
+    "{\"oc\": {\"st\": \"PARTIAL|PASS|FAIL\", \"sc\": <overall compliance score 0-10>},\n"
+    " \"sm\": \"summary, at most 3 sentences\", \"sv\": \"low|medium|high\",\n"
+    " \"rc\": [\"short remediation step\", ...],\n"
+    " \"ex\": [{\"id\": <N from [CN]>, \"fw\": \"GDPR|SOX|...\", \"st\": \"P|F|N\" (Passed/Failed/NeedsReview),\n"
+    "          \"vr\": \"violated requirement, a few words\", \"r\": \"reasoning, at most 20 words\", \"s\": <0-10>}]}\n"
+    "Refer to clauses only by id; never quote clause text.\n"
+)
+
+# overall fields watched while streaming: compact key -> full-schema name
+RISK_OVERALL_FIELDS = {"rs": "overall_risk_score", "oc": "overall_confidence"}
+COMPLIANCE_OVERALL_FIELDS = {"oc": "overall_compliance"}
+
+_RISK_LEVELS = {"L": "Low", "M": "Medium", "H": "High"}
+_COMPLIANCE_STATUSES = {"P": "Passed", "F": "Failed", "N": "NeedsReview"}
+_BREAKDOWN_KEYS = {"li": "liability", "in": "indemnification", "dp": "data_protection", "te": "termination"}
+
+
+def render_numbered(clauses: List[Dict[str, Any]], token_budget: int = PROMPT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """Render the clauses that fit the budget as "[C<index>] text" lines.
+
+    Returns {"clauses": [...], "block": str, "truncated": bool}; indices are document positions, so gaps mark
+    omitted clauses.
+    """
+    if sum(c["tokens"] for c in clauses) <= token_budget:
+        selected = list(clauses)
+    else:
+        selected = select_from_clauses(clauses, token_budget)
+    block = "\n".join(f"[C{c['index']}] {c['clause_text']}" for c in selected)
+    return {"clauses": selected, "block": block, "truncated": len(selected) < len(clauses)}
+
+
+def render_batches(clauses: List[Dict[str, Any]], token_budget: int = PROMPT_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """Render every clause, in document order, as consecutive budget-sized blocks (see render_numbered).
+
+    Unlike render_numbered nothing is dropped; only a single clause over the budget is cut to its head.
+    """
+    batches: List[Dict[str, Any]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for clause in clauses:
+        if current and used + clause["tokens"] > token_budget:
+            batches.append(render_numbered(current, token_budget))
+            current, used = [], 0
+        current.append(clause)
+        used += clause["tokens"]
+    if current:
+        batches.append(render_numbered(current, token_budget))
+    return batches
+
+
+def numbered_clauses(text: str, token_budget: int = PROMPT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """Split text into clauses and render the ones that fit the budget (see render_numbered)."""
+    return render_numbered(split_clauses(text or ""), token_budget)
+
+
+def _clause_id(value: Any) -> Optional[int]:
+    match = re.search(r"\d+", str(value))
+    return int(match.group(0)) if match else None
+
+
+def _by_id(clauses: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    return {c["index"]: c for c in clauses}
+
+
+def expand_risk(compact: Dict[str, Any], clauses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Expand a compact risk answer into the full risk schema."""
+    lookup = _by_id(clauses)
+    breakdown = compact.get("rb") if isinstance(compact.get("rb"), dict) else {}
+    expanded_clauses = []
+    for item in compact.get("cl") or []:
+        if not isinstance(item, dict):
+            continue
+        clause = lookup.get(_clause_id(item.get("id")), {})
+        expanded_clauses.append({
+            "clause_name": item.get("n") or clause.get("clause_type", ""),
+            "risk_score": item.get("s"),
+            "reasoning": item.get("r", ""),
+            "clause_text": clause.get("clause_text", ""),
+            "confidence_score": item.get("c"),
+        })
+    return {
+        "risk_breakdown": {full: breakdown.get(short) for short, full in _BREAKDOWN_KEYS.items()},
+        "overall_risk_score": compact.get("rs"),
+        "risk_level": _RISK_LEVELS.get(str(compact.get("rl", "")).upper()[:1], compact.get("rl")),
+        "overall_confidence": compact.get("oc"),
+        "top_risks": compact.get("tr") or [],
+        "clauses": expanded_clauses,
+    }
+
+
+def expand_overall_compliance(overall: Any) -> Dict[str, Any]:
+    """Expand a compact "oc" object into the full overall_compliance object."""
+    overall = overall if isinstance(overall, dict) else {}
+    return {"compliance_status": overall.get("st"), "overall_compliance_score": overall.get("sc")}
+
+
+def expand_compliance(compact: Dict[str, Any], clauses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Expand a compact compliance answer into the full compliance schema."""
+    lookup = _by_id(clauses)
+    explainability = []
+    for item in compact.get("ex") or []:
+        if not isinstance(item, dict):
+            continue
+        clause = lookup.get(_clause_id(item.get("id")), {})
+        explainability.append({
+            "clause": (clause.get("clause_type") or "other").replace("_", " ").title(),
+            "framework": item.get("fw"),
+            "compliance_status": _COMPLIANCE_STATUSES.get(str(item.get("st", "")).upper()[:1], item.get("st")),
+            "violated_requirement": item.get("vr", ""),
+            "reasoning": item.get("r", ""),
+            "score": item.get("s"),
+        })
+    return {
+        "overall_compliance": expand_overall_compliance(compact.get("oc")),
+        "summary": compact.get("sm", ""),
+        "severity": compact.get("sv"),
+        "recommendations": compact.get("rc") or [],
+        "details": {"explainability": explainability},
+    }
+
+
+def expand_risk_text(model_text: str, clauses: List[Dict[str, Any]]) -> str:
+    """Expand compact model output to full-schema JSON text; non-compact output is returned unchanged."""
+    compact = parse_fields(model_text)
+    if "rs" not in compact and "cl" not in compact:
+        return model_text
+    return json.dumps(expand_risk(compact, clauses))
+
+
+def expand_compliance_text(model_text: str, clauses: List[Dict[str, Any]]) -> str:
+    """Expand compact model output to full-schema JSON text; non-compact output is returned unchanged."""
+    compact = parse_fields(model_text)
+    if "oc" not in compact and "ex" not in compact:
+        return model_text
+    return json.dumps(expand_compliance(compact, clauses))
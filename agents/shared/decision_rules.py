@@ -0,0 +1,413 @@
+"""
+Tenant decision rules compiled into Python closures.
+
+A tenant can replace the built-in decision chain with an ordered rule list in
+tenant_config.json; the first rule whose condition holds decides:
+
+    "decision_rules": [
+      {"when": "overall_risk_score >= risk_score_threshold", "decision": "Legal Review",
+       "reason": "overall_risk_score={overall_risk_score} >= {risk_score_threshold}"},
+      {"when": "compliance_status == 'Non-Compliant' or overall_compliance_score < 4", "decision": "Escalate"},
+      {"when": "overall_confidence is missing or overall_confidence < confidence_threshold", "decision": "Human Review"}
+    ],
+    "default_decision": "Auto-Approve"
+
+Condition grammar:
+
+    expr    := and_expr ("or" and_expr)*
+    and_expr:= not_expr ("and" not_expr)*
+    not_expr:= "not" not_expr | "(" expr ")" | test
+    test    := operand [("==" | "!=" | "<" | "<=" | ">" | ">=") operand
+                        | ["not"] "in" "[" operand ("," operand)* "]"
+                        | "is" ["not"] "missing"]
+    operand := number | 'string' | "string" | true | false | name
+
+Names are the result fields in FIELDS or scalar keys of the tenant config
+(e.g. risk_score_threshold); config values are folded into constants at
+compile time. An ordering comparison with a missing value is false, like the
+`is not None` guards of the built-in chain. "reason" is a str.format template
+over the same names; without one the condition text is used.
+
+Compiled rule sets are cached by their canonical JSON (rules + constants), so
+each tenant's rules compile once per container and again only when the
+tenant's config changes.
+
+`CompiledRules.decide_arrays` evaluates the same rules over whole columns
+(NumPy arrays, NaN / "" = missing) for what-if simulations over the results
+store (what_if.py); the array predicates compile on first use.
+"""
+
+import json
+import logging
+import operator
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except Exception:
+    np = None
+    HAS_NUMPY = False
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+FIELDS = ("overall_risk_score", "overall_confidence", "overall_compliance_score", "compliance_status")
+
+DEFAULT_THRESHOLDS = {"risk_score_threshold": 7.0, "confidence_threshold": 0.7}
+DEFAULT_DECISION = "Auto-Approve"
+DEFAULT_REASON = "Default approval"
+
+# the built-in decision chain, expressed as rules
+DEFAULT_RULES = [
+    {
+        "when": "overall_risk_score >= risk_score_threshold",
+        "decision": "Legal Review",
+        "reason": "overall_risk_score={overall_risk_score} >= {risk_score_threshold}",
+    },
+    {
+        "when": "compliance_status == 'Non-Compliant'",
+        "decision": "Escalate",
+        "reason": "compliance_status=Non-Compliant",
+    },
+    {
+        "when": "overall_confidence < confidence_threshold",
+        "decision": "Human Review",
+        "reason": "overall_confidence={overall_confidence} < {confidence_threshold}",
+    },
+]
+
+
+class DecisionRuleError(ValueError):
+    """A tenant rule does not parse or refers to an unknown name."""
+
+
+Predicate = Callable[[Dict[str, Any]], bool]
+Operand = Callable[[Dict[str, Any]], Any]
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<number>-?\d+(?:\.\d+)?)|'(?P<sq>[^']*)'|\"(?P<dq>[^\"]*)\"|(?P<op>==|!=|<=|>=|<|>|\(|\)|\[|\]|,)"
+    r"|(?P<name>[A-Za-z_][A-Za-z0-9_]*))"
+)
+_KEYWORDS = {"and", "or", "not", "in", "is", "missing", "true", "false"}
+_COMPARE = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise DecisionRuleError(f"unexpected input at {pos}: {text[pos:pos + 20]!r}")
+        pos = match.end()
+        if match.group("number") is not None:
+            tokens.append(("const", float(match.group("number"))))
+        elif match.group("sq") is not None or match.group("dq") is not None:
+            tokens.append(("const", match.group("sq") if match.group("sq") is not None else match.group("dq")))
+        elif match.group("op") is not None:
+            tokens.append(("op", match.group("op")))
+        else:
+            name = match.group("name")
+            tokens.append(("kw", name.lower()) if name.lower() in _KEYWORDS else ("name", name))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser that emits closures instead of an AST."""
+
+    def __init__(self, text: str, constants: Dict[str, Any]):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.constants = constants
+
+    def _peek(self) -> Tuple[Optional[str], Any]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _accept(self, kind: str, value: Any = None) -> bool:
+        tok_kind, tok_value = self._peek()
+        if tok_kind == kind and (value is None or tok_value == value):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, kind: str, value: Any = None) -> None:
+        if not self._accept(kind, value):
+            raise DecisionRuleError(f"expected {value or kind} in {self.text!r}")
+
+    def parse(self) -> Predicate:
+        predicate = self._or()
+        if self.pos != len(self.tokens):
+            raise DecisionRuleError(f"unexpected {self._peek()[1]!r} in {self.text!r}")
+        return predicate
+
+    def _or(self) -> Predicate:
+        parts = [self._and()]
+        while self._accept("kw", "or"):
+            parts.append(self._and())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda ctx: any(p(ctx) for p in parts)
+
+    def _and(self) -> Predicate:
+        parts = [self._not()]
+        while self._accept("kw", "and"):
+            parts.append(self._not())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda ctx: all(p(ctx) for p in parts)
+
+    def _not(self) -> Predicate:
+        if self._accept("kw", "not"):
+            inner = self._not()
+            return lambda ctx: not inner(ctx)
+        if self._accept("op", "("):
+            inner = self._or()
+            self._expect("op", ")")
+            return inner
+        return self._test()
+
+    def _operand(self) -> Operand:
+        kind, value = self._peek()
+        self.pos += 1
+        if kind == "const":
+            return lambda ctx: value
+        if kind == "kw" and value in ("true", "false"):
+            flag = value == "true"
+            return lambda ctx: flag
+        if kind == "name":
+            if value in FIELDS:
+                return lambda ctx: ctx.get(value)
+            if value in self.constants:
+                constant = self.constants[value]
+                return lambda ctx: constant
+            raise DecisionRuleError(f"unknown name {value!r} in {self.text!r}")
+        raise DecisionRuleError(f"expected a value in {self.text!r}")
+
+    def _test(self) -> Predicate:
+        left = self._operand()
+        kind, value = self._peek()
+        if kind == "op" and value in _COMPARE:
+            self.pos += 1
+            right = self._operand()
+            return _comparison(value, left, right)
+        if kind == "kw" and value in ("in", "not"):
+            negate = self._accept("kw", "not")
+            self._expect("kw", "in")
+            self._expect("op", "[")
+            items = [self._operand()({})]
+            while self._accept("op", ","):
+                items.append(self._operand()({}))
+            self._expect("op", "]")
+            members = frozenset(items)
+            return lambda ctx: (left(ctx) in members) != negate
+        if self._accept("kw", "is"):
+            negate = self._accept("kw", "not")
+            self._expect("kw", "missing")
+            return lambda ctx: (left(ctx) is None) != negate
+        return lambda ctx: bool(left(ctx))
+
+
+def _comparison(op: str, left: Operand, right: Operand) -> Predicate:
+    compare = _COMPARE[op]
+    ordering = op not in ("==", "!=")
+
+    def evaluate(ctx: Dict[str, Any]) -> bool:
+        a, b = left(ctx), right(ctx)
+        if ordering and (a is None or b is None):
+            return False
+        try:
+            return compare(a, b)
+        except TypeError:
+            return False
+
+    return evaluate
+
+
+def _missing(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return np.isnan(value) if value.dtype.kind == "f" else value == ""
+    return np.bool_(value is None)
+
+
+class _ArrayParser(_Parser):
+    """Same grammar, but the closures take {column: array} and return boolean arrays (or scalars that broadcast)."""
+
+    def _or(self) -> Predicate:
+        parts = [self._and()]
+        while self._accept("kw", "or"):
+            parts.append(self._and())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda cols: np.logical_or.reduce([p(cols) for p in parts])
+
+    def _and(self) -> Predicate:
+        parts = [self._not()]
+        while self._accept("kw", "and"):
+            parts.append(self._not())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda cols: np.logical_and.reduce([p(cols) for p in parts])
+
+    def _not(self) -> Predicate:
+        if self._accept("kw", "not"):
+            inner = self._not()
+            return lambda cols: np.logical_not(inner(cols))
+        return super()._not()
+
+    def _test(self) -> Predicate:
+        left = self._operand()
+        kind, value = self._peek()
+        if kind == "op" and value in _COMPARE:
+            self.pos += 1
+            right = self._operand()
+            return _array_comparison(value, left, right)
+        if kind == "kw" and value in ("in", "not"):
+            negate = self._accept("kw", "not")
+            self._expect("kw", "in")
+            self._expect("op", "[")
+            items = [self._operand()({})]
+            while self._accept("op", ","):
+                items.append(self._operand()({}))
+            self._expect("op", "]")
+
+            def member(cols: Dict[str, Any]) -> Any:
+                values = left(cols)
+                hits = np.isin(values, items) if isinstance(values, np.ndarray) else values in items
+                return np.logical_xor(hits, negate)
+
+            return member
+        if self._accept("kw", "is"):
+            negate = self._accept("kw", "not")
+            self._expect("kw", "missing")
+            return lambda cols: np.logical_xor(_missing(left(cols)), negate)
+
+        def truthy(cols: Dict[str, Any]) -> Any:
+            values = left(cols)
+            if isinstance(values, np.ndarray):
+                return (values != 0) & ~np.isnan(values) if values.dtype.kind == "f" else values != ""
+            return bool(values)
+
+        return truthy
+
+
+def _array_comparison(op: str, left: Operand, right: Operand) -> Predicate:
+    compare = _COMPARE[op]
+    ordering = op not in ("==", "!=")
+
+    def evaluate(cols: Dict[str, Any]) -> Any:
+        a, b = left(cols), right(cols)
+        missing_a, missing_b = _missing(a), _missing(b)
+        try:
+            with np.errstate(invalid="ignore"):
+                result = compare(a, b)
+        except TypeError:
+            result = op == "!="
+        if ordering:
+            return result & ~missing_a & ~missing_b
+        # like None == None in the scalar rules, two missing values are equal
+        both = missing_a & missing_b
+        return (result & ~(missing_a | missing_b)) | both if op == "==" else (result | missing_a | missing_b) & ~both
+
+    return evaluate
+
+
+class _Formatter(dict):
+    def __missing__(self, key: str) -> str:
+        return "None"
+
+
+class CompiledRules:
+    """An ordered, compiled rule set; `decide(inputs)` returns (decision, reason, matched rule index or None)."""
+
+    def __init__(self, rules: List[Dict[str, Any]], default_decision: str, constants: Dict[str, Any]):
+        self.constants = constants
+        self.default_decision = default_decision
+        self.rules: List[Tuple[Predicate, str, str]] = []
+        self._conditions: List[str] = []
+        self._array_predicates: Optional[List[Predicate]] = None
+        for rule in rules:
+            when = str(rule.get("when", "")).strip()
+            if not when or not rule.get("decision"):
+                raise DecisionRuleError(f"rule needs \"when\" and \"decision\": {rule!r}")
+            self.rules.append((_Parser(when, constants).parse(), str(rule["decision"]), str(rule.get("reason") or when)))
+            self._conditions.append(when)
+
+    def decide(self, inputs: Dict[str, Any]) -> Tuple[str, str, Optional[int]]:
+        for index, (predicate, decision, reason) in enumerate(self.rules):
+            if predicate(inputs):
+                return decision, reason.format_map(_Formatter({**self.constants, **inputs})), index
+        return self.default_decision, DEFAULT_REASON, None
+
+    def decide_many(self, inputs: Iterable[Dict[str, Any]]) -> List[Tuple[str, str, Optional[int]]]:
+        decide = self.decide
+        return [decide(item) for item in inputs]
+
+    def decide_arrays(self, columns: Dict[str, Any], n: int) -> Tuple[Any, Any]:
+        """Vectorized `decide` over n rows of columns (FIELDS as arrays; NaN / "" = missing).
+
+        Returns (decision labels, matched rule index with -1 for the default) as arrays.
+        """
+        if not HAS_NUMPY:
+            raise RuntimeError("decide_arrays requires numpy")
+        if self._array_predicates is None:
+            self._array_predicates = [_ArrayParser(when, self.constants).parse() for when in self._conditions]
+        matched = np.full(n, -1, dtype=np.int32)
+        undecided = np.ones(n, dtype=bool)
+        for index, predicate in enumerate(self._array_predicates):
+            hits = np.broadcast_to(np.asarray(predicate(columns), dtype=bool), (n,)) & undecided
+            matched[hits] = index
+            undecided &= ~hits
+        labels = np.array([decision for _, decision, _ in self.rules] + [self.default_decision])
+        return labels[matched], matched
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return None if value is None else float(value)
+    except Exception:
+        return None
+
+
+def rule_constants(tenant_cfg: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Scalar tenant config values usable in rules, with the numeric thresholds defaulted like the built-in chain."""
+    cfg = tenant_cfg if isinstance(tenant_cfg, dict) else {}
+    constants = {k: v for k, v in cfg.items() if isinstance(v, (int, float, str, bool)) and k not in FIELDS}
+    for key, default in DEFAULT_THRESHOLDS.items():
+        value = _to_float(cfg.get(key))
+        constants[key] = value if value is not None else default
+    return constants
+
+
+@lru_cache(maxsize=1024)
+def _compile_cached(canonical: str) -> CompiledRules:
+    spec = json.loads(canonical)
+    return CompiledRules(spec["rules"], spec["default_decision"], spec["constants"])
+
+
+def get_compiled_rules(tenant_cfg: Optional[Dict[str, Any]]) -> CompiledRules:
+    """Compiled rules for a tenant config; invalid tenant rules are logged and the built-in chain is used."""
+    cfg = tenant_cfg if isinstance(tenant_cfg, dict) else {}
+    constants = rule_constants(cfg)
+    rules = cfg.get("decision_rules") if isinstance(cfg.get("decision_rules"), list) else DEFAULT_RULES
+    default_decision = str(cfg.get("default_decision") or DEFAULT_DECISION)
+    canonical = json.dumps(
+        {"rules": rules, "default_decision": default_decision, "constants": constants}, sort_keys=True, default=str
+    )
+    try:
+        return _compile_cached(canonical)
+    except DecisionRuleError as e:
+        logger.warning("get_compiled_rules: invalid tenant decision_rules, using built-in rules: %s", e)
+        return _compile_cached(json.dumps(
+            {"rules": DEFAULT_RULES, "default_decision": DEFAULT_DECISION, "constants": constants}, sort_keys=True, default=str
+        ))
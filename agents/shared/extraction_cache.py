@@ -0,0 +1,245 @@
+"""
+Content-addressed cache for extracted document text.
+
+Entries are keyed on the content hash of the source object (S3 SHA-256
+checksum when the object has one, otherwise its ETag and size), so re-uploads
+and duplicate S3 events of byte-identical documents skip Textract. An entry
+holds the extracted text plus its page/line structure.
+
+Two backends share the same small interface (get/put/delete/list):
+- LocalCacheBackend: one JSON file per entry in a directory (Lambda /tmp, local runs)
+- S3CacheBackend: one JSON object per entry under a prefix
+
+Entries older than the TTL are treated as misses and removed; when the total
+size goes over the configured limit the least recently used entries are evicted.
+A hit refreshes the entry's last access (file mtime locally; for S3, a copy of
+the object onto itself, at most once per EXTRACTION_CACHE_TOUCH_SECONDS).
+Eviction lists every entry, so it runs at most once per
+EXTRACTION_CACHE_EVICT_INTERVAL_SECONDS per container rather than on every put.
+"""
+
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+EXTRACTION_CACHE_ENABLED = os.environ.get("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_BUCKET = os.environ.get("EXTRACTION_CACHE_BUCKET")
+EXTRACTION_CACHE_PREFIX = os.environ.get("EXTRACTION_CACHE_PREFIX", "cache/extraction/")
+EXTRACTION_CACHE_DIR = os.environ.get("EXTRACTION_CACHE_DIR", "/tmp/extraction_cache")
+EXTRACTION_CACHE_TTL_SECONDS = int(os.environ.get("EXTRACTION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+EXTRACTION_CACHE_EVICT_INTERVAL_SECONDS = float(os.environ.get("EXTRACTION_CACHE_EVICT_INTERVAL_SECONDS", "3600"))
+EXTRACTION_CACHE_TOUCH_SECONDS = float(os.environ.get("EXTRACTION_CACHE_TOUCH_SECONDS", str(24 * 3600)))
+
+
+def content_hash_for_s3_object(s3_client, bucket: str, key: str) -> str:
+    """Return a content key for an S3 object without downloading it.
+
+    Uses the SHA-256 checksum when the object was uploaded with one, otherwise
+    falls back to ETag + size (identical for byte-identical single-part uploads).
+    """
+    head = s3_client.head_object(Bucket=bucket, Key=key, ChecksumMode="ENABLED")
+    checksum = head.get("ChecksumSHA256")
+    # composite (multipart) checksums end in "-<parts>" and are not a plain digest
+    if checksum and "-" not in checksum:
+        return "sha256-" + base64.b64decode(checksum).hex()
+    etag = (head.get("ETag") or "").strip('"')
+    return f"etag-{etag}-{head.get('ContentLength', 0)}"
+
+
+class LocalCacheBackend:
+    """Stores entries as `{key}.json` files; access time is tracked through the file mtime."""
+
+    def __init__(self, directory: str = EXTRACTION_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> int:
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        data = json.dumps(entry).encode("utf-8")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        now = time.time()
+        os.utime(path, (now, now))
+        return len(data)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self) -> List[Tuple[str, int, float]]:
+        """Return (key, size_bytes, last_access) for every entry."""
+        out = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            st = os.stat(os.path.join(self.directory, name))
+            out.append((name[: -len(".json")], st.st_size, st.st_mtime))
+        return out
+
+
+class S3CacheBackend:
+    """Stores entries as JSON objects under `{prefix}{key}.json`. Last access is the object's LastModified.
+
+    With touch_seconds set, a get of an object last modified longer ago than that copies it onto itself,
+    which refreshes LastModified, so eviction by last access is LRU rather than FIFO.
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str = EXTRACTION_CACHE_PREFIX, touch_seconds: Optional[float] = None):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/") + "/"
+        self.touch_seconds = touch_seconds
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            resp = self.s3.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        entry = json.loads(resp["Body"].read())
+        modified = resp.get("LastModified")
+        if self.touch_seconds is not None and modified is not None and time.time() - modified.timestamp() > self.touch_seconds:
+            self._touch(key)
+        return entry
+
+    def _touch(self, key: str) -> None:
+        try:
+            self.s3.copy_object(
+                Bucket=self.bucket,
+                Key=self._key(key),
+                CopySource={"Bucket": self.bucket, "Key": self._key(key)},
+                MetadataDirective="REPLACE",
+                ContentType="application/json",
+            )
+        except Exception as e:
+            logger.warning("S3CacheBackend: could not refresh last access of %s: %s", key, e)
+
+    def put(self, key: str, entry: Dict[str, Any]) -> int:
+        data = json.dumps(entry).encode("utf-8")
+        self.s3.put_object(Bucket=self.bucket, Key=self._key(key), Body=data, ContentType="application/json")
+        return len(data)
+
+    def delete(self, key: str) -> None:
+        self.s3.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list(self) -> List[Tuple[str, int, float]]:
+        out = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                name = obj["Key"][len(self.prefix):]
+                if name.endswith(".json"):
+                    out.append((name[: -len(".json")], obj.get("Size", 0), obj["LastModified"].timestamp()))
+        return out
+
+
+class ExtractionCache:
+    """TTL + size bounded cache of extraction results on top of a backend."""
+
+    def __init__(
+        self,
+        backend,
+        ttl_seconds: int = EXTRACTION_CACHE_TTL_SECONDS,
+        max_bytes: int = EXTRACTION_CACHE_MAX_BYTES,
+        evict_interval_seconds: float = EXTRACTION_CACHE_EVICT_INTERVAL_SECONDS,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evict_interval_seconds = evict_interval_seconds
+        self._next_evict = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = self.backend.get(content_hash)
+        except Exception as e:
+            logger.warning("ExtractionCache: get failed for %s: %s", content_hash, e)
+            return None
+        if entry is None:
+            return None
+        if self.ttl_seconds and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            logger.info("ExtractionCache: entry %s expired", content_hash)
+            try:
+                self.backend.delete(content_hash)
+            except Exception as e:
+                # an expired entry is a miss either way; the next put or eviction replaces it
+                logger.warning("ExtractionCache: delete failed for %s: %s", content_hash, e)
+            return None
+        return entry
+
+    def put(self, content_hash: str, extracted_text: str, pages: Optional[List[Dict[str, Any]]] = None, **meta: Any) -> None:
+        entry = {
+            "content_hash": content_hash,
+            "extracted_text": extracted_text,
+            "pages": pages or [],
+            "created_at": time.time(),
+        }
+        entry.update(meta)
+        try:
+            size = self.backend.put(content_hash, entry)
+            logger.info("ExtractionCache: stored %s (%d bytes)", content_hash, size)
+            if time.monotonic() >= self._next_evict:
+                # listing the whole cache is expensive on S3; evict periodically, not on every put
+                self._next_evict = time.monotonic() + self.evict_interval_seconds
+                self.evict()
+        except Exception as e:
+            # caching is best-effort; never fail an ingestion because of it
+            logger.warning("ExtractionCache: put failed for %s: %s", content_hash, e)
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes. Returns the number removed."""
+        if not self.max_bytes:
+            return 0
+        with self._lock:
+            entries = self.backend.list()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for key, size, _ in sorted(entries, key=lambda e: e[2]):
+                if total <= self.max_bytes:
+                    break
+                self.backend.delete(key)
+                total -= size
+                removed += 1
+        if removed:
+            logger.info("ExtractionCache: evicted %d entries", removed)
+        return removed
+
+
+def build_extraction_cache(s3_client=None) -> Optional[ExtractionCache]:
+    """Build the cache from environment settings; None when caching is disabled."""
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    if EXTRACTION_CACHE_BUCKET and s3_client is not None:
+        return ExtractionCache(
+            S3CacheBackend(s3_client, EXTRACTION_CACHE_BUCKET, touch_seconds=EXTRACTION_CACHE_TOUCH_SECONDS)
+        )
+    return ExtractionCache(LocalCacheBackend())
@@ -0,0 +1,86 @@
+"""
+Image pre-processing ahead of synchronous Textract calls.
+
+Phone photos and scans are often far larger than OCR needs. Before
+`detect_document_text` each image is:
+- split into pages (multi-page TIFF frames)
+- downscaled to IMAGE_TARGET_DPI (when the file has DPI metadata) and in any case to at most
+  IMAGE_MAX_LONG_EDGE pixels on the long edge (a 72-DPI phone photo can still be huge)
+- converted to grayscale
+- recompressed as JPEG
+
+The caller decides what to do with pages still above the synchronous size
+limit (the ingestion handler routes them to async Textract).
+Pillow is optional; without it `HAS_PIL` is False and callers send the raw bytes.
+"""
+
+import io
+import logging
+import os
+from typing import List
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except Exception:
+    Image = None
+    HAS_PIL = False
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# DetectDocumentText accepts at most 5 MB of raw bytes
+TEXTRACT_SYNC_MAX_BYTES = 5 * 1024 * 1024
+IMAGE_TARGET_DPI = int(os.environ.get("IMAGE_TARGET_DPI", "200"))
+IMAGE_MAX_LONG_EDGE = int(os.environ.get("IMAGE_MAX_LONG_EDGE", "3000"))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "80"))
+
+
+def _scale_for(img) -> float:
+    scale = 1.0
+    dpi = img.info.get("dpi")
+    if dpi and dpi[0]:
+        scale = min(scale, IMAGE_TARGET_DPI / float(dpi[0]))
+    long_edge = max(img.size)
+    if long_edge:
+        scale = min(scale, IMAGE_MAX_LONG_EDGE / float(long_edge))
+    return scale
+
+
+def _encode_jpeg(img, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True, dpi=(IMAGE_TARGET_DPI, IMAGE_TARGET_DPI))
+    return buf.getvalue()
+
+
+def _prepare_frame(img) -> bytes:
+    scale = _scale_for(img)
+    frame = img.convert("L")
+    if scale < 1.0:
+        size = (max(1, int(frame.width * scale)), max(1, int(frame.height * scale)))
+        frame = frame.resize(size, Image.LANCZOS)
+
+    data = _encode_jpeg(frame, IMAGE_JPEG_QUALITY)
+    # one cheaper pass before giving up and letting the caller go async
+    if len(data) > TEXTRACT_SYNC_MAX_BYTES:
+        data = _encode_jpeg(frame, max(40, IMAGE_JPEG_QUALITY - 25))
+    return data
+
+
+def preprocess_image_pages(image_bytes: bytes) -> List[bytes]:
+    """Return one grayscale, downscaled JPEG per page of the input image (frames of a multi-page TIFF)."""
+    if not HAS_PIL:
+        raise RuntimeError("Pillow not installed; cannot pre-process images")
+
+    img = Image.open(io.BytesIO(image_bytes))
+    n_frames = getattr(img, "n_frames", 1)
+    pages = []
+    for i in range(n_frames):
+        img.seek(i)
+        pages.append(_prepare_frame(img))
+
+    logger.info(
+        "preprocess_image_pages: %d page(s), %d -> %d bytes",
+        n_frames, len(image_bytes), sum(len(p) for p in pages),
+    )
+    return pages
@@ -0,0 +1,264 @@
+"""
+Incremental re-analysis of amended contract versions.
+
+Uploads of the same tenant + logical contract (e.g. `acme/contracts/msa_v2.pdf`
+and `acme/contracts/msa_v3_redline.pdf`, or an explicit "logical_contract_id"
+in the event) form a lineage. For each analysis kind (risk, compliance) the
+lineage record keeps the versions seen and a clause-level result store keyed
+on the clause SHA-256 (`extract_clauses.clause_hash`, the same hash
+write_jsonl emits as doc_hash):
+
+    {"versions": [{"version", "contract_id", "s3_key", "created_at", "clause_hashes"}],
+     "assessments": {<clause hash>: <compact assessment item, {} = nothing notable>}}
+
+The diff step splits a new version's clauses into reused (hash already
+assessed) and pending (added or changed) clauses; only pending clauses are
+sent to the model, and the merge step combines both into updated overall
+scores in the compact schema (see compact_schema.py), which is then expanded
+to the usual response shape.
+
+Merged overall scores:
+- risk: riskiest clause score, mean clause confidence, breakdown = max per clause type
+- compliance: FAIL if any clause failed, PARTIAL if any needs review, else PASS;
+  score = mean clause score
+
+Records live in S3 (INCREMENTAL_STORE_BUCKET) or a local directory. Risk and
+compliance keep separate records, so the parallel branches never overwrite
+each other.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from agents.shared.context_packer import split_clauses
+from agents.shared.extraction_cache import LocalCacheBackend, S3CacheBackend
+from knowledge.ingest.extract_clauses import clause_hash
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+INCREMENTAL_ANALYSIS_ENABLED = os.environ.get("INCREMENTAL_ANALYSIS_ENABLED", "false").lower() == "true"
+INCREMENTAL_STORE_BUCKET = os.environ.get("INCREMENTAL_STORE_BUCKET")
+INCREMENTAL_STORE_PREFIX = os.environ.get("INCREMENTAL_STORE_PREFIX", "incremental/")
+INCREMENTAL_STORE_DIR = os.environ.get("INCREMENTAL_STORE_DIR", "/tmp/incremental")
+# assessments for clauses absent from the last N versions are pruned
+INCREMENTAL_MAX_VERSIONS = int(os.environ.get("INCREMENTAL_MAX_VERSIONS", "20"))
+
+# trailing version markers: "_v2", " rev 3", "-draft2", "_final", "_redline", " (1)"
+_VERSION_SUFFIX = re.compile(
+    r"(?:[ _.\-]+(?:(?:v|ver|version|rev|revision|r|draft|round)[ _.\-]*\d+|final|redline|clean|amended|\(\d+\)))+$",
+    re.IGNORECASE,
+)
+
+
+def logical_contract_id(s3_key: Optional[str], explicit: Optional[str] = None) -> Optional[str]:
+    """Logical contract for an upload: explicit id, else the key without tenant prefix, extension and version suffix."""
+    if explicit:
+        return str(explicit)
+    if not s3_key:
+        return None
+    parts = s3_key.lstrip("/").split("/")
+    path = parts[1:] if len(parts) > 1 else parts
+    stem, _ = os.path.splitext(path[-1])
+    stem = _VERSION_SUFFIX.sub("", stem).strip(" _.-").lower() or stem.lower()
+    return "/".join(path[:-1] + [stem])
+
+
+def _risk_level(score: float) -> str:
+    if score >= 7:
+        return "H"
+    if score >= 4:
+        return "M"
+    return "L"
+
+
+class IncrementalRun:
+    """Diff of one contract version against its lineage, plus the merge of reused and new assessments."""
+
+    def __init__(self, store: "LineageStore", kind: str, tenant_id: str, logical_id: Optional[str], text: str):
+        self.store = store
+        self.kind = kind
+        self.tenant_id = tenant_id
+        self.logical_id = logical_id
+        # without a logical contract id there is no lineage: every clause starts pending
+        self.record = store.load(kind, tenant_id, logical_id) if logical_id else {"versions": [], "assessments": {}}
+        self.clauses = split_clauses(text)
+        for clause in self.clauses:
+            clause["clause_hash"] = clause_hash(clause["clause_text"])
+
+        known = self.record["assessments"]
+        versions = self.record["versions"]
+        previous = set(versions[-1]["clause_hashes"]) if versions else set()
+        self.previous_version = versions[-1]["version"] if versions else None
+        self.assessments: Dict[int, Dict[str, Any]] = {
+            c["index"]: known[c["clause_hash"]] for c in self.clauses if c["clause_hash"] in known
+        }
+        self.reused = len(self.assessments)
+        self.library_hits = 0
+        self.pending = [c for c in self.clauses if c["index"] not in self.assessments]
+        self.unchanged = sum(1 for c in self.clauses if c["clause_hash"] in previous)
+        self.sent = 0
+        logger.info(
+            "IncrementalRun: %s %s/%s previous_version=%s clauses=%d reused=%d pending=%d",
+            kind, tenant_id, logical_id, self.previous_version, len(self.clauses), self.reused, len(self.pending),
+        )
+
+    def reuse(self, matched: Dict[int, Dict[str, Any]]) -> None:
+        """Take assessments for pending clauses from another source (e.g. the tenant clause library)."""
+        for index, assessment in matched.items():
+            if index not in self.assessments:
+                self.assessments[index] = assessment
+                self.library_hits += 1
+        self.pending = [c for c in self.pending if c["index"] not in self.assessments]
+
+    def record_answer(self, sent: List[Dict[str, Any]], items: List[Dict[str, Any]]) -> None:
+        """Store the model's clause items (matched by clause id) for the clauses that were sent."""
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for item in items or []:
+            if isinstance(item, dict):
+                match = re.search(r"\d+", str(item.get("id")))
+                if match:
+                    by_id[int(match.group(0))] = {k: v for k, v in item.items() if k != "id"}
+        for clause in sent:
+            # clauses the model did not mention were reviewed and found unremarkable
+            self.assessments[clause["index"]] = by_id.get(clause["index"], {})
+        self.sent += len(sent)
+
+    def commit(self, contract_id: Optional[str], s3_key: Optional[str]) -> Dict[str, Any]:
+        """Append this version to the lineage, persist the assessments and return diff stats."""
+        stats = {
+            "logical_contract_id": self.logical_id,
+            "clauses_total": len(self.clauses),
+            "clauses_unchanged": self.unchanged,
+            "clauses_reused": self.reused,
+            "clauses_library_hits": self.library_hits,
+            "library_hit_rate": round(self.library_hits / len(self.clauses), 3) if self.clauses else 0.0,
+            "clauses_sent": self.sent,
+        }
+        if not self.logical_id:
+            return stats
+        versions = self.record["versions"]
+        hashes = [c["clause_hash"] for c in self.clauses]
+        if versions and versions[-1]["s3_key"] == s3_key and versions[-1]["clause_hashes"] == hashes:
+            # re-run of the same upload (retry, redrive): not a new version
+            version = versions[-1]["version"]
+            self.previous_version = versions[-2]["version"] if len(versions) > 1 else None
+        else:
+            version = (versions[-1]["version"] + 1) if versions else 1
+            versions.append({
+                "version": version,
+                "contract_id": contract_id,
+                "s3_key": s3_key,
+                "created_at": time.time(),
+                "clause_hashes": hashes,
+            })
+            del versions[:-INCREMENTAL_MAX_VERSIONS]
+
+        known = self.record["assessments"]
+        for clause in self.clauses:
+            if clause["index"] in self.assessments:
+                known[clause["clause_hash"]] = self.assessments[clause["index"]]
+        live = {h for v in versions for h in v["clause_hashes"]}
+        self.record["assessments"] = {h: a for h, a in known.items() if h in live}
+        self.store.save(self.kind, self.tenant_id, self.logical_id, self.record)
+        return {**stats, "version": version, "previous_version": self.previous_version}
+
+    def _assessed(self, key: str) -> List[Dict[str, Any]]:
+        return [
+            {**self.assessments[c["index"]], "id": c["index"], "_type": c["clause_type"]}
+            for c in self.clauses
+            if c["index"] in self.assessments and self.assessments[c["index"]].get(key) is not None
+        ]
+
+    def merge_risk(self, answer: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Compact risk answer for the whole version from reused + new clause assessments.
+
+        Only valid once every clause has an assessment: callers return the model error instead when pending
+        clauses got no usable answer.
+        """
+        answer = answer or {}
+        items = self._assessed("s")
+        scores = [float(i["s"]) for i in items]
+        confidences = [float(i["c"]) for i in items if i.get("c") is not None]
+        overall = max(scores) if scores else 0.0
+        breakdown: Dict[str, float] = {}
+        for item in items:
+            short = {"liability": "li", "indemnification": "in", "data_protection": "dp", "termination": "te"}.get(item["_type"])
+            if short:
+                breakdown[short] = max(breakdown.get(short, 0), float(item["s"]))
+        top = sorted(items, key=lambda i: float(i["s"]), reverse=True)[:5]
+        return {
+            "rs": overall,
+            "oc": round(sum(confidences) / len(confidences), 3) if confidences else answer.get("oc"),
+            "rl": _risk_level(overall),
+            "rb": {k: breakdown.get(k, 0) for k in ("li", "in", "dp", "te")},
+            "tr": answer.get("tr") or [i.get("n") for i in top if float(i["s"]) >= 7 and i.get("n")],
+            "cl": [{k: v for k, v in i.items() if k != "_type"} for i in items],
+        }
+
+    def merge_compliance(self, answer: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Compact compliance answer for the whole version from reused + new clause assessments.
+
+        Only valid once every clause has an assessment (see merge_risk).
+        """
+        answer = answer or {}
+        items = self._assessed("st")
+        statuses = {str(i["st"]).upper()[:1] for i in items}
+        if "F" in statuses:
+            status, severity = "FAIL", "high"
+        elif "N" in statuses:
+            status, severity = "PARTIAL", "medium"
+        else:
+            status, severity = "PASS", "low"
+        scores = [float(i["s"]) for i in items if i.get("s") is not None]
+        previous = (answer.get("oc") or {}).get("sc") if isinstance(answer.get("oc"), dict) else None
+        summary = answer.get("sm") or "No new clause language; stored clause assessments reused."
+        return {
+            "oc": {"st": status, "sc": round(sum(scores) / len(scores), 2) if scores else previous},
+            "sm": summary,
+            "sv": answer.get("sv") or severity,
+            "rc": answer.get("rc") or [],
+            "ex": [{k: v for k, v in i.items() if k != "_type"} for i in items],
+        }
+
+
+class LineageStore:
+    """Lineage records (versions + clause assessments) per analysis kind, tenant and logical contract."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(kind: str, tenant_id: str, logical_id: str) -> str:
+        return hashlib.sha256(f"{kind}|{tenant_id}|{logical_id}".encode("utf-8")).hexdigest()
+
+    def load(self, kind: str, tenant_id: str, logical_id: str) -> Dict[str, Any]:
+        record = self.backend.get(self._key(kind, tenant_id, logical_id))
+        return record or {"kind": kind, "tenant_id": tenant_id, "logical_contract_id": logical_id, "versions": [], "assessments": {}}
+
+    def save(self, kind: str, tenant_id: str, logical_id: str, record: Dict[str, Any]) -> None:
+        self.backend.put(self._key(kind, tenant_id, logical_id), record)
+
+    def begin(self, kind: str, tenant_id: Optional[str], logical_id: Optional[str], text: str) -> IncrementalRun:
+        return IncrementalRun(self, kind, tenant_id or "default", logical_id, text)
+
+
+_store: Optional[LineageStore] = None
+
+
+def get_lineage_store(s3_client=None) -> LineageStore:
+    global _store
+    if _store is None:
+        if INCREMENTAL_STORE_BUCKET:
+            if s3_client is None:
+                import boto3
+                s3_client = boto3.client("s3")
+            backend = S3CacheBackend(s3_client, INCREMENTAL_STORE_BUCKET, INCREMENTAL_STORE_PREFIX)
+        else:
+            backend = LocalCacheBackend(INCREMENTAL_STORE_DIR)
+        _store = LineageStore(backend)
+    return _store
@@ -0,0 +1,102 @@
+"""
+Tiered model cascade for risk analysis: heuristics -> small model -> large model.
+
+1. heuristic: the clause heuristics from knowledge/ingest/extract_clauses.py
+   score every clause. When no clause scores above CASCADE_HEURISTIC_MAX_RISK
+   and the mean heuristic confidence is at least CASCADE_HEURISTIC_MIN_CONFIDENCE
+   and the tenant's confidence_threshold (so the decision step would not send it
+   to human review for low confidence anyway), the contract is treated as low-risk boilerplate and no model is called.
+2. small: everything else goes to a small, fast model (CASCADE_SMALL_MODEL_ID).
+3. large: if the small model's overall_confidence is missing or below the
+   tenant's confidence_threshold, the same prompt is sent to
+   CASCADE_LARGE_MODEL_ID.
+
+The answering tier is recorded in the result ("model_tier"), together with
+the confidence each attempted tier reported ("cascade").
+"""
+
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from agents.shared.context_packer import split_clauses
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CASCADE_ENABLED = os.environ.get("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_SMALL_MODEL_ID = os.environ.get("CASCADE_SMALL_MODEL_ID", "us.amazon.nova-micro-v1:0")
+CASCADE_LARGE_MODEL_ID = os.environ.get("CASCADE_LARGE_MODEL_ID", "us.amazon.nova-pro-v1:0")
+CASCADE_HEURISTIC_MAX_RISK = float(os.environ.get("CASCADE_HEURISTIC_MAX_RISK", "4"))
+CASCADE_HEURISTIC_MIN_CONFIDENCE = float(os.environ.get("CASCADE_HEURISTIC_MIN_CONFIDENCE", "0.6"))
+
+TIER_HEURISTIC = "heuristic"
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+# no cascade: the configured model answered directly
+TIER_SINGLE = "single"
+
+
+def cascade_enabled(tenant_cfg: Optional[Dict[str, Any]]) -> bool:
+    """Tenant "model_cascade": true/false overrides the CASCADE_ENABLED default."""
+    if isinstance(tenant_cfg, dict) and "model_cascade" in tenant_cfg:
+        return bool(tenant_cfg["model_cascade"])
+    return CASCADE_ENABLED
+
+
+def heuristic_tier(text: str, confidence_threshold: float = 0.0) -> Optional[Dict[str, Any]]:
+    """Return the heuristic answer for clearly low-risk, high-confidence contracts, else None."""
+    clauses = split_clauses(text)
+    if not clauses:
+        return None
+    max_risk = max(c["heuristic_risk_score"] for c in clauses)
+    confidence = sum(c["heuristic_confidence"] for c in clauses) / len(clauses)
+    if max_risk > CASCADE_HEURISTIC_MAX_RISK or confidence < max(CASCADE_HEURISTIC_MIN_CONFIDENCE, confidence_threshold):
+        return None
+    return {
+        "overall_risk_score": float(max_risk),
+        "overall_confidence": round(confidence, 3),
+        "clauses_scored": len(clauses),
+    }
+
+
+def run_cascade(
+    text: str,
+    invoke: Callable[[str], Dict[str, Any]],
+    confidence_threshold: float,
+) -> Dict[str, Any]:
+    """Route one contract through the tiers.
+
+    `invoke(model_id)` must return {"text": <model output>, "overall": {"overall_risk_score", "overall_confidence"}}
+    and may add "complete". Returns {"model_tier", "model_id", "text", "overall", "cascade": [{"tier", "model_id",
+    "overall_confidence"}, ...]}, plus "complete" for model tiers.
+    """
+    attempts: List[Dict[str, Any]] = []
+
+    heuristic = heuristic_tier(text, confidence_threshold)
+    if heuristic is not None:
+        logger.info("run_cascade: heuristic tier answered %s", heuristic)
+        attempts.append({"tier": TIER_HEURISTIC, "model_id": None, "overall_confidence": heuristic["overall_confidence"]})
+        return {"model_tier": TIER_HEURISTIC, "model_id": None, "text": None, "overall": heuristic, "cascade": attempts}
+
+    answer: Dict[str, Any] = {}
+    for tier, model_id in ((TIER_SMALL, CASCADE_SMALL_MODEL_ID), (TIER_LARGE, CASCADE_LARGE_MODEL_ID)):
+        answer = invoke(model_id)
+        confidence = (answer.get("overall") or {}).get("overall_confidence")
+        attempts.append({"tier": tier, "model_id": model_id, "overall_confidence": confidence})
+        if confidence is not None and confidence >= confidence_threshold:
+            break
+        logger.info(
+            "run_cascade: %s tier confidence=%s below threshold %s", tier, confidence, confidence_threshold,
+        )
+
+    last = attempts[-1]
+    logger.info("run_cascade: %s tier answered with model %s", last["tier"], last["model_id"])
+    return {
+        "model_tier": last["tier"],
+        "model_id": last["model_id"],
+        "text": answer.get("text"),
+        "overall": answer.get("overall") or {},
+        "complete": answer.get("complete", True),
+        "cascade": attempts,
+    }
@@ -0,0 +1,268 @@
+"""
+Append-only columnar store of decision results.
+
+The decision lambda records the decision-relevant fields of every contract
+(RESULTS_STORE_ENABLED=true) so portfolio questions ("what if acme's
+risk_score_threshold were 6?") can be answered from history instead of
+re-running the pipeline (see what_if.py).
+
+Layout, under RESULTS_STORE_BUCKET/RESULTS_STORE_PREFIX or RESULTS_STORE_DIR:
+
+    staging/<time_ns>-<uuid>.json   one row per decision, written by the lambda (no NumPy needed)
+    segments/<time_ns>-<rows>.npz   immutable column segments written by `compact()`
+
+A segment holds one array per numeric column (float64, NaN = missing) and
+dictionary-encoded categorical columns (`<col>__vocab` strings +
+`<col>__codes` int32), so millions of rows load in a few column reads. Rows are
+never updated; re-decisions append new rows and readers can keep the latest
+row per contract.
+
+Compact periodically with `python -m agents.shared.results_store --compact`.
+
+With COMPLETED_RESULTS_ENABLED the decision lambda also records the latest
+completed result per tenant + document content hash
+(`extraction_cache.content_hash_for_s3_object`) under completed/, which the
+invoke lambda checks to skip re-running the pipeline for a document it has
+already decided.
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from agents.shared.extraction_cache import LocalCacheBackend, S3CacheBackend
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except Exception:
+    np = None
+    HAS_NUMPY = False
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+RESULTS_STORE_ENABLED = os.environ.get("RESULTS_STORE_ENABLED", "false").lower() == "true"
+RESULTS_STORE_BUCKET = os.environ.get("RESULTS_STORE_BUCKET")
+RESULTS_STORE_PREFIX = os.environ.get("RESULTS_STORE_PREFIX", "results/")
+RESULTS_STORE_DIR = os.environ.get("RESULTS_STORE_DIR", "/tmp/results_store")
+RESULTS_SEGMENT_ROWS = int(os.environ.get("RESULTS_SEGMENT_ROWS", "1000000"))
+COMPLETED_RESULTS_ENABLED = os.environ.get("COMPLETED_RESULTS_ENABLED", "false").lower() == "true"
+
+NUMERIC_COLUMNS = ("decided_at", "overall_risk_score", "overall_confidence", "overall_compliance_score")
+CATEGORICAL_COLUMNS = ("tenant_id", "compliance_status", "decision", "model_tier", "review_mode")
+STRING_COLUMNS = ("contract_id",)
+COLUMNS = NUMERIC_COLUMNS + CATEGORICAL_COLUMNS + STRING_COLUMNS
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return None if value is None else float(value)
+    except Exception:
+        return None
+
+
+def result_row(result: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+    """Decision-relevant fields of a decision result as one store row."""
+    source = {**result, **extra}
+    row: Dict[str, Any] = {name: _to_float(source.get(name)) for name in NUMERIC_COLUMNS}
+    row["decided_at"] = row["decided_at"] or time.time()
+    for name in CATEGORICAL_COLUMNS + STRING_COLUMNS:
+        value = source.get(name)
+        row[name] = "" if value is None else str(value)
+    return row
+
+
+class LocalSegmentStorage:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, name: str, data: bytes) -> None:
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def get(self, name: str) -> bytes:
+        with open(os.path.join(self.directory, name), "rb") as f:
+            return f.read()
+
+    def list(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.directory) if n.endswith(".npz"))
+
+
+class S3SegmentStorage:
+    def __init__(self, s3_client, bucket: str, prefix: str):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/") + "/"
+
+    def put(self, name: str, data: bytes) -> None:
+        self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}{name}", Body=data)
+
+    def get(self, name: str) -> bytes:
+        return self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{name}")["Body"].read()
+
+    def list(self) -> List[str]:
+        names = []
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix):
+            names.extend(o["Key"][len(self.prefix):] for o in page.get("Contents", []) if o["Key"].endswith(".npz"))
+        return sorted(names)
+
+
+class ResultsStore:
+    """Staged rows + immutable NumPy column segments."""
+
+    def __init__(self, staging, segments):
+        self.staging = staging
+        self.segments = segments
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """Stage one row (cheap, dependency-free; safe to call from every lambda invocation)."""
+        self.staging.put(f"{time.time_ns():020d}-{uuid.uuid4().hex}", row)
+
+    def _staged(self) -> List[str]:
+        return sorted(key for key, _, _ in self.staging.list())
+
+    def write_segment(self, rows: List[Dict[str, Any]]) -> Optional[str]:
+        """Write rows as one column segment; returns its name."""
+        if not rows:
+            return None
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **_encode_columns(rows))
+        name = f"{time.time_ns():020d}-{len(rows)}.npz"
+        self.segments.put(name, buf.getvalue())
+        return name
+
+    def compact(self) -> int:
+        """Move staged rows into column segments; returns the number of rows compacted."""
+        keys = self._staged()
+        moved = 0
+        for start in range(0, len(keys), RESULTS_SEGMENT_ROWS):
+            batch = keys[start:start + RESULTS_SEGMENT_ROWS]
+            rows = [r for r in (self.staging.get(k) for k in batch) if r]
+            self.write_segment(rows)
+            # segments are written before staged rows are dropped; a crash in between duplicates rows, never loses them
+            for key in batch:
+                self.staging.delete(key)
+            moved += len(rows)
+        logger.info("ResultsStore: compacted %d staged rows", moved)
+        return moved
+
+    def load(self, columns: Iterable[str] = COLUMNS, include_staged: bool = True) -> Dict[str, Any]:
+        """Concatenate the requested columns over all segments (+ staged rows).
+
+        Numeric columns come back as float64 arrays; categorical and string columns as string arrays.
+        """
+        columns = list(columns)
+        parts: List[Dict[str, Any]] = []
+        for name in self.segments.list():
+            with np.load(io.BytesIO(self.segments.get(name)), allow_pickle=False) as seg:
+                parts.append({c: _decode_column(seg, c) for c in columns})
+        if include_staged:
+            rows = [r for r in (self.staging.get(k) for k in self._staged()) if r]
+            if rows:
+                encoded = _encode_columns(rows)
+                parts.append({c: _decode_column(encoded, c) for c in columns})
+        if not parts:
+            return {c: np.array([], dtype=float if c in NUMERIC_COLUMNS else str) for c in columns}
+        return {c: np.concatenate([p[c] for p in parts]) for c in columns}
+
+
+def _encode_columns(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    arrays: Dict[str, Any] = {}
+    for name in NUMERIC_COLUMNS:
+        arrays[name] = np.array([r.get(name) if r.get(name) is not None else np.nan for r in rows], dtype=np.float64)
+    for name in CATEGORICAL_COLUMNS:
+        vocab, codes = np.unique(np.array([r.get(name) or "" for r in rows], dtype=str), return_inverse=True)
+        arrays[f"{name}__vocab"] = vocab
+        arrays[f"{name}__codes"] = codes.astype(np.int32)
+    for name in STRING_COLUMNS:
+        arrays[name] = np.array([r.get(name) or "" for r in rows], dtype=str)
+    return arrays
+
+
+def _decode_column(arrays, name: str):
+    if name in CATEGORICAL_COLUMNS:
+        return arrays[f"{name}__vocab"][arrays[f"{name}__codes"]]
+    return arrays[name]
+
+
+class CompletedResults:
+    """Latest completed decision per tenant + document content hash."""
+
+    FIELDS = ("contract_id", "s3_uri", "decision", "reason", "decided_at", "compliance_status",
+              "overall_compliance_score", "overall_risk_score", "overall_confidence")
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(tenant_id: Optional[str], content_hash: str) -> str:
+        return hashlib.sha256(f"{tenant_id or 'default'}|{content_hash}".encode("utf-8")).hexdigest()
+
+    def get(self, tenant_id: Optional[str], content_hash: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get(self._key(tenant_id, content_hash))
+
+    def put(self, tenant_id: Optional[str], content_hash: str, result: Dict[str, Any]) -> None:
+        entry = {name: result.get(name) for name in self.FIELDS}
+        self.backend.put(self._key(tenant_id, content_hash), {**entry, "tenant_id": tenant_id, "content_hash": content_hash})
+
+
+_store: Optional[ResultsStore] = None
+_completed: Optional[CompletedResults] = None
+
+
+def get_results_store(s3_client=None) -> ResultsStore:
+    global _store
+    if _store is None:
+        if RESULTS_STORE_BUCKET:
+            if s3_client is None:
+                import boto3
+                s3_client = boto3.client("s3")
+            prefix = RESULTS_STORE_PREFIX.rstrip("/")
+            _store = ResultsStore(
+                S3CacheBackend(s3_client, RESULTS_STORE_BUCKET, f"{prefix}/staging/"),
+                S3SegmentStorage(s3_client, RESULTS_STORE_BUCKET, f"{prefix}/segments/"),
+            )
+        else:
+            _store = ResultsStore(
+                LocalCacheBackend(os.path.join(RESULTS_STORE_DIR, "staging")),
+                LocalSegmentStorage(os.path.join(RESULTS_STORE_DIR, "segments")),
+            )
+    return _store
+
+
+def get_completed_results(s3_client=None) -> CompletedResults:
+    global _completed
+    if _completed is None:
+        if RESULTS_STORE_BUCKET:
+            if s3_client is None:
+                import boto3
+                s3_client = boto3.client("s3")
+            backend = S3CacheBackend(s3_client, RESULTS_STORE_BUCKET, f"{RESULTS_STORE_PREFIX.rstrip('/')}/completed/")
+        else:
+            backend = LocalCacheBackend(os.path.join(RESULTS_STORE_DIR, "completed"))
+        _completed = CompletedResults(backend)
+    return _completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the decision results store")
+    parser.add_argument("--compact", action="store_true", help="move staged rows into column segments")
+    args = parser.parse_args()
+    store = get_results_store()
+    if args.compact:
+        print("compacted", store.compact(), "rows")
+    columns = store.load(["decision"])
+    print("rows:", len(columns["decision"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Versioned compliance rule packs selected by tenant region and industry.
+
+Packs live in `rule_packs.json`. Each pack names its framework, version, the
+regions/industries it applies to ("*" for all), a keyword category and/or
+named regex patterns. For a tenant profile only the relevant packs are
+selected (e.g. EU + healthcare -> PII, SOX, GDPR, HIPAA, SOC2) and compiled
+into one MultiPatternScanner. Compiled scanners are memoized per container by
+(region, industry, pinned packs, extra keyword packs), so each profile is
+compiled once per cold start.
+
+An unknown region or industry selects every pack for that dimension, so the
+default tenant keeps the broad checks. A tenant can pin an explicit list with
+"rule_packs": ["gdpr", "hipaa"] in its config.
+"""
+
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.shared.text_scanner import MultiPatternScanner
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+RULE_PACKS_PATH = os.environ.get("RULE_PACKS_PATH") or os.path.join(os.path.dirname(__file__), "rule_packs.json")
+
+_DEFAULT_PRIORITY = 50
+
+
+@lru_cache(maxsize=1)
+def load_rule_packs(path: str = RULE_PACKS_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _applies(allowed: Any, value: Optional[str]) -> bool:
+    if allowed == "*" or not value:
+        return True
+    return value.strip().lower() in {a.lower() for a in allowed}
+
+
+def select_rule_packs(
+    region: Optional[str],
+    industry: Optional[str],
+    pinned: Optional[Tuple[str, ...]] = None,
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Return (pack_id, pack) pairs for a tenant profile, in pattern-priority order."""
+    packs = load_rule_packs()["packs"]
+    if pinned:
+        selected = [(pid, packs[pid]) for pid in pinned if pid in packs]
+    else:
+        selected = [
+            (pid, pack)
+            for pid, pack in packs.items()
+            if _applies(pack.get("regions", "*"), region) and _applies(pack.get("industries", "*"), industry)
+        ]
+    return sorted(selected, key=lambda item: item[1].get("priority", _DEFAULT_PRIORITY))
+
+
+@lru_cache(maxsize=256)
+def _compiled_profile(
+    region: Optional[str],
+    industry: Optional[str],
+    pinned: Optional[Tuple[str, ...]],
+    extra_keywords: Tuple[Tuple[str, Tuple[str, ...]], ...],
+) -> Tuple[MultiPatternScanner, Tuple[Dict[str, str], ...]]:
+    selected = select_rule_packs(region, industry, pinned)
+
+    keywords: Dict[str, List[str]] = {}
+    patterns: Dict[str, Any] = {}
+    for pid, pack in selected:
+        if pack.get("keywords"):
+            keywords.setdefault(pack.get("category") or f"{pid}_indicators", []).extend(pack["keywords"])
+        for name, spec in (pack.get("patterns") or {}).items():
+            patterns[name] = re.compile(spec["regex"], re.I if spec.get("ignore_case") else 0)
+    for category, kws in extra_keywords:
+        keywords.setdefault(category, []).extend(kws)
+
+    descriptors = tuple(
+        {"id": pid, "framework": pack.get("framework", pid.upper()), "version": pack.get("version", "")}
+        for pid, pack in selected
+    )
+    logger.info(
+        "rule_packs: compiled profile region=%s industry=%s packs=%s",
+        region, industry, [d["id"] for d in descriptors],
+    )
+    return MultiPatternScanner(keywords, patterns), descriptors
+
+
+def get_profile_scanner(
+    region: Optional[str] = None,
+    industry: Optional[str] = None,
+    pinned: Optional[List[str]] = None,
+    keyword_packs: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[MultiPatternScanner, List[Dict[str, str]]]:
+    """Return the memoized scanner for a tenant profile and descriptors of the packs it runs."""
+    extra = tuple(sorted((cat, tuple(sorted(kws))) for cat, kws in (keyword_packs or {}).items()))
+    scanner, descriptors = _compiled_profile(
+        region.strip().upper() if region else None,
+        industry.strip().lower() if industry else None,
+        tuple(pinned) if pinned else None,
+        extra,
+    )
+    return scanner, list(descriptors)
@@ -0,0 +1,122 @@
+"""
+Incremental parser for top-level fields of a streamed JSON object.
+
+Model output arrives in small text deltas. `StreamingFieldParser.feed()`
+tracks string/escape state and nesting depth over the new characters only,
+and returns each watched top-level field as soon as its value is complete,
+e.g. "overall_risk_score" is available as soon as the number is followed by a
+comma, long before the "clauses" array has been generated.
+
+Text before the first "{" (prose, ```json fences) is skipped. Only the first
+top-level object is parsed.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class StreamingFieldParser:
+    """Feed JSON text in chunks; completed top-level fields are returned as (name, value) pairs."""
+
+    def __init__(self, fields: Optional[Iterable[str]] = None):
+        self.watch = set(fields) if fields else None
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = "key"  # key -> colon -> value -> after -> key ...
+        self._token_start = 0
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._completed: List[Tuple[str, Any]] = []
+
+    @property
+    def complete(self) -> bool:
+        """True once every watched field has been parsed (or the object has closed)."""
+        return self.done or (self.watch is not None and self.watch.issubset(self.fields))
+
+    def _finish(self, end: int) -> None:
+        raw = self._text[self._value_start:end].strip()
+        self._state = "after"
+        self._value_start = None
+        if self._key is None or (self.watch is not None and self._key not in self.watch):
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        self.fields[self._key] = value
+        self._completed.append((self._key, value))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        if self.done or not chunk:
+            return []
+        self._text += chunk
+        self._completed = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._state == "key":
+                            self._key = json.loads(text[self._token_start:i + 1])
+                            self._state = "colon"
+                        elif self._state == "value":
+                            self._finish(i + 1)
+                continue
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._state = "key"
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._state == "key":
+                        self._token_start = i
+                    elif self._state == "value" and self._value_start is None:
+                        self._value_start = i
+            elif ch in "{[":
+                if self._depth == 1 and self._state == "value" and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._state == "value":
+                    self._finish(i + 1)
+                elif self._depth == 0:
+                    if self._state == "value" and self._value_start is not None:
+                        self._finish(i)
+                    self.done = True
+                    self._pos = i + 1
+                    return self._completed
+            elif self._depth == 1:
+                if ch == ":" and self._state == "colon":
+                    self._state = "value"
+                    self._value_start = None
+                elif ch == ",":
+                    if self._state == "value" and self._value_start is not None:
+                        self._finish(i)
+                    self._state = "key"
+                elif self._state == "value" and self._value_start is None and not ch.isspace():
+                    self._value_start = i
+        self._pos = len(text)
+        return self._completed
+
+
+def parse_fields(text: str, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Parse watched top-level fields from complete text with the same rules as the streaming path."""
+    parser = StreamingFieldParser(fields)
+    parser.feed(text or "")
+    return parser.fields
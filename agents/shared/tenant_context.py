@@ -1,8 +1,9 @@
-import json
 import logging
 import os
 from typing import Any, Dict, Optional
 
+from agents.shared.tenant_store import get_tenant_store, warm_tenant_config  # noqa: F401 (re-exported for agents)
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -19,20 +20,5 @@ def extract_tenant_id_from_s3_key(key: Optional[str]) -> Optional[str]:
 
 
 def load_tenant_config(tenant_id: Optional[str], config_path: Optional[str] = None) -> Dict[str, Any]:
-    path = config_path or DEFAULT_CONFIG_PATH
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception as e:
-        logger.warning("load_tenant_config: failed to read %s: %s", path, e)
-        return {}
-
-    if not isinstance(data, dict):
-        return {}
-
-    if tenant_id and tenant_id in data and isinstance(data[tenant_id], dict):
-        return data[tenant_id]
-
-    default_cfg = data.get("default")
-    return default_cfg if isinstance(default_cfg, dict) else {}
-
+    """Tenant config (else the default config, else {}) from the cached tenant config store (tenant_store.py)."""
+    return get_tenant_store(config_path).get(tenant_id)
@@ -0,0 +1,286 @@
+"""
+Cached, hot-reloadable tenant configuration store.
+
+`load_tenant_config` used to open and parse tenant_config.json on every call.
+The store keeps resolved per-tenant configs in process memory and revalidates
+them against the backend's version token at most every
+TENANT_CONFIG_CHECK_SECONDS, so a lookup is a dict hit and does not depend on
+how many tenants are configured.
+
+Backends (TENANT_CONFIG_BACKEND):
+- json (default): tenant_config.json (TENANT_CONFIG_PATH), parsed once per
+  file version (mtime + size).
+- sqlite: indexed point lookups in a SQLite file (TENANT_CONFIG_DB, table
+  tenant_config(tenant_id PRIMARY KEY, config JSON)), invalidated on the file's
+  mtime. Same item shape as the DynamoDB table, so it doubles as its local
+  stand-in; build it from the JSON file with
+  `python -m agents.shared.tenant_store --json tenant_config.json --db tenant_config.sqlite`.
+- dynamodb: get_item point lookups on TENANT_CONFIG_TABLE (partition key
+  "tenant_id", attribute "config" holding the JSON). A table has no cheap
+  version token, so entries are revalidated after TENANT_CONFIG_TTL_SECONDS.
+
+Unknown tenants resolve to the "default" entry. A failed lookup (unreadable
+file, DynamoDB error) is never cached: the tenant's previous entry keeps being
+served, even past its TTL or a version change, and the lookup is retried on
+the next call. Returned dicts are shared cache entries; treat them as read-only.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TENANT_CONFIG_BACKEND = os.environ.get("TENANT_CONFIG_BACKEND", "json").lower()
+TENANT_CONFIG_PATH = os.environ.get("TENANT_CONFIG_PATH") or os.path.join(os.path.dirname(__file__), "tenant_config.json")
+TENANT_CONFIG_DB = os.environ.get("TENANT_CONFIG_DB") or os.path.join(os.path.dirname(__file__), "tenant_config.sqlite")
+TENANT_CONFIG_TABLE = os.environ.get("TENANT_CONFIG_TABLE")
+TENANT_CONFIG_CHECK_SECONDS = float(os.environ.get("TENANT_CONFIG_CHECK_SECONDS", "5"))
+TENANT_CONFIG_TTL_SECONDS = float(os.environ.get("TENANT_CONFIG_TTL_SECONDS", "300"))
+
+DEFAULT_TENANT = "default"
+
+
+def _file_version(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class JsonFileBackend:
+    """All tenants in one JSON object; re-parsed only when the file changes."""
+
+    def __init__(self, path: str = TENANT_CONFIG_PATH):
+        self.path = path
+        self._data: Dict[str, Any] = {}
+        self._loaded_version: Optional[tuple] = None
+
+    def version(self) -> Optional[tuple]:
+        return _file_version(self.path)
+
+    def _load(self) -> Dict[str, Any]:
+        version = self.version()
+        if version != self._loaded_version:
+            # a failed read raises and leaves the loaded version unchanged, so the next call retries
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._data = data if isinstance(data, dict) else {}
+            self._loaded_version = version
+        return self._data
+
+    def get(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        cfg = self._load().get(tenant_id)
+        return cfg if isinstance(cfg, dict) else None
+
+    def tenant_ids(self) -> Iterable[str]:
+        return list(self._load())
+
+
+class SQLiteBackend:
+    """Indexed per-tenant lookups in a SQLite file (local stand-in for the DynamoDB table)."""
+
+    def __init__(self, path: str = TENANT_CONFIG_DB):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def version(self) -> Optional[tuple]:
+        return _file_version(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self._conn
+
+    def get(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT config FROM tenant_config WHERE tenant_id = ?", (tenant_id,)
+            ).fetchone()
+        if not row:
+            return None
+        cfg = json.loads(row[0])
+        return cfg if isinstance(cfg, dict) else None
+
+    def tenant_ids(self) -> Iterable[str]:
+        with self._lock:
+            return [r[0] for r in self._connection().execute("SELECT tenant_id FROM tenant_config")]
+
+    def reset(self) -> None:
+        # a replaced file needs a fresh connection
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class DynamoTableBackend:
+    """Per-tenant get_item lookups (partition key "tenant_id", attribute "config" with the JSON config)."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def version(self) -> Optional[tuple]:
+        return None
+
+    def get(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={"tenant_id": tenant_id}).get("Item")
+        if not item:
+            return None
+        cfg = json.loads(item["config"]) if isinstance(item.get("config"), str) else item.get("config")
+        return cfg if isinstance(cfg, dict) else None
+
+    def tenant_ids(self) -> Iterable[str]:
+        return []
+
+
+class TenantConfigStore:
+    """In-process cache of resolved tenant configs, invalidated when the backend version changes."""
+
+    def __init__(
+        self,
+        backend,
+        check_seconds: float = TENANT_CONFIG_CHECK_SECONDS,
+        ttl_seconds: float = TENANT_CONFIG_TTL_SECONDS,
+    ):
+        self.backend = backend
+        self.check_seconds = check_seconds
+        self.ttl_seconds = ttl_seconds
+        self._cache: Dict[str, tuple] = {}
+        # last good config per tenant, served while lookups fail
+        self._last_good: Dict[str, Dict[str, Any]] = {}
+        self._version: Optional[tuple] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _revalidate(self, now: float) -> None:
+        self._next_check = now + self.check_seconds
+        version = self.backend.version()
+        if version != self._version:
+            if self._version is not None:
+                logger.info("TenantConfigStore: config changed (%s -> %s), reloading", self._version, version)
+            if hasattr(self.backend, "reset"):
+                self.backend.reset()
+            self._cache = {}
+            self._version = version
+
+    def _resolve(self, key: str) -> Optional[Dict[str, Any]]:
+        """Config for the key (or the default); None when the backend lookup failed."""
+        try:
+            cfg = self.backend.get(key)
+            if cfg is None and key != DEFAULT_TENANT:
+                cfg = self.backend.get(DEFAULT_TENANT)
+        except Exception as e:
+            logger.warning("TenantConfigStore: lookup for %s failed: %s", key, e)
+            return None
+        return cfg or {}
+
+    def get(self, tenant_id: Optional[str]) -> Dict[str, Any]:
+        """Config for the tenant, else the default config, else {}."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._revalidate(now)
+        key = tenant_id or DEFAULT_TENANT
+        hit = self._cache.get(key)
+        # versioned backends stay valid until the version changes; others expire after ttl_seconds
+        if hit is not None and (self._version is not None or hit[1] > now):
+            return hit[0]
+        with self._lock:
+            cfg = self._resolve(key)
+            if cfg is None:
+                # not cached: keep serving the previous entry (else the last default) and retry on the next call
+                return self._last_good.get(key) or self._last_good.get(DEFAULT_TENANT, {})
+            self._cache[key] = (cfg, now + self.ttl_seconds)
+            self._last_good[key] = cfg
+        return cfg
+
+    def warm(self, tenant_ids: Optional[Iterable[str]] = None) -> int:
+        """Preload the default config and the given tenants (all tenants for file backends); returns the count."""
+        if tenant_ids is None:
+            try:
+                tenant_ids = self.backend.tenant_ids()
+            except Exception as e:
+                logger.warning("TenantConfigStore: listing tenants failed: %s", e)
+                tenant_ids = []
+        ids = list(tenant_ids)
+        for tenant_id in [DEFAULT_TENANT] + [t for t in ids if t != DEFAULT_TENANT]:
+            self.get(tenant_id)
+        return len(self._cache)
+
+
+def build_store(backend_name: str = TENANT_CONFIG_BACKEND, dynamodb_resource=None) -> TenantConfigStore:
+    if backend_name == "dynamodb" and TENANT_CONFIG_TABLE:
+        if dynamodb_resource is None:
+            import boto3
+            dynamodb_resource = boto3.resource("dynamodb")
+        return TenantConfigStore(DynamoTableBackend(dynamodb_resource.Table(TENANT_CONFIG_TABLE)))
+    if backend_name == "sqlite" and os.path.exists(TENANT_CONFIG_DB):
+        return TenantConfigStore(SQLiteBackend(TENANT_CONFIG_DB))
+    if backend_name not in ("json", ""):
+        logger.warning("build_store: backend %s not available, using %s", backend_name, TENANT_CONFIG_PATH)
+    return TenantConfigStore(JsonFileBackend(TENANT_CONFIG_PATH))
+
+
+_store: Optional[TenantConfigStore] = None
+_path_stores: Dict[str, TenantConfigStore] = {}
+
+
+def get_tenant_store(config_path: Optional[str] = None) -> TenantConfigStore:
+    """Process-wide store; an explicit JSON config_path gets its own cached store."""
+    global _store
+    if config_path:
+        if config_path not in _path_stores:
+            _path_stores[config_path] = TenantConfigStore(JsonFileBackend(config_path))
+        return _path_stores[config_path]
+    if _store is None:
+        _store = build_store()
+    return _store
+
+
+def warm_tenant_config() -> None:
+    """Call at module import (cold start) so the first request does not pay for loading the config."""
+    started = time.monotonic()
+    count = get_tenant_store().warm()
+    logger.info("warm_tenant_config: %d tenant configs cached in %.1fms", count, (time.monotonic() - started) * 1000)
+
+
+def write_sqlite(configs: Dict[str, Any], db_path: str) -> int:
+    """Write {tenant_id: config} into a SQLite file (replaced atomically); returns the number of tenants."""
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("CREATE TABLE tenant_config (tenant_id TEXT PRIMARY KEY, config TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO tenant_config (tenant_id, config) VALUES (?, ?)",
+            [(tenant_id, json.dumps(cfg)) for tenant_id, cfg in configs.items() if isinstance(cfg, dict)],
+        )
+        conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM tenant_config").fetchone()[0]
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite tenant config store from tenant_config.json")
+    parser.add_argument("--json", default=TENANT_CONFIG_PATH, help="tenant config JSON file")
+    parser.add_argument("--db", default=TENANT_CONFIG_DB, help="output SQLite file")
+    args = parser.parse_args()
+    with open(args.json, "r", encoding="utf-8") as f:
+        configs = json.load(f)
+    print("wrote", write_sqlite(configs, args.db), "tenant configs to", args.db)
+
+
+if __name__ == "__main__":
+    main()
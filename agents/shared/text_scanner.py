@@ -0,0 +1,109 @@
+"""
+Single-pass multi-pattern scanner for heuristic compliance checks.
+
+All keywords (grouped by category, e.g. "financial_indicators") are compiled
+into one Aho-Corasick automaton and all regex patterns (e.g. PII) into one
+combined alternation, so a scan costs one pass over the text per matcher
+regardless of how many keywords or packs are registered.
+
+Keyword matching is case-insensitive substring matching, like the original
+`kw in lowered` checks. When pyahocorasick is not installed, keywords fall
+back to a single combined regex that finds the positions where some keyword
+starts; every keyword starting there is reported, so keywords nested in a
+longer one ("personal data" in "sensitive personal data") are found as with
+the automaton.
+Patterns are tried in registration order at each position, so a span is
+counted once, for the first pattern that matches it (e.g. an SSN is not also
+counted as a phone number).
+
+Scan results carry counts and (start, end) character offsets:
+    {
+      "keywords": {"gdpr_indicators": {"personal data": [(120, 133), ...]}, ...},
+      "patterns": {"email": [(10, 27)], ...}
+    }
+"""
+
+import re
+from typing import Dict, Iterable, List, Pattern, Tuple
+
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except Exception:
+    ahocorasick = None
+    HAS_AHOCORASICK = False
+
+Offsets = List[Tuple[int, int]]
+
+
+def _combined_pattern(patterns: Dict[str, Pattern]) -> Tuple[Pattern, Dict[str, str]]:
+    """Join named patterns into one alternation; returns the regex and group-name -> pattern-name map."""
+    parts = []
+    groups = {}
+    for i, (name, rx) in enumerate(patterns.items()):
+        group = f"p{i}"
+        groups[group] = name
+        body = rx.pattern
+        # keep per-pattern flags local to its alternative
+        if rx.flags & re.I:
+            body = f"(?i:{body})"
+        parts.append(f"(?P<{group}>{body})")
+    return re.compile("|".join(parts)), groups
+
+
+class MultiPatternScanner:
+    """Compiled scanner over keyword categories and named regex patterns."""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], patterns: Dict[str, Pattern]):
+        self.keywords = {cat: sorted({kw.lower() for kw in kws if kw}) for cat, kws in keywords.items()}
+        self.patterns = dict(patterns)
+
+        # keyword -> categories it belongs to (the same keyword may sit in several packs)
+        self._kw_categories: Dict[str, List[str]] = {}
+        for cat, kws in self.keywords.items():
+            for kw in kws:
+                self._kw_categories.setdefault(kw, []).append(cat)
+
+        self._automaton = None
+        self._kw_regex = None
+        self._kw_by_first: Dict[str, List[str]] = {}
+        if self._kw_categories:
+            if HAS_AHOCORASICK:
+                self._automaton = ahocorasick.Automaton()
+                for kw in self._kw_categories:
+                    self._automaton.add_word(kw, kw)
+                self._automaton.make_automaton()
+            else:
+                alternation = "|".join(re.escape(kw) for kw in sorted(self._kw_categories, key=len, reverse=True))
+                # zero-width lookahead so overlapping keywords starting at different positions are all found
+                self._kw_regex = re.compile(f"(?=({alternation}))")
+                # the regex reports one keyword per position; these give every keyword starting there
+                for kw in self._kw_categories:
+                    self._kw_by_first.setdefault(kw[0], []).append(kw)
+
+        self._pattern_regex, self._groups = _combined_pattern(self.patterns) if self.patterns else (None, {})
+
+    def _iter_keywords(self, lowered: str) -> Iterable[Tuple[str, int, int]]:
+        if self._automaton is not None:
+            for end, kw in self._automaton.iter(lowered):
+                yield kw, end - len(kw) + 1, end + 1
+        elif self._kw_regex is not None:
+            for m in self._kw_regex.finditer(lowered):
+                start = m.start()
+                for kw in self._kw_by_first[lowered[start]]:
+                    if lowered.startswith(kw, start):
+                        yield kw, start, start + len(kw)
+
+    def scan(self, text: str) -> Dict[str, Dict[str, Dict[str, Offsets]]]:
+        text = text or ""
+        keywords: Dict[str, Dict[str, Offsets]] = {cat: {} for cat in self.keywords}
+        for kw, start, end in self._iter_keywords(text.lower()):
+            for cat in self._kw_categories[kw]:
+                keywords[cat].setdefault(kw, []).append((start, end))
+
+        patterns: Dict[str, Offsets] = {name: [] for name in self.patterns}
+        if self._pattern_regex is not None:
+            for m in self._pattern_regex.finditer(text):
+                patterns[self._groups[m.lastgroup]].append(m.span())
+
+        return {"keywords": keywords, "patterns": patterns}
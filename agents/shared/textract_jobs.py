@@ -0,0 +1,379 @@
+"""
+Textract job manager for the ingestion flow.
+
+Instead of sleeping in a poll loop, PDF extraction can start an asynchronous
+Textract text-detection job with an SNS completion channel and return a job
+handle straight away. A separate invocation (the ingestion completion handler,
+subscribed to the SNS topic directly or through SQS) resumes the work when the
+notification arrives.
+
+The manager also caps the number of Textract jobs running at once for the
+account: submissions above the cap are stored as QUEUED and started when a
+running job completes. Job records live in a small pluggable store so the
+submitting and the completing invocations see the same state.
+
+The cap holds across containers: a job may only start while it holds one of
+`max_concurrent` slots in the store, and a slot is taken with a create-if-absent
+write (S3 `If-None-Match: *`), so concurrent ingestion Lambdas cannot both take
+the last one. Slots are released when the job completes; a slot held longer than
+TEXTRACT_SLOT_LEASE_SECONDS (a container that died mid-start) is taken over.
+The S3 store keeps records under a per-status prefix, so listing queued or
+running jobs never reads finished ones (expire the terminal prefixes with a
+bucket lifecycle rule).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TEXTRACT_MAX_CONCURRENT_JOBS = int(os.environ.get("TEXTRACT_MAX_CONCURRENT_JOBS", "10"))
+TEXTRACT_SNS_TOPIC_ARN = os.environ.get("TEXTRACT_SNS_TOPIC_ARN")
+TEXTRACT_SNS_ROLE_ARN = os.environ.get("TEXTRACT_SNS_ROLE_ARN")
+TEXTRACT_JOB_PREFIX = os.environ.get("TEXTRACT_JOB_PREFIX", "textract-jobs/")
+# a concurrency slot older than this is assumed abandoned and can be taken over
+TEXTRACT_SLOT_LEASE_SECONDS = int(os.environ.get("TEXTRACT_SLOT_LEASE_SECONDS", str(6 * 3600)))
+
+STATUS_QUEUED = "QUEUED"
+STATUS_RUNNING = "RUNNING"
+STATUS_SUCCEEDED = "SUCCEEDED"
+STATUS_FAILED = "FAILED"
+_STATUSES = (STATUS_RUNNING, STATUS_QUEUED, STATUS_SUCCEEDED, STATUS_FAILED)
+
+# Textract error codes that mean "too many jobs in flight", i.e. keep the job queued
+_THROTTLE_CODES = {"LimitExceededException", "ProvisionedThroughputExceededException", "ThrottlingException"}
+# S3 conditional-write failures, i.e. another container holds (or just changed) the slot
+_CONFLICT_CODES = {"PreconditionFailed", "ConditionalRequestConflict", "412", "409"}
+
+
+class TextractConfigError(ValueError):
+    """The job manager is missing the SNS completion channel it needs."""
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _error_code(e: Exception) -> Optional[str]:
+    return (getattr(e, "response", None) or {}).get("Error", {}).get("Code")
+
+
+class LocalJobStore:
+    """Job store backed by a single JSON file. Used for local runs and tests."""
+
+    def __init__(self, path: str, lease_seconds: int = TEXTRACT_SLOT_LEASE_SECONDS):
+        self.path = path
+        self.slot_dir = f"{path}.slots"
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, data: Dict[str, Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def put(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            data = self._load()
+            data[job["handle"]] = job
+            self._save(data)
+
+    def get(self, handle: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load().get(handle)
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._load().values())
+        if status:
+            jobs = [j for j in jobs if j.get("status") == status]
+        return sorted(jobs, key=lambda j: j.get("created_at", 0))
+
+    def acquire_slot(self, handle: str, max_slots: int) -> Optional[int]:
+        """Take a free concurrency slot for `handle` (exclusive file create); None when all are held."""
+        os.makedirs(self.slot_dir, exist_ok=True)
+        for slot in range(max_slots):
+            path = os.path.join(self.slot_dir, str(slot))
+            try:
+                if self.lease_seconds and _now() - os.path.getmtime(path) > self.lease_seconds:
+                    os.remove(path)
+            except OSError:
+                pass
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(handle)
+            return slot
+        return None
+
+    def release_slot(self, slot: int, handle: str) -> None:
+        path = os.path.join(self.slot_dir, str(slot))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if f.read() != handle:
+                    return
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class S3JobStore:
+    """Job store keeping one JSON object per job under ``{prefix}{status}/{handle}.json`` and slots under ``{prefix}slots/``."""
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        prefix: str = TEXTRACT_JOB_PREFIX,
+        lease_seconds: int = TEXTRACT_SLOT_LEASE_SECONDS,
+    ):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/") + "/"
+        self.lease_seconds = lease_seconds
+
+    def _key(self, handle: str, status: str) -> str:
+        return f"{self.prefix}{status.lower()}/{handle}.json"
+
+    def _slot_key(self, slot: int) -> str:
+        return f"{self.prefix}slots/{slot}"
+
+    def put(self, job: Dict[str, Any]) -> None:
+        status = job.get("status") or STATUS_QUEUED
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self._key(job["handle"], status),
+            Body=json.dumps(job).encode("utf-8"),
+            ContentType="application/json",
+        )
+        # drop the record from the status it moved out of
+        for other in _STATUSES:
+            if other != status:
+                self.s3.delete_object(Bucket=self.bucket, Key=self._key(job["handle"], other))
+
+    def get(self, handle: str) -> Optional[Dict[str, Any]]:
+        for status in _STATUSES:
+            try:
+                resp = self.s3.get_object(Bucket=self.bucket, Key=self._key(handle, status))
+            except Exception:
+                continue
+            return json.loads(resp["Body"].read())
+        return None
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        jobs = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for s in ([status] if status else _STATUSES):
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{s.lower()}/"):
+                for obj in page.get("Contents", []):
+                    resp = self.s3.get_object(Bucket=self.bucket, Key=obj["Key"])
+                    jobs.append(json.loads(resp["Body"].read()))
+        return sorted(jobs, key=lambda j: j.get("created_at", 0))
+
+    def acquire_slot(self, handle: str, max_slots: int) -> Optional[int]:
+        """Take a free concurrency slot for `handle` with a create-if-absent write; None when all are held."""
+        for slot in range(max_slots):
+            key = self._slot_key(slot)
+            try:
+                self.s3.put_object(Bucket=self.bucket, Key=key, Body=handle.encode("utf-8"), IfNoneMatch="*")
+                return slot
+            except Exception as e:
+                if _error_code(e) not in _CONFLICT_CODES:
+                    raise
+            if self.lease_seconds and self._take_over_stale(key, handle):
+                return slot
+        return None
+
+    def _take_over_stale(self, key: str, handle: str) -> bool:
+        try:
+            head = self.s3.head_object(Bucket=self.bucket, Key=key)
+        except Exception:
+            return False
+        if _now() - head["LastModified"].timestamp() <= self.lease_seconds:
+            return False
+        try:
+            # If-Match on the stale ETag: only one container wins the takeover
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=handle.encode("utf-8"), IfMatch=head["ETag"])
+        except Exception as e:
+            if _error_code(e) not in _CONFLICT_CODES:
+                raise
+            return False
+        logger.warning("S3JobStore: took over abandoned slot %s", key)
+        return True
+
+    def release_slot(self, slot: int, handle: str) -> None:
+        key = self._slot_key(slot)
+        try:
+            resp = self.s3.get_object(Bucket=self.bucket, Key=key)
+            if resp["Body"].read().decode("utf-8") != handle:
+                return
+            self.s3.delete_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            logger.warning("S3JobStore: failed to release slot %s: %s", key, e)
+
+
+class TextractJobManager:
+    """Starts async Textract jobs with a completion channel and caps how many run at once across containers."""
+
+    def __init__(
+        self,
+        textract_client,
+        store,
+        max_concurrent: int = TEXTRACT_MAX_CONCURRENT_JOBS,
+        sns_topic_arn: Optional[str] = TEXTRACT_SNS_TOPIC_ARN,
+        sns_role_arn: Optional[str] = TEXTRACT_SNS_ROLE_ARN,
+    ):
+        if not sns_topic_arn or not sns_role_arn:
+            # without a completion channel no job ever reports back and queued jobs never start
+            raise TextractConfigError(
+                "TEXTRACT_SNS_TOPIC_ARN and TEXTRACT_SNS_ROLE_ARN are required for notify-mode Textract jobs"
+            )
+        self.textract = textract_client
+        self.store = store
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.sns_topic_arn = sns_topic_arn
+        self.sns_role_arn = sns_role_arn
+        self._lock = threading.Lock()
+
+    def _start(self, job: Dict[str, Any]) -> bool:
+        """Start the Textract job for a record if a slot is free.
+
+        Returns False when no slot is free or Textract pushed back; the job then stays queued.
+        """
+        slot = self.store.acquire_slot(job["handle"], self.max_concurrent)
+        if slot is None:
+            return False
+        try:
+            started = self._start_in_slot(job, slot)
+        except Exception:
+            self.store.release_slot(slot, job["handle"])
+            raise
+        if not started:
+            self.store.release_slot(slot, job["handle"])
+        return started
+
+    def _start_in_slot(self, job: Dict[str, Any], slot: int) -> bool:
+        params: Dict[str, Any] = {
+            "DocumentLocation": {"S3Object": {"Bucket": job["bucket"], "Name": job["key"]}},
+            "JobTag": job["handle"],
+            # makes a retried start for the same handle return the same JobId
+            "ClientRequestToken": job["handle"],
+            "NotificationChannel": {"SNSTopicArn": self.sns_topic_arn, "RoleArn": self.sns_role_arn},
+        }
+
+        try:
+            resp = self.textract.start_document_text_detection(**params)
+        except Exception as e:
+            if _error_code(e) in _THROTTLE_CODES:
+                logger.warning("TextractJobManager: Textract limit reached, keeping job %s queued", job["handle"])
+                return False
+            raise
+
+        job_id = resp.get("JobId")
+        if not job_id:
+            raise RuntimeError(f"Failed to start Textract job for s3://{job['bucket']}/{job['key']}")
+
+        job.update({"status": STATUS_RUNNING, "job_id": job_id, "slot": slot, "started_at": _now(), "updated_at": _now()})
+        self.store.put(job)
+        logger.info("TextractJobManager: started job_id=%s handle=%s", job_id, job["handle"])
+        return True
+
+    def submit(
+        self,
+        bucket: str,
+        key: str,
+        context: Optional[Dict[str, Any]] = None,
+        task_token: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Register a document for extraction and start it if there is capacity.
+
+        `context` is carried through to the completion handler (contract_id etc.),
+        `task_token` is a Step Functions token to complete when the job finishes.
+        Returns the job record; its `handle` identifies the job from then on.
+        """
+        job = {
+            "handle": uuid.uuid4().hex,
+            "bucket": bucket,
+            "key": key,
+            "status": STATUS_QUEUED,
+            "job_id": None,
+            "task_token": task_token,
+            "context": context or {},
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        with self._lock:
+            self.store.put(job)
+            if not self._start(job):
+                logger.info("TextractJobManager: no free slot (cap %d), queued handle=%s", self.max_concurrent, job["handle"])
+        return job
+
+    def complete(self, job_tag: Optional[str], job_id: Optional[str], status: str) -> Optional[Dict[str, Any]]:
+        """Mark a job finished from a completion notification. Returns the stored record, if known."""
+        job = self.store.get(job_tag) if job_tag else None
+        if job is None and job_id:
+            job = next((j for j in self.store.list(STATUS_RUNNING) if j.get("job_id") == job_id), None)
+        if job is None:
+            logger.warning("TextractJobManager: no job record for job_tag=%s job_id=%s", job_tag, job_id)
+            return None
+
+        was_running = job.get("status") == STATUS_RUNNING
+        job.update({
+            "status": STATUS_SUCCEEDED if status == STATUS_SUCCEEDED else STATUS_FAILED,
+            "job_id": job.get("job_id") or job_id,
+            "textract_status": status,
+            "updated_at": _now(),
+        })
+        self.store.put(job)
+        if was_running and job.get("slot") is not None:
+            self.store.release_slot(job["slot"], job["handle"])
+        return job
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Start queued jobs, oldest first, while there is free capacity. Returns the jobs started."""
+        started = []
+        with self._lock:
+            for job in self.store.list(STATUS_QUEUED):
+                # another container's drain may have started it since the listing
+                current = self.store.get(job["handle"])
+                if not current or current.get("status") != STATUS_QUEUED:
+                    continue
+                if not self._start(current):
+                    break
+                started.append(current)
+        return started
+
+
+def parse_completion_messages(event: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    """Yield Textract completion messages from an SNS or SQS (SNS-wrapped or raw) Lambda event."""
+    for rec in event.get("Records") or []:
+        if "Sns" in rec:
+            body = rec["Sns"].get("Message")
+        else:
+            body = rec.get("body")
+        try:
+            msg = json.loads(body) if isinstance(body, str) else (body or {})
+            # SQS subscriptions without raw delivery wrap the SNS envelope around the message
+            if isinstance(msg, dict) and "Message" in msg and "JobId" not in msg:
+                msg = json.loads(msg["Message"])
+        except Exception:
+            logger.warning("parse_completion_messages: skipping unparsable record")
+            continue
+        if isinstance(msg, dict) and msg.get("JobId"):
+            yield msg
@@ -0,0 +1,149 @@
+"""
+What-if simulation of tenant decision policies over the results store.
+
+Applies candidate tenant configs (thresholds, decision_rules,
+default_decision) to every recorded decision in the columnar results store
+(results_store.py) and reports how the decision distribution shifts against
+the current tenant_config.json and against what was actually decided:
+
+    python -m agents.shared.what_if --set acme.risk_score_threshold=6
+    python -m agents.shared.what_if --candidate tenant_config.next.json --tenant acme
+
+Rules are evaluated vectorized (CompiledRules.decide_arrays) once per tenant
+slice, so a simulation over millions of rows takes seconds. By default only
+the latest row per contract_id counts; --all-rows keeps every re-decision.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from agents.shared.decision_rules import FIELDS, get_compiled_rules
+from agents.shared.results_store import get_results_store
+from agents.shared.tenant_context import load_tenant_config
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def latest_rows(columns: Dict[str, Any]) -> Any:
+    """Indices of the newest row per contract_id (rows without a contract_id are all kept)."""
+    order = np.argsort(columns["decided_at"], kind="stable")[::-1]
+    _, first = np.unique(columns["contract_id"][order], return_index=True)
+    keep = order[first]
+    anonymous = np.flatnonzero(columns["contract_id"] == "")
+    return np.union1d(keep[columns["contract_id"][keep] != ""], anonymous)
+
+
+def parse_overrides(pairs: List[str]) -> Dict[str, Dict[str, Any]]:
+    """--set tenant.key=value (value as JSON, else string; tenant "*" = every tenant) -> {tenant: {key: value}}."""
+    overrides: Dict[str, Dict[str, Any]] = {}
+    for pair in pairs or []:
+        target, _, raw = pair.partition("=")
+        tenant, _, key = target.partition(".")
+        if not tenant or not key or not _:
+            raise ValueError(f"expected tenant.key=value, got {pair!r}")
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        overrides.setdefault(tenant, {})[key] = value
+    return overrides
+
+
+def _distribution(labels: Any) -> Dict[str, int]:
+    values, counts = np.unique(labels, return_counts=True)
+    return {str(v): int(c) for v, c in zip(values, counts)}
+
+
+def _transitions(before: Any, after: Any) -> Dict[str, int]:
+    changed = before != after
+    if not changed.any():
+        return {}
+    pairs, counts = np.unique(np.char.add(np.char.add(before[changed], " -> "), after[changed]), return_counts=True)
+    return {str(p): int(c) for p, c in sorted(zip(pairs, counts), key=lambda pc: -pc[1])}
+
+
+def simulate(
+    columns: Dict[str, Any],
+    candidate_path: Optional[str] = None,
+    overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+    tenants: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Baseline (current config) vs candidate decisions over the given result columns."""
+    started = time.monotonic()
+    overrides = overrides or {}
+    n = len(columns["decision"])
+    baseline = np.empty(n, dtype=object)
+    candidate = np.empty(n, dtype=object)
+
+    tenant_ids, codes = np.unique(columns["tenant_id"], return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(tenant_ids) + 1))
+    per_tenant: Dict[str, Any] = {}
+    for code, tenant_id in enumerate(tenant_ids):
+        tenant = str(tenant_id) or None
+        if tenants and (tenant or "default") not in tenants:
+            continue
+        rows = order[bounds[code]:bounds[code + 1]]
+        current_cfg = load_tenant_config(tenant)
+        candidate_cfg = copy.deepcopy(load_tenant_config(tenant, candidate_path) if candidate_path else current_cfg)
+        candidate_cfg.update(overrides.get("*", {}))
+        candidate_cfg.update(overrides.get(tenant or "default", {}))
+
+        fields = {name: columns[name][rows] for name in FIELDS if name in columns}
+        baseline[rows], _ = get_compiled_rules(current_cfg).decide_arrays(fields, len(rows))
+        candidate[rows], _ = get_compiled_rules(candidate_cfg).decide_arrays(fields, len(rows))
+        per_tenant[tenant or "default"] = {
+            "rows": int(len(rows)),
+            "changed": int((baseline[rows] != candidate[rows]).sum()),
+        }
+
+    selected = np.flatnonzero(candidate != None)  # noqa: E711 (elementwise on an object array)
+    recorded = columns["decision"][selected].astype(str)
+    before = baseline[selected].astype(str)
+    after = candidate[selected].astype(str)
+    base_dist, cand_dist = _distribution(before), _distribution(after)
+    labels = sorted(set(base_dist) | set(cand_dist))
+    report = {
+        "rows": int(len(selected)),
+        "recorded": _distribution(recorded),
+        "baseline": base_dist,
+        "candidate": cand_dist,
+        "delta": {label: cand_dist.get(label, 0) - base_dist.get(label, 0) for label in labels},
+        "changed": int((before != after).sum()),
+        "transitions": _transitions(before, after),
+        "recorded_vs_baseline_changed": int((recorded != before).sum()),
+        "tenants": per_tenant,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info("simulate: %d rows, %d changed in %.2fs", report["rows"], report["changed"], report["seconds"])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate candidate tenant decision policies over recorded results")
+    parser.add_argument("--candidate", help="candidate tenant config JSON (same shape as tenant_config.json)")
+    parser.add_argument("--set", action="append", default=[], metavar="TENANT.KEY=VALUE", help="override a config value")
+    parser.add_argument("--tenant", action="append", help="only simulate these tenants")
+    parser.add_argument("--all-rows", action="store_true", help="count every re-decision, not just the latest per contract")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    columns = get_results_store().load(FIELDS + ("tenant_id", "decision", "contract_id", "decided_at"))
+    if not args.all_rows and len(columns["decision"]):
+        keep = latest_rows(columns)
+        columns = {name: values[keep] for name, values in columns.items()}
+    loaded = time.monotonic() - started
+    report = simulate(columns, args.candidate, parse_overrides(args.set), args.tenant)
+    report["load_seconds"] = round(loaded, 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -25,12 +25,15 @@ module "lambda" {
   invoke_function_name      = "${var.project}-${var.env}-invoke-sfn-lambda"
   risk_analysis_function_name = "${var.project}-${var.env}-risk-analysis-lambda"
   decision_function_name    = "${var.project}-${var.env}-decision-lambda"
+  combined_review_function_name = "${var.project}-${var.env}-combined-review-lambda"
 
   ingestion_role_arn        = module.iam.ingestion_lambda_role_arn
   compliance_role_arn       = module.iam.compliance_lambda_role_arn
   invoke_role_arn           = module.iam.invoke_sfn_lambda_role_arn
   risk_analysis_role_arn    = module.iam.risk_analysis_lambda_role_arn
   decision_role_arn         = module.iam.decision_lambda_role_arn
+  # same S3 + Bedrock permissions as compliance
+  combined_review_role_arn  = module.iam.compliance_lambda_role_arn
 }
 
 // Module: Step Functions (orchestrates invocation of lambdas)
@@ -48,6 +51,7 @@ module "step_functions" {
     compliance_lambda_arn = module.lambda.compliance_lambda_arn
     risk_analysis_lambda_arn = module.lambda.risk_analysis_lambda_arn
     decision_lambda_arn = module.lambda.decision_lambda_arn
+    combined_review_lambda_arn = module.lambda.combined_review_lambda_arn
   })
 
 }
@@ -49,6 +49,7 @@ data "aws_iam_policy_document" "ingestion_lambda_policy" {
     actions = [
       "s3:GetObject",
       "s3:PutObject",
+      "s3:DeleteObject",
       "s3:ListBucket",
       "s3:GetBucketLocation"
     ]
@@ -285,12 +286,13 @@ resource "aws_iam_role" "invoke_sfn_lambda_role" {
   assume_role_policy = data.aws_iam_policy_document.lambda_assume_role.json
 }
 
-// Inline policy for invoke_sfn lambda: allow StartExecution on Step Functions and logging
+// Inline policy for invoke_sfn lambda: allow StartExecution (and DescribeExecution for deduplication) and logging
 data "aws_iam_policy_document" "invoke_sfn_lambda_policy" {
   statement {
     effect = "Allow"
     actions = [
-      "states:StartExecution"
+      "states:StartExecution",
+      "states:DescribeExecution"
     ]
     resources = ["*"]
   }
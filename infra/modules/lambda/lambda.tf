@@ -14,7 +14,7 @@ resource "aws_lambda_function" "ingestion" {
   # s3_bucket = length(var.ingestion_s3_key) > 0 ? var.s3_bucket : null
   # s3_key    = length(var.ingestion_s3_key) > 0 ? var.ingestion_s3_key : null
 
-  handler       = "main.handler"
+  handler       = "agents.ingestion.main.handler"
   runtime       = "python3.10"
   role          = var.ingestion_role_arn
   timeout       = var.ingestion_timeout
@@ -38,7 +38,7 @@ resource "aws_lambda_function" "invoke_sfn" {
   function_name = var.invoke_function_name
   filename         = var.invoke_filename
   source_code_hash = length(var.invoke_filename) > 0 ? filebase64sha256(var.invoke_filename) : null
-  handler       = "main.handler"
+  handler       = "agents.invoke.main.handler"
   runtime       = "python3.10"
   role          = var.invoke_role_arn
   timeout       = var.invoke_timeout
@@ -50,7 +50,7 @@ resource "aws_lambda_function" "risk_analysis" {
   filename         = length(var.risk_analysis_filename) > 0 ? var.risk_analysis_filename : null
   source_code_hash = length(var.risk_analysis_filename) > 0 ? filebase64sha256(var.risk_analysis_filename) : null
 
-  handler       = "main.handler"
+  handler       = "agents.risk_analysis.main.handler"
   runtime       = "python3.10"
   role          = var.risk_analysis_role_arn
   timeout       = var.risk_analysis_timeout
@@ -67,3 +67,17 @@ resource "aws_lambda_function" "decision" {
   role          = var.decision_role_arn
   timeout       = var.decision_timeout
 }
+
+// Optional single-call compliance+risk review, selected per tenant ("review_mode": "combined").
+// Ships in the compliance package (it imports the compliance and risk helpers) unless its own zip is given.
+resource "aws_lambda_function" "combined_review" {
+  function_name = var.combined_review_function_name
+
+  filename         = length(var.combined_review_filename) > 0 ? var.combined_review_filename : var.compliance_filename
+  source_code_hash = filebase64sha256(length(var.combined_review_filename) > 0 ? var.combined_review_filename : var.compliance_filename)
+
+  handler       = "agents.combined_review.main.handler"
+  runtime       = "python3.10"
+  role          = var.combined_review_role_arn
+  timeout       = var.combined_review_timeout
+}
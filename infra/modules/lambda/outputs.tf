@@ -49,3 +49,13 @@ output "decision_lambda_name" {
   description = "Name of the decision Lambda function"
   value       = aws_lambda_function.decision.function_name
 }
+
+output "combined_review_lambda_arn" {
+  description = "ARN of the combined_review Lambda function"
+  value       = aws_lambda_function.combined_review.arn
+}
+
+output "combined_review_lambda_name" {
+  description = "Name of the combined_review Lambda function"
+  value       = aws_lambda_function.combined_review.function_name
+}
@@ -140,3 +140,27 @@ variable "decision_timeout" {
   type        = number
   default     = 300
 }
+
+variable "combined_review_filename" {
+  description = "path for combined_review lambda deployment package (defaults to the compliance package)"
+  type        = string
+  default     = ""
+}
+
+variable "combined_review_function_name" {
+  description = "Name for the combined_review Lambda function"
+  type        = string
+  default     = "combined-review-lambda"
+}
+
+variable "combined_review_role_arn" {
+  description = "IAM role ARN to attach to the combined_review Lambda"
+  type        = string
+  default     = ""
+}
+
+variable "combined_review_timeout" {
+  description = "Timeout for the combined_review Lambda function in seconds"
+  type        = number
+  default     = 300
+}
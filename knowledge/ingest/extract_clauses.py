@@ -9,6 +9,7 @@ Outputs to: resources/sale_docs/{tenant}_{doc}.jsonl
 This script does NOT generate embeddings; run the embedding pipeline after creating the JSONL.
 """
 import argparse
+import bisect
 import hashlib
 import json
 import os
@@ -16,7 +17,7 @@ import re
 import shutil
 import subprocess
 import tempfile
-from typing import List
+from typing import List, Optional
 
 try:
     from PyPDF2 import PdfReader
@@ -25,6 +26,13 @@ except Exception:
     PdfReader = None
     HAS_PDF = False
 
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except Exception:
+    np = None
+    HAS_NUMPY = False
+
 
 CLAUSE_PATTERNS = {
     "liability": re.compile(r"\bliability\b|limit of liability|limitation of liability|liability shall", re.I),
@@ -206,80 +214,161 @@ def group_sentences_into_clauses(sents: List[str]) -> List[dict]:
     return records
 
 
+# base risk by clause type
+BASE_RISK_SCORES = {
+    "liability": 7,
+    "indemnification": 6,
+    "data_protection": 5,
+    "termination": 6,
+    "payment": 3,
+    "confidentiality": 2,
+    "services": 3,
+    "governing_law": 2,
+    "renewal": 4,
+    "intellectual_property": 4,
+    "other": 4,
+}
+
+# keyword signals, matched against the lowercased clause text: name -> (pattern, triggers); every match of the
+# pattern contains at least one trigger substring, so clauses without any trigger are never scanned for it
+RISK_SIGNALS = {
+    "unlimited_liability": (r"unlimited liability|liability is unlimited|no cap on liability", ("liability",)),
+    "capped_liability": (r"limit.*liability|cap .*liability|cap .*fees|fees paid", ("liability", "cap ", "fees paid")),
+    "misconduct": (r"gross negligence|willful misconduct|willful", ("gross negligence", "willful")),
+    "broad_indemnity": (r"indemnif(y|ication).*any and all|any and all losses|all losses", ("indemnif", "all losses")),
+    "breach_notification": (
+        r"notify.*\b(72|48|24)\b.*hour|notify.*hours|breach notification", ("notify", "breach notification"),
+    ),
+    "frameworks": (r"gdpr|ccpa|hipaa|soc2|iso 27001|iso27001", ("gdpr", "ccpa", "hipaa", "soc2", "iso 27001", "iso27001")),
+    "termination_for_convenience": (
+        r"terminate.*convenience|termination for convenience|terminate for convenience", ("convenience",),
+    ),
+    "early_termination": (
+        r"early termination|termination fee|remaining fees", ("early termination", "termination fee", "remaining fees"),
+    ),
+    # confidence signals
+    "strong_liability": (
+        r"unlimited liability|no cap|any and all|any and all losses|all losses",
+        ("unlimited liability", "no cap", "any and all", "all losses"),
+    ),
+    "strong_data_protection": (
+        r"notify.*hour|breach notification|gdpr|ccpa|hipaa|soc2|iso27001",
+        ("notify", "breach notification", "gdpr", "ccpa", "hipaa", "soc2", "iso27001"),
+    ),
+    "strong_termination": (
+        r"terminate for convenience|termination for convenience|early termination", ("convenience", "early termination"),
+    ),
+}
+
+# score adjustments, applied in order: ("max", signal, floor, None) raises the score to at least `floor`;
+# ("reduce", signal, amount, clause_type) lowers it by `amount` (not below 1) for that clause type only
+RISK_RULES = [
+    ("max", "unlimited_liability", 9, None),
+    ("max", "capped_liability", 7, None),
+    ("max", "misconduct", 8, None),
+    ("max", "broad_indemnity", 8, None),
+    # good notification reduces risk for data protection
+    ("reduce", "breach_notification", 3, "data_protection"),
+    ("reduce", "frameworks", 4, "data_protection"),
+    ("max", "termination_for_convenience", 7, None),
+    ("max", "early_termination", 6, None),
+]
+CONFIDENCE_SIGNALS = ["strong_liability", "strong_data_protection", "strong_termination"]
+
+_SIGNAL_NAMES = list(RISK_SIGNALS)
+_COMPILED_SIGNALS = [(re.compile(RISK_SIGNALS[name][0]), RISK_SIGNALS[name][1]) for name in _SIGNAL_NAMES]
+
+
+def _signal_hits(clause_texts: List[str]) -> List[List[bool]]:
+    """hits[i][j]: signal j occurs in clause i.
+
+    For every signal, the clauses containing one of its triggers are joined with newlines and the pattern is scanned
+    once over that text. No signal can match across a newline ("." stops there), so each match falls inside one
+    clause, exactly like re.search per clause.
+    """
+    lowered = [(t or "").lower() for t in clause_texts]
+    hits = [[False] * len(_SIGNAL_NAMES) for _ in lowered]
+    for j, (rx, triggers) in enumerate(_COMPILED_SIGNALS):
+        candidates = [i for i, text in enumerate(lowered) if any(trigger in text for trigger in triggers)]
+        if not candidates:
+            continue
+        starts, pos = [], 0
+        for i in candidates:
+            starts.append(pos)
+            pos += len(lowered[i]) + 1
+        for match in rx.finditer("\n".join(lowered[i] for i in candidates)):
+            hits[candidates[bisect.bisect_right(starts, match.start()) - 1]][j] = True
+    return hits
+
+
+def heuristic_risk_scores(clause_texts: List[str], clause_types: Optional[List[str]] = None):
+    """Score a whole document's clauses in one pass; returns (scores, confidences).
+
+    Each of the RISK_SIGNALS is scanned once over the whole document, and the RISK_RULES are applied to every clause
+    at once. Returns NumPy arrays (int scores 0-10, float confidences 0-1) when NumPy is installed, else lists.
+    """
+    types = [t or "other" for t in (clause_types or [None] * len(clause_texts))]
+    hits = _signal_hits(clause_texts)
+    column = {name: i for i, name in enumerate(_SIGNAL_NAMES)}
+
+    if HAS_NUMPY:
+        matrix = np.array(hits, dtype=bool).reshape(len(hits), len(_SIGNAL_NAMES))
+        kinds = np.array(types, dtype=object)
+        scores = np.array([BASE_RISK_SCORES.get(t, 4) for t in types], dtype=np.int64)
+        for op, signal, value, only_type in RISK_RULES:
+            hit = matrix[:, column[signal]]
+            if op == "max":
+                scores = np.where(hit, np.maximum(scores, value), scores)
+            else:
+                scores = np.where(hit & (kinds == only_type), np.maximum(1, scores - value), scores)
+        strong = matrix[:, [column[s] for s in CONFIDENCE_SIGNALS]].sum(axis=1)
+        confidences = np.select([strong >= 2, strong == 1], [0.9, 0.75], default=0.6)
+        return np.clip(scores, 0, 10), np.clip(confidences, 0.0, 1.0)
+
+    scores, confidences = [], []
+    for row, clause_type in zip(hits, types):
+        score = BASE_RISK_SCORES.get(clause_type, 4)
+        for op, signal, value, only_type in RISK_RULES:
+            if not row[column[signal]]:
+                continue
+            if op == "max":
+                score = max(score, value)
+            elif clause_type == only_type:
+                score = max(1, score - value)
+        strong = sum(row[column[s]] for s in CONFIDENCE_SIGNALS)
+        conf = 0.9 if strong >= 2 else 0.75 if strong == 1 else 0.6
+        scores.append(max(0, min(10, int(round(score)))))
+        confidences.append(max(0.0, min(1.0, float(conf))))
+    return scores, confidences
+
+
 def heuristic_risk_score(clause_text: str, clause_type: str):
     """Return (score 0-10, confidence 0-1) using a simple rule-based heuristic.
 
     This is a lightweight automatic assessment used as a prior_assessment. It is advisory only.
+    Single-clause wrapper over heuristic_risk_scores.
     """
-    txt = clause_text.lower()
-    # base values by clause type
-    base = {
-        "liability": 7,
-        "indemnification": 6,
-        "data_protection": 5,
-        "termination": 6,
-        "payment": 3,
-        "confidentiality": 2,
-        "services": 3,
-        "governing_law": 2,
-        "renewal": 4,
-        "intellectual_property": 4,
-        "other": 4,
-    }
-    score = base.get(clause_type or "other", 4)
-
-    # keyword boosts / adjustments
-    if re.search(r"unlimited liability|liability is unlimited|no cap on liability", txt):
-        score = max(score, 9)
-    if re.search(r"limit.*liability|cap .*liability|cap .*fees|fees paid", txt):
-        score = max(score, 7)
-    if re.search(r"gross negligence|willful misconduct|willful", txt):
-        score = max(score, 8)
-    if re.search(r"indemnif(y|ication).*any and all|any and all losses|all losses", txt):
-        score = max(score, 8)
-    if re.search(r"notify.*\b(72|48|24)\b.*hour|notify.*hours|breach notification", txt):
-        # good notification reduces risk for data protection
-        if clause_type == "data_protection":
-            score = max(1, score - 3)
-    if re.search(r"gdpr|ccpa|hipaa|soc2|iso 27001|iso27001", txt):
-        if clause_type == "data_protection":
-            score = max(1, score - 4)
-    if re.search(r"terminate.*convenience|termination for convenience|terminate for convenience", txt):
-        score = max(score, 7)
-    if re.search(r"early termination|termination fee|remaining fees", txt):
-        score = max(score, 6)
-
-    # confidence: increase if strong keywords found
-    conf = 0.6
-    strong_kw = 0
-    if re.search(r"unlimited liability|no cap|any and all|any and all losses|all losses", txt):
-        strong_kw += 1
-    if re.search(r"notify.*hour|breach notification|gdpr|ccpa|hipaa|soc2|iso27001", txt):
-        strong_kw += 1
-    if re.search(r"terminate for convenience|termination for convenience|early termination", txt):
-        strong_kw += 1
-    if strong_kw >= 2:
-        conf = 0.9
-    elif strong_kw == 1:
-        conf = 0.75
-    else:
-        conf = 0.6
+    scores, confidences = heuristic_risk_scores([clause_text], [clause_type])
+    return int(scores[0]), float(confidences[0])
+
 
-    # ensure numeric bounds
-    score = max(0, min(10, int(round(score))))
-    conf = max(0.0, min(1.0, float(conf)))
-    return score, conf
+def clause_hash(clause_text: str) -> str:
+    """SHA-256 of the clause text; identifies a clause across documents and contract versions."""
+    return hashlib.sha256(clause_text.encode("utf-8")).hexdigest()
 
 
 def write_jsonl(records: List[dict], tenant: str, doc_id: str, out_dir: str, document_type: str = None):
     os.makedirs(out_dir, exist_ok=True)
     out_path = os.path.join(out_dir, f"{tenant}_{doc_id}.jsonl")
+    # heuristic prior assessments for the whole document in one pass
+    scores, confidences = heuristic_risk_scores(
+        [r.get("clause_text", "") for r in records], [r.get("clause_type") for r in records]
+    )
     with open(out_path, "w", encoding="utf-8") as f:
         for i, r in enumerate(records):
             clause_text = r.get("clause_text", "")
             clause_type = r.get("clause_type")
-            # compute heuristic prior assessment
-            score, conf = heuristic_risk_score(clause_text, clause_type)
+            score, conf = int(scores[i]), float(confidences[i])
             rec = {
                 "tenant_id": tenant,
                 "doc_id": doc_id,
@@ -290,7 +379,7 @@ def write_jsonl(records: List[dict], tenant: str, doc_id: str, out_dir: str, doc
                 "n_tokens": len(clause_text.split()),
             }
             # compute hashes for provenance
-            rec["doc_hash"] = hashlib.sha256(clause_text.encode("utf-8")).hexdigest()
+            rec["doc_hash"] = clause_hash(clause_text)
             rec["chunk_hash"] = hashlib.sha256((clause_text + str(i)).encode("utf-8")).hexdigest()
             # add prior assessment as advisory metadata
             rec["prior_assessments"] = [
@@ -0,0 +1,307 @@
+"""
+Resumable bulk backfill of an S3 prefix through the contract review pipeline.
+
+Lists every object under the prefix and runs each one, with bounded
+concurrency, either through the Step Functions state machine (--mode sfn) or
+in-process with the local ASL executor (--mode local, see
+agents/shared/asl_executor.py). Every finished document is appended to a
+checkpoint manifest (JSONL, one line per key and attempt), so an interrupted
+backfill resumes where it stopped: keys whose last record SUCCEEDED for the
+same ETag are skipped, failed ones are retried (unless --skip-failed).
+
+Usage examples:
+  # onboard a tenant archive through Step Functions, 20 executions at a time
+  python3 scripts/backfill.py --bucket my-bucket --prefix acme/archive/ --concurrency 20
+
+  # same, in-process on this machine with one executor per core
+  python3 scripts/backfill.py --bucket my-bucket --prefix acme/archive/ --mode local --processes 0
+
+Notes:
+- In sfn mode execution names are derived from bucket, key and ETag (like the
+  invoke lambda), so documents already started by S3 notifications or by an
+  interrupted run are awaited instead of started again. A failed, timed-out or
+  aborted execution is retried under the next attempt name ("-a<n>").
+- Progress lines report throughput and ETA for the remaining documents.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import boto3
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+logger = logging.getLogger("backfill")
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+logger.addHandler(handler)
+
+DEFAULT_REGION = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or "us-east-1"
+DEFAULT_SUFFIXES = ".pdf,.txt,.png,.jpg,.jpeg,.tif,.tiff"
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED")
+
+
+def list_documents(s3_client, bucket: str, prefix: str, suffixes: List[str]) -> Iterator[Dict[str, Any]]:
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key.endswith("/") or (suffixes and not key.lower().endswith(tuple(suffixes))):
+                continue
+            yield {"key": key, "etag": (obj.get("ETag") or "").strip('"'), "size": obj.get("Size", 0)}
+
+
+class Manifest:
+    """Append-only JSONL checkpoint; the last record per key wins."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a line cut off by an interruption
+                        continue
+                    self.records[record["key"]] = record
+        self._file = open(path, "a", encoding="utf-8")
+
+    def done(self, doc: Dict[str, Any], skip_failed: bool = False) -> bool:
+        record = self.records.get(doc["key"])
+        if not record or record.get("etag") != doc["etag"]:
+            return False
+        return record["status"] == "SUCCEEDED" or (skip_failed and record["status"] != "SUCCEEDED")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records[record["key"]] = record
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def build_event(bucket: str, doc: Dict[str, Any]) -> dict:
+    return {
+        "contract_id": "",
+        "s3": {"bucket": bucket, "key": doc["key"], "etag": doc["etag"]},
+        "s3_uri": f"s3://{bucket}/{doc['key']}",
+    }
+
+
+def _summarize_output(output: Any) -> Dict[str, Any]:
+    if isinstance(output, str):
+        try:
+            output = json.loads(output)
+        except ValueError:
+            return {}
+    decision = (output or {}).get("decision") or {}
+    return {
+        "contract_id": output.get("contract_id") if isinstance(output, dict) else None,
+        "decision": decision.get("decision") if isinstance(decision, dict) else decision,
+    }
+
+
+class SfnRunner:
+    """Starts (or re-attaches to a running/succeeded) execution per document and polls it to a terminal state."""
+
+    def __init__(self, client, state_machine_arn: str, timeout_seconds: int, poll_interval: float):
+        from agents.invoke.main import start_deduplicated
+        self.client = client
+        self.state_machine_arn = state_machine_arn
+        self.timeout_seconds = timeout_seconds
+        self.poll_interval = poll_interval
+        self.start_deduplicated = start_deduplicated
+
+    def __call__(self, bucket: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+        # earlier FAILED/TIMED_OUT/ABORTED executions of the same name are skipped for a fresh attempt
+        started = self.start_deduplicated(self.client, self.state_machine_arn, build_event(bucket, doc))
+        arn = started["executionArn"]
+        if started["status"] == "duplicate":
+            logger.info(f"SfnRunner: {doc['key']} already has execution {arn}, waiting for it")
+        deadline = time.time() + self.timeout_seconds
+        while time.time() < deadline:
+            desc = self.client.describe_execution(executionArn=arn)
+            if desc["status"] in TERMINAL_STATUSES:
+                result = {"status": desc["status"], "execution": arn}
+                if desc["status"] == "SUCCEEDED":
+                    result.update(_summarize_output(desc.get("output")))
+                else:
+                    result["error"] = desc.get("error") or desc["status"]
+                return result
+            time.sleep(self.poll_interval)
+        return {"status": "TIMED_OUT", "execution": arn, "error": f"not finished after {self.timeout_seconds}s"}
+
+
+class LocalRunner:
+    """Runs one document through the in-process ASL executor."""
+
+    def __init__(self):
+        from agents.shared.asl_executor import LocalExecutor
+        self.executor = LocalExecutor()
+
+    def __call__(self, bucket: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+        from agents.shared.asl_executor import StatesError
+        try:
+            return {"status": "SUCCEEDED", **_summarize_output(self.executor.run(build_event(bucket, doc)))}
+        except StatesError as e:
+            return {"status": "FAILED", "error": e.error, "cause": e.cause[:500]}
+
+
+class Progress:
+    def __init__(self, total: int, every_seconds: float = 10.0):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.time()
+        self.every_seconds = every_seconds
+        self._next = self.started + every_seconds
+
+    def update(self, status: str) -> None:
+        self.done += 1
+        if status != "SUCCEEDED":
+            self.failed += 1
+        if time.time() >= self._next or self.done == self.total:
+            self._next = time.time() + self.every_seconds
+            print(self.line())
+
+    def line(self) -> str:
+        elapsed = max(time.time() - self.started, 1e-6)
+        rate = self.done / elapsed
+        remaining = self.total - self.done
+        eta = remaining / rate if rate else float("inf")
+        return (
+            f"progress: {self.done}/{self.total} done ({self.failed} failed) "
+            f"{rate:.2f} docs/s ({rate * 3600:.0f}/h) elapsed {_duration(elapsed)} eta {_duration(eta)}"
+        )
+
+
+def _duration(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "?"
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+
+def _record(doc: Dict[str, Any], result: Dict[str, Any], seconds: Optional[float] = None) -> Dict[str, Any]:
+    record = {"key": doc["key"], "etag": doc["etag"], **result, "finished_at": time.time()}
+    if seconds is not None:
+        record["seconds"] = round(seconds, 2)
+    return record
+
+
+def run_threads(runner, bucket: str, docs: List[Dict[str, Any]], concurrency: int) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    def _one(doc):
+        started = time.time()
+        try:
+            result = runner(bucket, doc)
+        except Exception as e:
+            logger.exception(f"run_threads: {doc['key']} failed")
+            result = {"status": "FAILED", "error": type(e).__name__, "cause": str(e)[:500]}
+        return _record(doc, result, time.time() - started)
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {pool.submit(_one, doc): doc for doc in docs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # on interruption, queued documents are dropped; they are not in the manifest and run on resume
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_processes(bucket: str, docs: List[Dict[str, Any]], processes: Optional[int]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    from agents.shared.asl_executor import run_many_processes
+    by_uri = {f"s3://{bucket}/{doc['key']}": doc for doc in docs}
+    events = [build_event(bucket, doc) for doc in docs]
+    for event, output, error in run_many_processes(events, processes=processes or None):
+        doc = by_uri[event["s3_uri"]]
+        if error is None:
+            result = {"status": "SUCCEEDED", **_summarize_output(output)}
+        else:
+            result = {"status": "FAILED", "error": error.error, "cause": error.cause[:500]}
+        yield doc, _record(doc, result)
+
+
+def parse_args(argv):
+    p = argparse.ArgumentParser(description="Backfill an S3 prefix through the contract review pipeline")
+    p.add_argument("--bucket", required=True, help="S3 bucket name")
+    p.add_argument("--prefix", default="", help="S3 key prefix to backfill (e.g. acme/archive/)")
+    p.add_argument("--mode", choices=("sfn", "local"), default="sfn", help="Step Functions or in-process execution")
+    p.add_argument("--state-machine-arn", dest="state_machine_arn", default=os.environ.get("STATE_MACHINE_ARN"),
+                   help="State machine ARN for --mode sfn (or set STATE_MACHINE_ARN env var)")
+    p.add_argument("--region", default=DEFAULT_REGION, help="AWS region to use (default from env or us-east-1)")
+    p.add_argument("--concurrency", type=int, default=10, help="documents in flight at once")
+    p.add_argument("--processes", type=int, default=None,
+                   help="--mode local only: run on N worker processes (0 = one per core) instead of threads")
+    p.add_argument("--manifest", help="checkpoint manifest path (default: backfill-<bucket>-<prefix>.jsonl)")
+    p.add_argument("--suffixes", default=DEFAULT_SUFFIXES, help="comma-separated key suffixes to include ('' = all)")
+    p.add_argument("--skip-failed", action="store_true", help="do not retry documents whose last attempt failed")
+    p.add_argument("--limit", type=int, default=0, help="process at most N pending documents")
+    p.add_argument("--timeout", type=int, default=3600, help="--mode sfn: max seconds to wait per execution")
+    p.add_argument("--poll-interval", type=float, default=5.0, help="--mode sfn: seconds between status polls")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    if args.mode == "sfn" and not args.state_machine_arn:
+        print("Error: --mode sfn needs --state-machine-arn or the STATE_MACHINE_ARN env var")
+        sys.exit(2)
+
+    manifest_path = args.manifest or f"backfill-{args.bucket}-{args.prefix.strip('/').replace('/', '_') or 'all'}.jsonl"
+    manifest = Manifest(manifest_path)
+    suffixes = [s.strip().lower() for s in args.suffixes.split(",") if s.strip()]
+    s3_client = boto3.client("s3", region_name=args.region)
+
+    listed = list(list_documents(s3_client, args.bucket, args.prefix, suffixes))
+    pending = [doc for doc in listed if not manifest.done(doc, args.skip_failed)]
+    already_done = len(listed) - len(pending)
+    if args.limit:
+        pending = pending[: args.limit]
+    print(f"backfill: {len(listed)} documents under s3://{args.bucket}/{args.prefix}, "
+          f"{already_done} already done, {len(pending)} to process; manifest {manifest_path}")
+    if not pending:
+        manifest.close()
+        return
+
+    if args.mode == "local" and args.processes is not None:
+        results = run_processes(args.bucket, pending, args.processes)
+    elif args.mode == "local":
+        results = run_threads(LocalRunner(), args.bucket, pending, args.concurrency)
+    else:
+        client = boto3.client("stepfunctions", region_name=args.region)
+        runner = SfnRunner(client, args.state_machine_arn, args.timeout, args.poll_interval)
+        results = run_threads(runner, args.bucket, pending, args.concurrency)
+
+    progress = Progress(len(pending))
+    try:
+        for doc, record in results:
+            manifest.append(record)
+            progress.update(record["status"])
+    except KeyboardInterrupt:
+        print(f"backfill: interrupted; {progress.done} documents checkpointed, rerun the same command to resume")
+        raise SystemExit(130)
+    finally:
+        results.close()
+        manifest.close()
+    print("backfill: finished, " + progress.line())
+    if progress.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Local simulator for the notify-mode Textract flow, without AWS.
+
+Runs the ingestion handler in notify mode (each event carries a Step Functions
+task token) against a fake Textract client that "publishes" completion
+messages to a fake SNS topic, then delivers those messages to
+`completion_handler`:
+- submit more PDFs than the concurrency cap allows (extra jobs are queued)
+- finish running jobs one notification at a time
+- check queued jobs are started as capacity frees up and every task token gets the text
+
+Usage: python3 scripts/simulate_textract_notify.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import uuid
+from typing import Any, Dict, List
+
+# ensure project root is on sys.path so `agents` package imports work when running this script directly
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from agents.ingestion import main as ingestion
+from agents.shared.textract_jobs import LocalJobStore, TextractJobManager
+
+
+class FakeSns:
+    """Collects published messages; `deliver_one` wraps the oldest as an SNS Lambda event."""
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self.messages.append(message)
+
+    def deliver_one(self) -> Dict[str, Any]:
+        msg = self.messages.pop(0)
+        return {"Records": [{"EventSource": "aws:sns", "Sns": {"Message": json.dumps(msg)}}]}
+
+
+class FakeSfn:
+    """Records task-token callbacks instead of resuming Step Functions executions."""
+
+    def __init__(self):
+        self.outputs: Dict[str, Dict[str, Any]] = {}
+
+    def send_task_success(self, taskToken, output):
+        self.outputs[taskToken] = json.loads(output)
+
+    def send_task_failure(self, taskToken, error=None, cause=None):
+        self.outputs[taskToken] = {"error": error, "cause": cause}
+
+
+class FakeTextract:
+    """Minimal stand-in for the Textract async text-detection API."""
+
+    def __init__(self, sns: FakeSns, lines_per_doc: int = 3):
+        self.sns = sns
+        self.lines_per_doc = lines_per_doc
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    def start_document_text_detection(self, DocumentLocation, JobTag=None, ClientRequestToken=None, NotificationChannel=None):
+        job_id = uuid.uuid4().hex
+        obj = DocumentLocation["S3Object"]
+        self.jobs[job_id] = {"tag": JobTag, "bucket": obj["Bucket"], "name": obj["Name"], "done": False}
+        return {"JobId": job_id}
+
+    def finish(self, job_id: str, status: str = "SUCCEEDED") -> None:
+        job = self.jobs[job_id]
+        job["done"] = True
+        self.sns.publish({
+            "JobId": job_id,
+            "Status": status,
+            "API": "StartDocumentTextDetection",
+            "JobTag": job["tag"],
+            "DocumentLocation": {"S3ObjectName": job["name"], "S3Bucket": job["bucket"]},
+        })
+
+    def get_document_text_detection(self, JobId, NextToken=None):
+        job = self.jobs[JobId]
+        # two result pages to exercise NextToken pagination
+        page = int(NextToken or 0)
+        blocks = [
+            {"BlockType": "LINE", "Text": f"{job['name']} page {page} line {i}"}
+            for i in range(self.lines_per_doc)
+        ]
+        resp = {"JobStatus": "SUCCEEDED" if job["done"] else "IN_PROGRESS", "Blocks": blocks}
+        if page == 0:
+            resp["NextToken"] = "1"
+        return resp
+
+    def running(self) -> List[str]:
+        return [job_id for job_id, j in self.jobs.items() if not j["done"]]
+
+
+def main():
+    sns = FakeSns()
+    fake = FakeTextract(sns)
+    store_path = os.path.join(tempfile.mkdtemp(prefix="textract_jobs_"), "jobs.json")
+    sfn = FakeSfn()
+    ingestion.textract = fake
+    ingestion.sfn = sfn
+    ingestion._job_manager = TextractJobManager(
+        fake,
+        LocalJobStore(store_path),
+        max_concurrent=2,
+        sns_topic_arn="arn:aws:sns:us-east-1:000000000000:textract-local",
+        sns_role_arn="arn:aws:iam::000000000000:role/textract-local",
+    )
+    ingestion.TEXTRACT_COMPLETION_MODE = "notify"
+    # the fake bucket has no objects to read, so skip the cache and the text-layer fast path
+    ingestion._extraction_cache = False
+    ingestion.PDF_TEXT_LAYER_ENABLED = False
+
+    handles = []
+    for i in range(5):
+        out = ingestion.handler(
+            {"contract_id": f"c-{i}", "s3": {"bucket": "local", "key": f"acme/contract-{i}.pdf"}, "task_token": f"token-{i}"},
+            None,
+        )
+        handles.append(out["textract_job"]["handle"])
+        print("submitted", out["textract_job"])
+
+    assert len(fake.running()) == 2, "concurrency cap not applied"
+
+    completed = []
+    while fake.running():
+        fake.finish(fake.running()[0])
+        out = ingestion.completion_handler(sns.deliver_one(), None)
+        for r in out["results"]:
+            completed.append(r["handle"])
+            print("completed", r["handle"], r["status"], r["result"]["extracted_text"].splitlines()[0])
+        assert len(fake.running()) <= 2, "concurrency cap exceeded"
+
+    assert sorted(completed) == sorted(handles), "not every submitted job completed"
+    assert all(sfn.outputs.get(f"token-{i}", {}).get("extracted_text") for i in range(5)), "task token not completed"
+    print("all", len(completed), "jobs completed")
+
+
+if __name__ == "__main__":
+    main()